@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк превью-галереи: 10 результатов 4K (JPEG и PNG).
+
+Сравнивает прежний алгоритм (полное декодирование, LANCZOS по 4K,
+загрузка шрифта на каждую плитку, одна страница на 6 плиток в потоке)
+с компоновщиком bot.services.gallery в пуле процессов.
+
+Запуск: python benchmarks/gallery_benchmark.py [--count 10] [--rounds 3]
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+
+from bot.services.gallery import FONT_PATH, render_gallery_pages
+from bot.services.image_pool import image_pool
+
+
+def make_frames(count: int, fmt: str) -> list:
+    """Генерирует 4K-кадры: градиент с шумом, похожий по сжатию на фото"""
+    gradient = Image.linear_gradient("L").resize((3840, 2160))
+    frames = []
+    for idx in range(count):
+        noise = Image.effect_noise((3840, 2160), 10 + idx)
+        img = Image.merge(
+            "RGB", (gradient, noise, gradient.transpose(Image.FLIP_LEFT_RIGHT))
+        )
+        buf = io.BytesIO()
+        img.save(buf, format=fmt, quality=92)
+        frames.append(buf.getvalue())
+    return frames
+
+
+def legacy_gallery(frames: list) -> bytes:
+    """Прежняя реализация create_gallery_preview (для сравнения)"""
+    count = len(frames)
+    cols, rows = (count, 1) if count <= 2 else (2, 2) if count <= 4 else (3, 2)
+    thumb_size = 512
+    gallery = Image.new("RGB", (cols * thumb_size, rows * thumb_size), (240, 240, 240))
+
+    for idx, frame in enumerate(frames):
+        if idx >= cols * rows:
+            break
+        img = Image.open(io.BytesIO(frame))
+        img.thumbnail((thumb_size - 20, thumb_size - 20), Image.Resampling.LANCZOS)
+        x = (idx % cols) * thumb_size + 10
+        y = (idx // cols) * thumb_size + 10
+        gallery.paste(img, (x, y))
+        draw = ImageDraw.Draw(gallery)
+        try:
+            font = ImageFont.truetype(FONT_PATH, 20)
+        except OSError:
+            font = ImageFont.load_default()
+        draw.text((x + 5, y + 5), str(idx + 1), fill=(255, 255, 255), font=font)
+
+    buf = io.BytesIO()
+    gallery.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+async def bench(frames: list, rounds: int):
+    loop = asyncio.get_running_loop()
+
+    legacy = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        # Прежний код умел только 6 плиток; для честного сравнения
+        # собираем все кадры страницами по 6 в одном потоке
+        for start in range(0, len(frames), 6):
+            await loop.run_in_executor(None, legacy_gallery, frames[start : start + 6])
+        legacy.append(time.perf_counter() - started)
+
+    current = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        pages = await render_gallery_pages(frames)
+        current.append(time.perf_counter() - started)
+
+    return min(legacy), min(current), len(pages)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    await image_pool.warm_up()
+    print(f"CPU: {os.cpu_count()}, процессов в пуле: {image_pool.max_workers}")
+    try:
+        for fmt in ("JPEG", "PNG"):
+            frames = make_frames(args.count, fmt)
+            legacy, current, pages = await bench(frames, args.rounds)
+            print(
+                f"{fmt:<5} {args.count}×4K, {pages} стр. | прежний: {legacy * 1000:7.0f} мс"
+                f" | новый: {current * 1000:7.0f} мс"
+                f" | x{legacy / current:.1f}"
+            )
+    finally:
+        image_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
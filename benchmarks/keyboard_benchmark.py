@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк клавиатур: сборка разметки в обработчике с кэшем и без.
+
+Для типичных вызовов из обработчиков (главное меню, настройки, выбор
+формата и длительности, видео-эффекты, категория пресетов) сравнивает
+сборку через InlineKeyboardBuilder на каждый вызов с кэшем
+bot.utils.keyboard_cache. Аргументы перебираются по кругу, как при
+реальных нажатиях кнопок.
+
+Запуск: python benchmarks/keyboard_benchmark.py [--calls 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import keyboards
+from bot.services.preset_manager import preset_manager
+
+
+def scenarios() -> dict:
+    """Имя -> (функция-клавиатура, список наборов аргументов)"""
+    category = next(iter(preset_manager.get_categories()), "")
+    presets = preset_manager.get_category_presets(category)
+    preset_ids = [p.id for p in presets[:5]] or ["demo"]
+
+    return {
+        "главное меню": (
+            keyboards.get_main_menu_keyboard,
+            [(credits,) for credits in (0, 5, 19, 20, 150)],
+        ),
+        "настройки": (
+            keyboards.get_settings_keyboard,
+            [
+                (image, video, "v3_std")
+                for image in ("flash", "pro")
+                for video in ("v3_std", "v3_pro", "v3_omni_std")
+            ],
+        ),
+        "формат фото": (
+            keyboards.get_image_aspect_ratio_keyboard,
+            [(pid, ratio) for pid in preset_ids for ratio in ("1:1", "16:9", "9:16")],
+        ),
+        "длительность": (
+            keyboards.get_duration_keyboard,
+            [(pid, dur) for pid in preset_ids for dur in (3, 5, 10)],
+        ),
+        "видео-эффекты": (
+            keyboards.get_video_edit_keyboard,
+            [
+                (None, "video", quality, duration, "16:9")
+                for quality in ("std", "pro")
+                for duration in (5, 10)
+            ],
+        ),
+        "категория": (
+            keyboards.get_category_keyboard,
+            [(category, presets, credits) for credits in (0, 10, 100)],
+        ),
+    }
+
+
+def bench(func, arg_sets: list, calls: int) -> float:
+    """Среднее время вызова в микросекундах"""
+    started = time.perf_counter()
+    for i in range(calls):
+        func(*arg_sets[i % len(arg_sets)])
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'клавиатура':<14} | без кэша, мкс | с кэшем, мкс | ускорение")
+    for name, (func, arg_sets) in scenarios().items():
+        uncached = bench(func.uncached, arg_sets, args.calls)
+        cached = bench(func, arg_sets, args.calls)
+        print(
+            f"{name:<14} | {uncached:13.1f} | {cached:12.2f} | x{uncached / cached:.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк холодного старта бота в режиме вебхука.
+
+Каждый прогон — новый процесс: импорт bot.main, сборка диспетчера и
+aiohttp-приложения, запуск TCP-сервера. Замеряется время от запуска
+процесса до готовности принимать соединения (on_startup не входит — он
+ходит в Telegram). С --profile печатает разбор `python -X importtime`:
+сколько времени импорта приходится на каждый пакет и самые тяжёлые
+модули бота.
+
+Запуск: python benchmarks/startup_benchmark.py [--runs 5] [--profile]
+        [--max-seconds 3.0]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Выполняется в дочернем процессе
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+
+import bot.main as main
+imported = time.perf_counter()
+
+async def serve():
+    from aiogram import Bot
+    from aiohttp import web
+
+    bot = Bot(token="123456:BENCHMARK")
+    dp = main.setup_dispatcher()
+    app = main.setup_web_server(dp, bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    listening = time.perf_counter()
+    print(json.dumps({"import": imported - started, "setup": listening - imported}))
+    await runner.cleanup()
+    await bot.session.close()
+
+asyncio.run(serve())
+"""
+
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+    env["WEBHOOK_HOST"] = ""
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def cold_start() -> dict:
+    """Один холодный старт; времена фаз в секундах"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=ROOT,
+        env=child_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = time.perf_counter() - started
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    # Запуск интерпретатора и site — всё, что было до первой строки CHILD
+    phases["interpreter"] = total - phases["import"] - phases["setup"]
+    phases["total"] = total
+    return phases
+
+
+def import_profile(top: int):
+    """Разбор -X importtime: собственное время по пакетам и тяжёлые модули бота"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import bot.main"],
+        cwd=ROOT,
+        env=child_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    by_package = defaultdict(int)
+    bot_modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # Заголовок таблицы
+        name = name.strip()
+        by_package[name.split(".")[0]] += int(self_us)
+        if name.startswith("bot"):
+            bot_modules.append((int(cumulative_us), int(self_us), name))
+
+    total = sum(by_package.values())
+    print(f"\nИмпорт bot.main: {total / 1000:.0f} мс (собственное время модулей)")
+    print(f"{'пакет':<24} | {'мс':>8} | доля")
+    for package, us in sorted(by_package.items(), key=lambda x: -x[1])[:top]:
+        print(f"{package:<24} | {us / 1000:8.1f} | {us / total:5.1%}")
+
+    print(f"\n{'модуль бота':<40} | всего, мс | своё, мс")
+    for cumulative, own, name in sorted(bot_modules, reverse=True)[:top]:
+        print(f"{name:<40} | {cumulative / 1000:9.1f} | {own / 1000:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=None,
+        help="код возврата 1, если медиана холодного старта больше",
+    )
+    args = parser.parse_args()
+
+    runs = [cold_start() for _ in range(args.runs)]
+    print(f"{'фаза':<12} | медиана, с | мин, с")
+    for phase in ("interpreter", "import", "setup", "total"):
+        values = [run[phase] for run in runs]
+        print(f"{phase:<12} | {statistics.median(values):10.3f} | {min(values):6.3f}")
+
+    if args.profile:
+        import_profile(args.top)
+
+    median_total = statistics.median(run["total"] for run in runs)
+    if args.max_seconds is not None and median_total > args.max_seconds:
+        print(f"\nХолодный старт {median_total:.2f} с > {args.max_seconds:.2f} с")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import logging
 import os
 from dataclasses import dataclass
-from typing import List
+from functools import cached_property
+from typing import FrozenSet
 
 logger = logging.getLogger(__name__)
 
@@ -44,25 +45,89 @@ class Config:
     PRESETS_PATH: str = "data/presets.json"
     PRICE_PATH: str = "data/price.json"
 
+    # Контентно-адресуемое хранилище (исходники и результаты пакетных задач)
+    BLOB_STORE_DIR: str = os.getenv("BLOB_STORE_DIR", "data/blobs")
+    BATCH_JOB_TTL_HOURS: int = int(os.getenv("BATCH_JOB_TTL_HOURS", "72"))
+    # Окно, в котором готовый результат пакета переиспользуется без запроса
+    BATCH_DEDUP_WINDOW_HOURS: int = int(os.getenv("BATCH_DEDUP_WINDOW_HOURS", "24"))
+
+    # Сколько секунд повтор того же запроса считается дублем (двойной клик)
+    REQUEST_COALESCE_WINDOW: int = int(os.getenv("REQUEST_COALESCE_WINDOW", "60"))
+
+    # Лимиты исходящих запросов к Telegram
+    TELEGRAM_GLOBAL_RATE: float = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+    TELEGRAM_CHAT_RATE: float = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+    TELEGRAM_GROUP_PER_MINUTE: float = float(
+        os.getenv("TELEGRAM_GROUP_PER_MINUTE", "20")
+    )
+
+    # Сколько сообщений рассылки отправляется одновременно
+    BROADCAST_CONCURRENCY: int = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+
+    # Как часто проверять изменения presets.json и price.json (секунды, 0 — не следить)
+    PRESETS_WATCH_INTERVAL: float = float(os.getenv("PRESETS_WATCH_INTERVAL", "2"))
+
+    # Как часто сверять зависшие платежи с Т-Банком (секунды)
+    PAYMENT_RECONCILE_INTERVAL: int = int(
+        os.getenv("PAYMENT_RECONCILE_INTERVAL", "60")
+    )
+
+    # Правки сообщений о прогрессе: интервал на сообщение и общий лимит
+    PROGRESS_UPDATE_INTERVAL: float = float(os.getenv("PROGRESS_UPDATE_INTERVAL", "5"))
+    PROGRESS_MAX_EDITS_PER_SECOND: float = float(
+        os.getenv("PROGRESS_MAX_EDITS_PER_SECOND", "20")
+    )
+
+    # Кэш результатов детерминированных генераций
+    RESULT_CACHE_DIR: str = os.getenv("RESULT_CACHE_DIR", "data/cache/results")
+    RESULT_CACHE_MAX_MB: int = int(os.getenv("RESULT_CACHE_MAX_MB", "512"))
+
+    # Сессии многоходового редактирования (пустой CHAT_HISTORY_DIR — без диска)
+    CHAT_MAX_SESSIONS: int = int(os.getenv("CHAT_MAX_SESSIONS", "200"))
+    CHAT_IDLE_TTL: int = int(os.getenv("CHAT_IDLE_TTL", "1800"))
+    CHAT_MAX_MEMORY_MB: int = int(os.getenv("CHAT_MAX_MEMORY_MB", "512"))
+    CHAT_HISTORY_DIR: str = os.getenv("CHAT_HISTORY_DIR", "data/cache/chats")
+
+    # Адаптивный лимит параллельных запросов к провайдеру (AIMD)
+    PROVIDER_INITIAL_CONCURRENCY: int = int(
+        os.getenv("PROVIDER_INITIAL_CONCURRENCY", "3")
+    )
+    PROVIDER_MAX_CONCURRENCY: int = int(os.getenv("PROVIDER_MAX_CONCURRENCY", "16"))
+
+    # Пул процессов обработки изображений (0 — по числу ядер, но не больше 4)
+    IMAGE_POOL_WORKERS: int = int(os.getenv("IMAGE_POOL_WORKERS", "0"))
+
+    # Превью результатов, отправляемых фото (оригинал — документом по кнопке)
+    PREVIEW_MAX_SIDE: int = int(os.getenv("PREVIEW_MAX_SIDE", "2560"))
+    PREVIEW_JPEG_QUALITY: int = int(os.getenv("PREVIEW_JPEG_QUALITY", "87"))
+
+    # Логирование: уровень, формат (text/json), предел длины сообщения и
+    # выборка шумных логгеров ("aiohttp.access=0.1,bot.services.x=0.5")
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")
+    LOG_MAX_MESSAGE: int = int(os.getenv("LOG_MAX_MESSAGE", "2000"))
+    LOG_SAMPLING: str = os.getenv("LOG_SAMPLING", "")
+
     # Админы (список ID через запятую)
     ADMIN_IDS_STR: str = os.getenv("ADMIN_IDS", "")
 
-    @property
-    def admin_ids(self) -> List[int]:
-        """Парсит список ID админов из строки"""
+    @cached_property
+    def admin_ids(self) -> FrozenSet[int]:
+        """
+        ID админов из ADMIN_IDS (разбирается один раз).
+
+        Проверять права нужно через bot.services.admins.admin_registry —
+        он добавляет админов из price.json.
+        """
         if not self.ADMIN_IDS_STR:
-            return []
+            return frozenset()
         try:
-            return [
+            return frozenset(
                 int(id.strip()) for id in self.ADMIN_IDS_STR.split(",") if id.strip()
-            ]
+            )
         except ValueError:
             logger.warning(f"Invalid ADMIN_IDS format: {self.ADMIN_IDS_STR}")
-            return []
-
-    def is_admin(self, telegram_id: int) -> bool:
-        """Проверяет, является ли пользователь админом"""
-        return telegram_id in self.admin_ids
+            return frozenset()
 
     @property
     def webhook_url(self) -> str:
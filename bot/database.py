@@ -1,6 +1,7 @@
 import asyncio
 import logging
 import os
+import time
 from dataclasses import dataclass
 from datetime import datetime
 from typing import List, Optional
@@ -127,10 +128,281 @@ async def init_db():
         """
         )
 
+        # Состояние пакетных задач (переживает перезапуск бота)
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS batch_job_state (
+                job_id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                prompt TEXT NOT NULL,
+                aspect_ratio TEXT NOT NULL,
+                total_cost INTEGER NOT NULL,
+                status TEXT DEFAULT 'pending',
+                created_at REAL NOT NULL,
+                completed_at REAL
+            )
+        """
+        )
+
+        # Элементы пакетных задач; изображения лежат в BlobStore по хешу
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS batch_job_items (
+                job_id TEXT NOT NULL,
+                item_index INTEGER NOT NULL,
+                prompt TEXT NOT NULL,
+                image_hash TEXT,
+                image_url TEXT,
+                status TEXT DEFAULT 'pending',
+                result_hash TEXT,
+                result_url TEXT,
+                error TEXT,
+                started_at REAL,
+                completed_at REAL,
+                dedup_key TEXT,
+                PRIMARY KEY (job_id, item_index),
+                FOREIGN KEY (job_id) REFERENCES batch_job_state (job_id)
+                    ON DELETE CASCADE
+            )
+        """
+        )
+        await db.execute(
+            """CREATE INDEX IF NOT EXISTS idx_batch_job_state_status
+               ON batch_job_state (status)"""
+        )
+        await db.execute(
+            """CREATE INDEX IF NOT EXISTS idx_batch_job_items_image
+               ON batch_job_items (image_hash)"""
+        )
+        await db.execute(
+            """CREATE INDEX IF NOT EXISTS idx_batch_job_items_dedup
+               ON batch_job_items (dedup_key)"""
+        )
+
+        # История пакетных задач (раньше создавалась только при первой записи)
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS batch_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT UNIQUE NOT NULL,
+                user_id INTEGER NOT NULL,
+                mode TEXT NOT NULL,
+                total_cost INTEGER NOT NULL,
+                results_count INTEGER DEFAULT 0,
+                duration REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        """
+        )
+
+        # Агрегаты по пользователю для экрана баланса (ведёт add_generation_history)
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS user_stats (
+                user_id INTEGER PRIMARY KEY,
+                generations INTEGER NOT NULL DEFAULT 0,
+                total_spent INTEGER NOT NULL DEFAULT 0,
+                last_generation_at TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        """
+        )
+        cursor = await db.execute("SELECT 1 FROM user_stats LIMIT 1")
+        if await cursor.fetchone() is None:
+            # Первый запуск с агрегатами — собираем их из истории
+            await db.execute(
+                """INSERT OR IGNORE INTO user_stats
+                   (user_id, generations, total_spent, last_generation_at)
+                   SELECT user_id, COUNT(*), COALESCE(SUM(cost), 0), MAX(created_at)
+                   FROM generation_history GROUP BY user_id"""
+            )
+
+        # Рассылки с контрольной точкой (id последнего обработанного пользователя)
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL,
+                status TEXT DEFAULT 'running',
+                last_user_id INTEGER DEFAULT 0,
+                sent INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                blocked INTEGER DEFAULT 0,
+                admin_chat_id INTEGER,
+                progress_message_id INTEGER,
+                created_at REAL NOT NULL,
+                completed_at REAL
+            )
+        """
+        )
+
+        # Пользователи, заблокировавшие бота или удалённые, — рассылки их пропускают
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS blocked_recipients (
+                telegram_id INTEGER PRIMARY KEY,
+                reason TEXT,
+                blocked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+        )
+
+        # file_id отправленных в Telegram файлов: повторно шлём без загрузки
+        await db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS media_files (
+                media_key TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                file_unique_id TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (media_key, kind)
+            )
+        """
+        )
+
+        await _init_stats(db)
+
         await db.commit()
         logger.info("Database initialized successfully")
 
 
+# =============================================================================
+# СЧЁТЧИКИ СТАТИСТИКИ
+# =============================================================================
+
+_COMPLETED_PAYMENT = [("transactions", "1"), ("revenue", "NEW.amount_rub")]
+
+# (триггер, таблица, событие, условие, [(счётчик, прирост)])
+_STATS_TRIGGERS = [
+    ("users_insert", "users", "AFTER INSERT", None, [("users", "1")]),
+    (
+        "generations_insert",
+        "generation_history",
+        "AFTER INSERT",
+        None,
+        [("generations", "1"), ("spent_credits", "NEW.cost")],
+    ),
+    ("batch_jobs_insert", "batch_jobs", "AFTER INSERT", None, [("batch_jobs", "1")]),
+    (
+        "payments_insert",
+        "transactions",
+        "AFTER INSERT",
+        "NEW.status = 'completed'",
+        _COMPLETED_PAYMENT,
+    ),
+    (
+        "payments_complete",
+        "transactions",
+        "AFTER UPDATE OF status",
+        "NEW.status = 'completed' AND OLD.status IS NOT 'completed'",
+        _COMPLETED_PAYMENT,
+    ),
+    (
+        "payments_revert",
+        "transactions",
+        "AFTER UPDATE OF status",
+        "OLD.status = 'completed' AND NEW.status IS NOT 'completed'",
+        [("transactions", "-1"), ("revenue", "-OLD.amount_rub")],
+    ),
+]
+
+# Пересчёт счётчиков по существующим строкам (один раз, при их появлении)
+_STATS_BACKFILL = {
+    "users": "SELECT date(created_at), COUNT(*) FROM users GROUP BY 1",
+    "generations": "SELECT date(created_at), COUNT(*) FROM generation_history "
+    "GROUP BY 1",
+    "spent_credits": "SELECT date(created_at), SUM(cost) FROM generation_history "
+    "GROUP BY 1",
+    "batch_jobs": "SELECT date(created_at), COUNT(*) FROM batch_jobs GROUP BY 1",
+    "transactions": "SELECT date(created_at), COUNT(*) FROM transactions "
+    "WHERE status = 'completed' GROUP BY 1",
+    "revenue": "SELECT date(created_at), SUM(amount_rub) FROM transactions "
+    "WHERE status = 'completed' GROUP BY 1",
+}
+
+
+async def _init_stats(db):
+    """
+    Счётчики для админ-панели: итоги и дневные срезы.
+
+    Их ведут триггеры SQLite при каждой вставке/смене статуса, поэтому
+    панель читает готовые значения вместо COUNT(*) по всем таблицам.
+    """
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value REAL NOT NULL DEFAULT 0
+        )
+    """
+    )
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            day TEXT NOT NULL,
+            name TEXT NOT NULL,
+            value REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, name)
+        )
+    """
+    )
+
+    cursor = await db.execute("SELECT COUNT(*) FROM stats_counters")
+    if (await cursor.fetchone())[0] == 0:
+        for name, query in _STATS_BACKFILL.items():
+            cursor = await db.execute(query)
+            days = [(day, value or 0) for day, value in await cursor.fetchall()]
+            await db.executemany(
+                "INSERT INTO stats_daily (day, name, value) VALUES (?, ?, ?)",
+                [(day, name, value) for day, value in days if day],
+            )
+            await db.execute(
+                "INSERT INTO stats_counters (name, value) VALUES (?, ?)",
+                (name, sum(value for _, value in days)),
+            )
+
+    for trigger, table, event, condition, increments in _STATS_TRIGGERS:
+        body = "".join(
+            f"""
+            INSERT INTO stats_counters (name, value) VALUES ('{name}', {delta})
+                ON CONFLICT (name) DO UPDATE SET value = value + excluded.value;
+            INSERT INTO stats_daily (day, name, value)
+                VALUES (date('now'), '{name}', {delta})
+                ON CONFLICT (day, name) DO UPDATE SET value = value + excluded.value;"""
+            for name, delta in increments
+        )
+        when = f"WHEN {condition}" if condition else ""
+        await db.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS stats_{trigger}
+                {event} ON {table} {when}
+                BEGIN{body}
+                END"""
+        )
+
+
+async def get_stats_counters() -> dict:
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute("SELECT name, value FROM stats_counters")
+        return {name: value for name, value in await cursor.fetchall()}
+
+
+async def get_daily_stats(days: int = 7) -> List[dict]:
+    """Дневные срезы за последние days дней, от новых к старым"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(
+            """SELECT day, name, value FROM stats_daily
+               WHERE day > date('now', ?)
+               ORDER BY day DESC""",
+            (f"-{days} days",),
+        )
+        result = {}
+        for day, name, value in await cursor.fetchall():
+            result.setdefault(day, {"day": day})[name] = value
+        return list(result.values())
+
+
 async def get_or_create_user(telegram_id: int) -> User:
     """Получает или создаёт пользователя (thread-safe)"""
     async with aiosqlite.connect(DATABASE_PATH) as db:
@@ -201,10 +473,10 @@ async def deduct_credits(
     telegram_id: int, amount: int, check_balance: bool = True
 ) -> bool:
     """Списывает кредиты с проверкой баланса"""
-    from bot.config import config
+    from bot.services.admins import admin_registry
 
     # Админы не платят
-    if config.is_admin(telegram_id):
+    if admin_registry.is_admin(telegram_id):
         logger.info(f"Admin {telegram_id} - free access (skipped {amount} credits)")
         return True
 
@@ -232,10 +504,10 @@ async def deduct_credits(
 
 async def check_can_afford(telegram_id: int, amount: int) -> bool:
     """Проверяет, может ли пользователь позволить себе операцию"""
-    from bot.config import config
+    from bot.services.admins import admin_registry
 
     # Админы всегда могут
-    if config.is_admin(telegram_id):
+    if admin_registry.is_admin(telegram_id):
         return True
 
     user = await get_or_create_user(telegram_id)
@@ -266,6 +538,87 @@ async def create_transaction(
             return False
 
 
+async def complete_transaction(order_id: str) -> Optional[int]:
+    """
+    Подтверждает платёж и начисляет кредиты одной транзакцией БД.
+
+    Идемпотентно: кредиты начисляет только вызов, который перевёл статус
+    из 'pending' в 'completed' (вебхук, ручная проверка или сверка).
+    Возвращает telegram_id получателя или None, если платёж уже обработан.
+    """
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(
+            """UPDATE transactions SET status = 'completed'
+               WHERE order_id = ? AND status = 'pending'""",
+            (order_id,),
+        )
+        if cursor.rowcount != 1:
+            return None
+
+        cursor = await db.execute(
+            """SELECT u.id, u.telegram_id, t.credits
+               FROM transactions t JOIN users u ON u.id = t.user_id
+               WHERE t.order_id = ?""",
+            (order_id,),
+        )
+        row = await cursor.fetchone()
+        if row is None:
+            await db.rollback()
+            logger.error(f"No user for transaction {order_id}")
+            return None
+
+        user_id, telegram_id, credits = row
+        await db.execute(
+            """UPDATE users SET credits = credits + ?, updated_at = CURRENT_TIMESTAMP
+               WHERE id = ?""",
+            (credits, user_id),
+        )
+        await db.commit()
+        logger.info(f"Transaction {order_id}: added {credits} credits to {telegram_id}")
+        return telegram_id
+
+
+async def reject_transaction(order_id: str, status: str = "failed") -> bool:
+    """Закрывает ожидающий платёж без начисления (банк его отклонил)"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(
+            """UPDATE transactions SET status = ?
+               WHERE order_id = ? AND status = 'pending'""",
+            (status, order_id),
+        )
+        await db.commit()
+        return cursor.rowcount == 1
+
+
+async def get_pending_transactions(
+    min_age_seconds: int, max_age_seconds: int
+) -> List[Transaction]:
+    """Ожидающие платежи в окне возраста, от старых к новым"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT * FROM transactions
+               WHERE status = 'pending' AND payment_id IS NOT NULL
+                 AND created_at <= datetime('now', ?)
+                 AND created_at >= datetime('now', ?)
+               ORDER BY created_at""",
+            (f"-{int(min_age_seconds)} seconds", f"-{int(max_age_seconds)} seconds"),
+        )
+        return [
+            Transaction(
+                id=row["id"],
+                order_id=row["order_id"],
+                user_id=row["user_id"],
+                payment_id=row["payment_id"],
+                credits=row["credits"],
+                amount_rub=row["amount_rub"],
+                status=row["status"],
+                created_at=datetime.fromisoformat(row["created_at"]),
+            )
+            for row in await cursor.fetchall()
+        ]
+
+
 async def get_transaction_by_order(order_id: str) -> Optional[Transaction]:
     """Получает транзакцию по order_id"""
     async with aiosqlite.connect(DATABASE_PATH) as db:
@@ -372,7 +725,7 @@ async def complete_video_task(task_id: str, result_url: str) -> bool:
 async def add_generation_history(
     user_id: int, preset_id: str, prompt: str, cost: int
 ) -> bool:
-    """Добавляет запись в историю генераций"""
+    """Добавляет запись в историю генераций и обновляет агрегаты пользователя"""
     async with aiosqlite.connect(DATABASE_PATH) as db:
         await db.execute(
             """INSERT INTO generation_history 
@@ -380,70 +733,66 @@ async def add_generation_history(
                VALUES (?, ?, ?, ?)""",
             (user_id, preset_id, prompt, cost),
         )
+        await db.execute(
+            """INSERT INTO user_stats
+               (user_id, generations, total_spent, last_generation_at)
+               VALUES (?, 1, ?, CURRENT_TIMESTAMP)
+               ON CONFLICT (user_id) DO UPDATE SET
+                   generations = generations + 1,
+                   total_spent = total_spent + excluded.total_spent,
+                   last_generation_at = excluded.last_generation_at""",
+            (user_id, cost),
+        )
         await db.commit()
         return True
 
 
 async def get_user_stats(telegram_id: int) -> dict:
-    """Получает статистику пользователя"""
+    """Получает статистику пользователя (один запрос по ключу)"""
     async with aiosqlite.connect(DATABASE_PATH) as db:
         db.row_factory = aiosqlite.Row
-
-        # Получаем пользователя
-        user = await get_or_create_user(telegram_id)
-
-        # Считаем количество генераций
         cursor = await db.execute(
-            "SELECT COUNT(*) as count FROM generation_history WHERE user_id = ?",
-            (user.id,),
+            """SELECT u.credits, u.created_at,
+                      s.generations, s.total_spent, s.last_generation_at
+               FROM users u
+               LEFT JOIN user_stats s ON s.user_id = u.id
+               WHERE u.telegram_id = ?""",
+            (telegram_id,),
         )
-        gen_row = await cursor.fetchone()
-
-        # Считаем потраченные кредиты
-        cursor = await db.execute(
-            "SELECT SUM(cost) as total FROM generation_history WHERE user_id = ?",
-            (user.id,),
-        )
-        cost_row = await cursor.fetchone()
+        row = await cursor.fetchone()
 
+    if row is None:
+        # Новый пользователь — создаём, статистики у него ещё нет
+        user = await get_or_create_user(telegram_id)
         return {
             "credits": user.credits,
-            "generations": gen_row["count"] or 0,
-            "total_spent": cost_row["total"] or 0,
+            "generations": 0,
+            "total_spent": 0,
+            "last_generation_at": None,
             "member_since": user.created_at.strftime("%d.%m.%Y"),
         }
 
+    return {
+        "credits": row["credits"],
+        "generations": row["generations"] or 0,
+        "total_spent": row["total_spent"] or 0,
+        "last_generation_at": row["last_generation_at"],
+        "member_since": datetime.fromisoformat(row["created_at"]).strftime(
+            "%d.%m.%Y"
+        ),
+    }
 
-async def get_admin_stats() -> dict:
-    """Получает общую статистику для админа"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-
-        # Всего пользователей
-        cursor = await db.execute("SELECT COUNT(*) as count FROM users")
-        users_row = await cursor.fetchone()
 
-        # Всего генераций
-        cursor = await db.execute("SELECT COUNT(*) as count FROM generation_history")
-        gen_row = await cursor.fetchone()
-
-        # Всего транзакций
-        cursor = await db.execute(
-            "SELECT COUNT(*) as count, SUM(amount_rub) as total FROM transactions WHERE status = 'completed'"
-        )
-        trans_row = await cursor.fetchone()
-
-        # Пакетных генераций
-        cursor = await db.execute("SELECT COUNT(*) as count FROM batch_jobs")
-        batch_row = await cursor.fetchone()
-
-        return {
-            "total_users": users_row["count"] or 0,
-            "total_generations": gen_row["count"] or 0,
-            "total_revenue": trans_row["total"] or 0,
-            "total_transactions": trans_row["count"] or 0,
-            "total_batch_jobs": batch_row["count"] or 0,
-        }
+async def get_admin_stats() -> dict:
+    """Получает общую статистику для админа (из счётчиков, без COUNT(*))"""
+    counters = await get_stats_counters()
+    return {
+        "total_users": int(counters.get("users", 0)),
+        "total_generations": int(counters.get("generations", 0)),
+        "total_revenue": counters.get("revenue", 0),
+        "total_transactions": int(counters.get("transactions", 0)),
+        "total_batch_jobs": int(counters.get("batch_jobs", 0)),
+    }
 
 
 async def save_batch_job(
@@ -488,6 +837,208 @@ async def save_batch_job(
             return False
 
 
+async def save_batch_state(job: dict, items: List[dict]) -> bool:
+    """Сохраняет состояние пакетной задачи вместе со всеми элементами"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        await db.execute(
+            """INSERT OR REPLACE INTO batch_job_state
+               (job_id, user_id, prompt, aspect_ratio, total_cost, status,
+                created_at, completed_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                job["job_id"],
+                job["user_id"],
+                job["prompt"],
+                job["aspect_ratio"],
+                job["total_cost"],
+                job["status"],
+                job["created_at"],
+                job.get("completed_at"),
+            ),
+        )
+        await db.executemany(
+            """INSERT OR REPLACE INTO batch_job_items
+               (job_id, item_index, prompt, image_hash, image_url, status,
+                result_hash, result_url, error, started_at, completed_at,
+                dedup_key)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [
+                (
+                    job["job_id"],
+                    item["item_index"],
+                    item["prompt"],
+                    item.get("image_hash"),
+                    item.get("image_url"),
+                    item["status"],
+                    item.get("result_hash"),
+                    item.get("result_url"),
+                    item.get("error"),
+                    item.get("started_at"),
+                    item.get("completed_at"),
+                    item.get("dedup_key"),
+                )
+                for item in items
+            ],
+        )
+        await db.commit()
+        return True
+
+
+async def update_batch_status(
+    job_id: str, status: str, completed_at: Optional[float] = None
+) -> bool:
+    """Обновляет статус пакетной задачи"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        await db.execute(
+            "UPDATE batch_job_state SET status = ?, completed_at = ? WHERE job_id = ?",
+            (status, completed_at, job_id),
+        )
+        await db.commit()
+        return True
+
+
+async def update_batch_item(job_id: str, item: dict) -> bool:
+    """Сохраняет результат одного элемента пакетной задачи"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        await db.execute(
+            """UPDATE batch_job_items
+               SET status = ?, result_hash = ?, result_url = ?, error = ?,
+                   started_at = ?, completed_at = ?
+               WHERE job_id = ? AND item_index = ?""",
+            (
+                item["status"],
+                item.get("result_hash"),
+                item.get("result_url"),
+                item.get("error"),
+                item.get("started_at"),
+                item.get("completed_at"),
+                job_id,
+                item["item_index"],
+            ),
+        )
+        await db.commit()
+        return True
+
+
+async def update_batch_cost(job_id: str, total_cost: int) -> bool:
+    """Обновляет итоговую стоимость пакетной задачи (после возврата за дубли)"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        await db.execute(
+            "UPDATE batch_job_state SET total_cost = ? WHERE job_id = ?",
+            (total_cost, job_id),
+        )
+        await db.commit()
+        return True
+
+
+async def find_recent_batch_result(dedup_key: str, since: float) -> Optional[dict]:
+    """
+    Ищет готовый результат того же редактирования в недавних пакетах.
+
+    dedup_key — ключ работы, посчитанный при сохранении элементов
+    (BatchEditingService.dedup_key): промпт в нём уже нормализован.
+    """
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """SELECT i.result_hash, i.result_url
+               FROM batch_job_items i
+               JOIN batch_job_state s ON s.job_id = i.job_id
+               WHERE i.dedup_key = ?
+                 AND i.status = 'completed' AND i.result_hash IS NOT NULL
+                 AND s.created_at >= ?
+               ORDER BY i.completed_at DESC
+               LIMIT 1""",
+            (dedup_key, since),
+        )
+        row = await cursor.fetchone()
+        return dict(row) if row else None
+
+
+async def get_batch_state(job_id: str) -> Optional[dict]:
+    """Загружает пакетную задачу с элементами, None если её нет"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        db.row_factory = aiosqlite.Row
+
+        cursor = await db.execute(
+            "SELECT * FROM batch_job_state WHERE job_id = ?", (job_id,)
+        )
+        row = await cursor.fetchone()
+        if not row:
+            return None
+
+        cursor = await db.execute(
+            """SELECT * FROM batch_job_items
+               WHERE job_id = ? ORDER BY item_index""",
+            (job_id,),
+        )
+        items = await cursor.fetchall()
+
+        job = dict(row)
+        job["items"] = [dict(item) for item in items]
+        return job
+
+
+async def get_batch_job_ids_by_status(status: str) -> List[str]:
+    """Возвращает ID пакетных задач с указанным статусом"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(
+            "SELECT job_id FROM batch_job_state WHERE status = ? ORDER BY created_at",
+            (status,),
+        )
+        return [row[0] for row in await cursor.fetchall()]
+
+
+async def delete_old_batch_states(before: float) -> List[str]:
+    """
+    Удаляет пакетные задачи, созданные раньше before, кроме выполняющихся.
+    Под очистку попадают и так и не запущенные ('pending'): пользователь
+    отменил пакет, выбрал формат заново или не хватило баланса.
+    Возвращает хеши блобов, на которые больше никто не ссылается.
+    """
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(
+            """SELECT job_id FROM batch_job_state
+               WHERE created_at < ? AND status != 'running'""",
+            (before,),
+        )
+        job_ids = [row[0] for row in await cursor.fetchall()]
+        if not job_ids:
+            return []
+
+        placeholders = ", ".join("?" for _ in job_ids)
+        cursor = await db.execute(
+            f"""SELECT image_hash, result_hash FROM batch_job_items
+                WHERE job_id IN ({placeholders})""",
+            job_ids,
+        )
+        candidates = {h for row in await cursor.fetchall() for h in row if h}
+
+        await db.execute(
+            f"DELETE FROM batch_job_items WHERE job_id IN ({placeholders})", job_ids
+        )
+        await db.execute(
+            f"DELETE FROM batch_job_state WHERE job_id IN ({placeholders})", job_ids
+        )
+
+        still_used = set()
+        if candidates:
+            hashes = list(candidates)
+            marks = ", ".join("?" for _ in hashes)
+            cursor = await db.execute(
+                f"""SELECT image_hash FROM batch_job_items WHERE image_hash IN ({marks})
+                    UNION
+                    SELECT result_hash FROM batch_job_items
+                    WHERE result_hash IN ({marks})""",
+                hashes + hashes,
+            )
+            still_used = {row[0] for row in await cursor.fetchall()}
+
+        await db.commit()
+        logger.info(f"Deleted {len(job_ids)} old batch jobs")
+        return sorted(candidates - still_used)
+
+
 async def get_batch_jobs_by_user(telegram_id: int, limit: int = 10) -> list:
     """Получает историю пакетных генераций пользователя"""
     async with aiosqlite.connect(DATABASE_PATH) as db:
@@ -674,3 +1225,151 @@ async def save_user_settings(
             logger.info(f"Created settings for user {telegram_id}")
 
         return True
+
+
+# =============================================================================
+# РАССЫЛКИ
+# =============================================================================
+
+
+async def create_broadcast(
+    text: str, admin_chat_id: int, progress_message_id: Optional[int] = None
+) -> int:
+    """Создаёт рассылку и возвращает её id"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(
+            """INSERT INTO broadcasts
+               (text, admin_chat_id, progress_message_id, created_at)
+               VALUES (?, ?, ?, ?)""",
+            (text, admin_chat_id, progress_message_id, time.time()),
+        )
+        await db.commit()
+        return cursor.lastrowid
+
+
+async def get_broadcast(broadcast_id: int) -> Optional[dict]:
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,)
+        )
+        row = await cursor.fetchone()
+        return dict(row) if row else None
+
+
+async def get_broadcast_ids_by_status(status: str) -> List[int]:
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(
+            "SELECT id FROM broadcasts WHERE status = ? ORDER BY id", (status,)
+        )
+        return [row[0] for row in await cursor.fetchall()]
+
+
+async def save_broadcast_progress(
+    broadcast_id: int, last_user_id: int, sent: int, failed: int, blocked: int
+) -> bool:
+    """Контрольная точка: всё до last_user_id включительно уже обработано"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        await db.execute(
+            """UPDATE broadcasts
+               SET last_user_id = ?, sent = ?, failed = ?, blocked = ?
+               WHERE id = ?""",
+            (last_user_id, sent, failed, blocked, broadcast_id),
+        )
+        await db.commit()
+        return True
+
+
+async def finish_broadcast(broadcast_id: int, status: str = "completed") -> bool:
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        await db.execute(
+            "UPDATE broadcasts SET status = ?, completed_at = ? WHERE id = ?",
+            (status, time.time(), broadcast_id),
+        )
+        await db.commit()
+        return True
+
+
+async def get_broadcast_recipients(after_user_id: int, limit: int) -> List[tuple]:
+    """
+    Следующая страница получателей (id, telegram_id) после after_user_id.
+
+    Постраничный проход по первичному ключу вместо fetchall(): в памяти
+    только одна страница, и соединение не держится открытым всю рассылку.
+    """
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(
+            """SELECT u.id, u.telegram_id FROM users u
+               WHERE u.id > ?
+                 AND NOT EXISTS (
+                     SELECT 1 FROM blocked_recipients b
+                     WHERE b.telegram_id = u.telegram_id
+                 )
+               ORDER BY u.id
+               LIMIT ?""",
+            (after_user_id, limit),
+        )
+        return [tuple(row) for row in await cursor.fetchall()]
+
+
+async def mark_recipient_blocked(telegram_id: int, reason: str) -> bool:
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        await db.execute(
+            """INSERT OR REPLACE INTO blocked_recipients (telegram_id, reason)
+               VALUES (?, ?)""",
+            (telegram_id, reason),
+        )
+        await db.commit()
+        return True
+
+
+async def unmark_recipient_blocked(telegram_id: int) -> bool:
+    """Пользователь снова написал боту — рассылки ему снова доступны"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(
+            "DELETE FROM blocked_recipients WHERE telegram_id = ?", (telegram_id,)
+        )
+        await db.commit()
+        return cursor.rowcount > 0
+
+
+# =============================================================================
+# FILE_ID ОТПРАВЛЕННЫХ ФАЙЛОВ
+# =============================================================================
+
+
+async def get_media_file_id(media_keys: List[str], kind: str) -> Optional[str]:
+    """file_id первого найденного ключа (URL или хеш содержимого)"""
+    if not media_keys:
+        return None
+    placeholders = ", ".join("?" for _ in media_keys)
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(
+            f"""SELECT file_id FROM media_files
+                WHERE kind = ? AND media_key IN ({placeholders})
+                LIMIT 1""",
+            (kind, *media_keys),
+        )
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+
+async def save_media_file(
+    media_keys: List[str], kind: str, file_id: str, file_unique_id: Optional[str]
+) -> bool:
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        await db.executemany(
+            """INSERT OR REPLACE INTO media_files
+               (media_key, kind, file_id, file_unique_id) VALUES (?, ?, ?, ?)""",
+            [(key, kind, file_id, file_unique_id) for key in media_keys],
+        )
+        await db.commit()
+        return True
+
+
+async def delete_media_file(file_id: str) -> bool:
+    """Забывает file_id, который Telegram больше не принимает"""
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        await db.execute("DELETE FROM media_files WHERE file_id = ?", (file_id,))
+        await db.commit()
+        return True
@@ -4,15 +4,21 @@ from aiogram import Bot, F, Router, types
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
-from bot.config import config
 from bot.database import (
     add_credits,
     get_admin_stats,
+    get_daily_stats,
     get_or_create_user,
     get_user_stats,
 )
 from bot.keyboards import get_admin_keyboard, get_back_keyboard
+from bot.services.admins import admin_registry
+from bot.services.broadcast import broadcast_service
+from bot.services.concurrency import provider_limiters
+from bot.services.delivery import delivery_planner
+from bot.services.outbound import outbound_scheduler
 from bot.services.preset_manager import preset_manager
+from bot.services.result_cache import result_cache
 from bot.states import AdminStates
 
 logger = logging.getLogger(__name__)
@@ -21,7 +27,7 @@ router = Router()
 
 def is_admin(user_id: int) -> bool:
     """Проверяет, является ли пользователь администратором"""
-    return config.is_admin(user_id)
+    return admin_registry.is_admin(user_id)
 
 
 @router.message(Command("admin"))
@@ -55,7 +61,7 @@ async def admin_reload_presets(callback: types.CallbackQuery):
         await callback.answer("⛔ Нет доступа")
         return
 
-    success = preset_manager.reload()
+    success = await preset_manager.reload_async()
 
     if success:
         await callback.answer(
@@ -74,6 +80,21 @@ async def admin_show_stats(callback: types.CallbackQuery):
         return
 
     stats = await get_admin_stats()
+    cache_stats = result_cache.stats()
+    limiter_lines = "\n".join(
+        f"• {name}: лимит <code>{ls['limit']}</code>, в работе "
+        f"<code>{ls['in_flight']}</code>, в очереди <code>{ls['queued']}</code>, "
+        f"перегрузок <code>{ls['overloads']}</code>"
+        for name, ls in provider_limiters.stats().items()
+    )
+    outbound = outbound_scheduler.stats()
+    delivery = delivery_planner.stats()
+    daily_lines = "\n".join(
+        f"• {day['day']}: 👥 +<code>{day.get('users', 0):.0f}</code>, "
+        f"🎨 <code>{day.get('generations', 0):.0f}</code>, "
+        f"💳 <code>{day.get('revenue', 0):.0f}</code> ₽"
+        for day in await get_daily_stats(7)
+    )
 
     text = f"""
 📊 <b>Детальная статистика</b>
@@ -88,9 +109,26 @@ async def admin_show_stats(callback: types.CallbackQuery):
 • Транзакций: <code>{stats['total_transactions']}</code>
 • Выручка: <code>{stats['total_revenue']:.0f}</code> ₽
 
+📈 <b>По дням (7 дней):</b>
+{daily_lines or "• Данных пока нет"}
+
 📂 <b>Пресеты:</b>
 • Категорий: <code>{len(preset_manager._categories)}</code>
 • Шаблонов: <code>{len(preset_manager._presets)}</code>
+
+♻️ <b>Кэш результатов:</b>
+• Попаданий: <code>{cache_stats['hits']}</code> из <code>{cache_stats['hits'] + cache_stats['misses']}</code> (<code>{cache_stats['hit_rate']:.1f}%</code>)
+• Сэкономлено: <code>{cache_stats['saved_cost']}</code>🍌
+• Записей: <code>{cache_stats['entries']}</code> (<code>{cache_stats['size_bytes'] / 1024 / 1024:.1f}</code> / <code>{cache_stats['max_bytes'] / 1024 / 1024:.0f}</code> МБ)
+
+🚦 <b>Параллельность провайдеров:</b>
+{limiter_lines or "• Запросов ещё не было"}
+
+📤 <b>Исходящие в Telegram:</b>
+• В очереди: <code>{outbound['queued']}</code> (результаты <code>{outbound['by_priority']['result']}</code>, ответы <code>{outbound['by_priority']['normal']}</code>, рассылки <code>{outbound['by_priority']['bulk']}</code>)
+• Отправлено: <code>{outbound['sent']}</code>, повторов по 429: <code>{outbound['retries']}</code>
+• Файлы: по file_id <code>{delivery['chosen']['file_id']}</code>, по ссылке <code>{delivery['chosen']['url']}</code>, загрузкой <code>{delivery['chosen']['upload']}</code>
+• Канал: <code>{delivery['upload_rate_kbps']}</code> КБ/с, static-хост {"доступен" if delivery['host_available'] else "недоступен"}
 """
 
     await callback.message.edit_text(
@@ -320,36 +358,14 @@ async def admin_execute_broadcast(
 
     await callback.message.edit_text("📢 <b>Рассылка запущена...</b>", parse_mode="HTML")
 
-    # Получаем всех пользователей
-    import aiosqlite
-
-    from bot.database import DATABASE_PATH
-
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT telegram_id FROM users")
-        users = await cursor.fetchall()
-
-    success_count = 0
-    error_count = 0
-
-    for user in users:
-        try:
-            await bot.send_message(
-                user["telegram_id"], broadcast_text, parse_mode="HTML"
-            )
-            success_count += 1
-        except Exception as e:
-            logger.warning(f"Broadcast failed for {user['telegram_id']}: {e}")
-            error_count += 1
-
-    await callback.message.edit_text(
-        f"📢 <b>Рассылка завершена!</b>\n\n"
-        f"✅ Успешно: <code>{success_count}</code>\n"
-        f"❌ Ошибок: <code>{error_count}</code>",
-        reply_markup=get_admin_keyboard(),
-        parse_mode="HTML",
+    # Рассылка идёт в фоне; прогресс обновляется в этом же сообщении
+    broadcast_id = await broadcast_service.start(
+        bot,
+        broadcast_text,
+        admin_chat_id=callback.message.chat.id,
+        progress_message_id=callback.message.message_id,
     )
+    logger.info(f"Broadcast {broadcast_id} started by {callback.from_user.id}")
 
     await state.clear()
 
@@ -1,8 +1,12 @@
 import asyncio
 import logging
+import os
+import uuid
+from datetime import datetime
 from typing import Optional
 
 from aiogram import Bot, F, Router, types
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -10,8 +14,13 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from bot.config import config
 from bot.database import add_credits, check_can_afford, deduct_credits, get_user_credits
 from bot.keyboards import get_main_menu_keyboard
+from bot.services.admins import admin_registry
 from bot.services.batch_service import BatchStatus, batch_service
+from bot.services.media_registry import media_registry
+from bot.services.outbound import Priority, send_priority
 from bot.services.preset_manager import preset_manager
+from bot.services.preview import preview_renderer
+from bot.services.progress import progress_renderer
 from bot.states import GenerationStates
 
 logger = logging.getLogger(__name__)
@@ -94,12 +103,6 @@ _batch_upload_urls: dict[int, list[str]] = {}
 def _save_uploaded_file(file_bytes: bytes, file_ext: str = "png") -> Optional[str]:
     """Сохраняет загруженный файл в папку static/uploads и возвращает публичный URL."""
     try:
-        import os
-        import uuid
-        from datetime import datetime
-
-        from bot.config import config
-
         date_str = datetime.now().strftime("%Y%m%d")
         upload_dir = os.path.join("static", "uploads", date_str)
         os.makedirs(upload_dir, exist_ok=True)
@@ -303,7 +306,7 @@ async def process_batch_aspect_ratio(callback: types.CallbackQuery, state: FSMCo
         return
 
     # Проверяем баланс (админы могут бесплатно)
-    is_admin = config.is_admin(user_id)
+    is_admin = admin_registry.is_admin(user_id)
     user_credits = await get_user_credits(user_id)
 
     if not is_admin and user_credits < job.total_cost:
@@ -321,10 +324,18 @@ async def process_batch_aspect_ratio(callback: types.CallbackQuery, state: FSMCo
     # Сохраняем в состояние
     await state.update_data(batch_job_id=job.id, batch_cost=job.total_cost)
 
+    # Повторы и уже готовые результаты не оплачиваются
+    duplicates = (
+        f"♻️ Без оплаты (повторы): <code>{job.duplicates}</code>\n"
+        if job.duplicates
+        else ""
+    )
+
     await callback.message.edit_text(
         f"✏️ <b>Подтверждение пакетного редактирования</b>\n\n"
         f"📝 <b>Промпт:</b>\n<code>{user_prompt[:80]}{'...' if len(user_prompt) > 80 else ''}</code>\n\n"
         f"📊 Фото: <code>{len(images)}</code>\n"
+        f"{duplicates}"
         f"📐 Формат: <code>{aspect_ratio}</code>\n"
         f"🤖 Модель: <code>Gemini Pro</code> (2K)\n"
         f"💰 Стоимость: <code>{job.total_cost}</code>🍌\n\n"
@@ -349,7 +360,7 @@ async def execute_batch(callback: types.CallbackQuery, state: FSMContext, bot: B
         await callback.answer("Ошибка списания кредитов", show_alert=True)
         return
 
-    job = batch_service.get_job(job_id)
+    job = await batch_service.get_job(job_id)
     if not job:
         # Возвращаем кредиты
         await add_credits(user_id, cost)
@@ -376,38 +387,14 @@ async def execute_batch(callback: types.CallbackQuery, state: FSMContext, bot: B
         parse_mode="HTML",
     )
 
-    # Callback для обновления прогресса
-    last_update = [0]  # Для rate limiting
-
-    async def update_progress(job):
-        now = asyncio.get_event_loop().time()
-        if now - last_update[0] < 5:  # Минимум 5 секунд между обновлениями
-            return
-
-        last_update[0] = now
-
-        # Создаём визуальный прогресс-бар
-        percent = job.progress_percent
-        filled = percent // 10
-        bar = "█" * filled + "░" * (10 - filled)
-
-        try:
-            await progress_msg.edit_text(
-                f"⏳ <b>Пакетное редактирование</b>\n\n"
-                f"ID: <code>{job.id}</code>\n"
-                f"Прогресс: <code>{percent}%</code> [{bar}]\n"
-                f"Готово: <code>{sum(1 for i in job.items if i.status == BatchStatus.COMPLETED)}/{len(job.items)}</code>\n\n"
-                f"<i>Пожалуйста, подождите...</i>",
-                parse_mode="HTML",
-            )
-        except Exception:
-            pass  # Игнорируем ошибки редактирования
-
-    # Запускаем редактирование
+    # Запускаем редактирование; готовые варианты отправляем сразу
     try:
-        completed_job = await batch_service.execute_batch(job, update_progress)
+        completed_job = await stream_batch_results(
+            bot, callback.message.chat.id, job, track_batch_progress(progress_msg)
+        )
 
         # Удаляем сообщение прогресса
+        progress_renderer.discard(progress_msg.chat.id, progress_msg.message_id)
         try:
             await progress_msg.delete()
         except:
@@ -428,26 +415,104 @@ async def execute_batch(callback: types.CallbackQuery, state: FSMContext, bot: B
         )
 
 
+def batch_progress_text(job) -> str:
+    # Создаём визуальный прогресс-бар
+    percent = job.progress_percent
+    filled = percent // 10
+    bar = "█" * filled + "░" * (10 - filled)
+    done = sum(1 for i in job.items if i.status == BatchStatus.COMPLETED)
+
+    return (
+        f"⏳ <b>Пакетное редактирование</b>\n\n"
+        f"ID: <code>{job.id}</code>\n"
+        f"Прогресс: <code>{percent}%</code> [{bar}]\n"
+        f"Готово: <code>{done}/{len(job.items)}</code>\n\n"
+        f"<i>Пожалуйста, подождите...</i>"
+    )
+
+
+def track_batch_progress(progress_msg: types.Message):
+    """
+    Callback прогресса для пакета. Только кладёт состояние в общий
+    отрисовщик — воркер не ждёт Telegram и не держит слот провайдера.
+    """
+
+    async def update_progress(job):
+        progress_renderer.update(
+            progress_msg.chat.id, progress_msg.message_id, batch_progress_text(job)
+        )
+
+    return update_progress
+
+
+async def stream_batch_results(bot: Bot, chat_id: int, job, progress_callback=None):
+    """Выполняет пакет, отправляя каждый готовый вариант сразу после генерации"""
+    async for item in batch_service.iter_batch(job, progress_callback):
+        if item.status != BatchStatus.COMPLETED:
+            continue
+        try:
+            # Готовые варианты обгоняют в общей очереди рассылки и прочее
+            with send_priority(Priority.RESULT):
+                await send_batch_item(bot, chat_id, job, item)
+        except Exception as e:
+            logger.warning(f"Failed to deliver batch item {job.id}/{item.index}: {e}")
+
+    # Часть оплаченной работы сделал другой пакет — возвращаем разницу
+    if job.refund:
+        await add_credits(job.user_id, job.refund)
+        job.refund = 0
+    return job
+
+
+async def send_batch_item(bot: Bot, chat_id: int, job, item):
+    """Отправляет один готовый вариант: сжатое превью, оригинал — по кнопке"""
+    caption = f"✅ Вариант {item.index + 1} из {len(job.items)}"
+
+    sent = await preview_renderer.send_photo(
+        bot.send_photo,
+        lambda: batch_service.read_blob(item.result_hash),
+        digest=item.result_hash,
+        chat_id=chat_id,
+        caption=caption,
+    )
+    if sent is None and item.result_url:
+        # Блоб уже удалён — остаётся публичная ссылка на оригинал
+        await media_registry.send(
+            bot.send_document,
+            "document",
+            item.result_url,
+            chat_id=chat_id,
+            caption=caption,
+        )
+
+
 async def show_batch_results(
     callback: types.CallbackQuery, job, state: FSMContext, bot: Bot
 ):
     """Показывает результаты пакетного редактирования"""
+    await deliver_batch_results(bot, callback.message.chat.id, job)
+    await state.update_data(current_job_id=job.id)
 
-    successful = [i for i in job.items if i.result]
+
+async def deliver_batch_results(bot: Bot, chat_id: int, job):
+    """Отправляет галерею результатов (или возвращает кредиты, если их нет)"""
+
+    successful = [i for i in job.items if i.has_result]
     failed = [i for i in job.items if i.status == BatchStatus.FAILED]
 
     if not successful:
         # Полный возврат
-        await add_credits(callback.from_user.id, job.total_cost)
-        await callback.message.answer(
+        await add_credits(job.user_id, job.total_cost)
+        await bot.send_message(
+            chat_id,
             "❌ <b>Все редактирования не удались</b>\n" "Кредиты полностью возвращены.",
             reply_markup=get_main_menu_keyboard(),
             parse_mode="HTML",
         )
         return
 
-    # Создаём превью-галерею
-    gallery_bytes = await batch_service.create_gallery_preview(job)
+    # Создаём превью-галерею (больше 6 результатов — несколько страниц)
+    pages = await batch_service.create_gallery_pages(job)
 
     # Статистика
     duration = job.completed_at - job.created_at if job.completed_at else 0
@@ -460,44 +525,94 @@ async def show_batch_results(
         f"<i>Нажмите номер для просмотра в полном размере</i>"
     )
 
-    if gallery_bytes:
-        await callback.message.answer_photo(
-            photo=types.BufferedInputFile(gallery_bytes, "gallery.jpg"),
+    keyboard = get_results_gallery_keyboard(
+        job.id, len(successful), has_failed=len(failed) > 0
+    )
+
+    if len(pages) > 1:
+        # Страницы одним альбомом (до 10 фото), подпись и кнопки — следом
+        for start in range(0, len(pages), 10):
+            await bot.send_media_group(
+                chat_id,
+                media=[
+                    types.InputMediaPhoto(
+                        media=types.BufferedInputFile(
+                            page, f"gallery_{start + idx + 1}.jpg"
+                        )
+                    )
+                    for idx, page in enumerate(pages[start : start + 10])
+                ],
+            )
+        await bot.send_message(
+            chat_id, caption, reply_markup=keyboard, parse_mode="HTML"
+        )
+    elif pages:
+        await bot.send_photo(
+            chat_id,
+            photo=types.BufferedInputFile(pages[0], "gallery.jpg"),
             caption=caption,
-            reply_markup=get_results_gallery_keyboard(
-                job.id, len(successful), has_failed=len(failed) > 0
-            ),
+            reply_markup=keyboard,
             parse_mode="HTML",
         )
     else:
         # Если превью не создалось, показываем списком
-        await callback.message.answer(
+        await bot.send_message(
+            chat_id,
             caption,
-            reply_markup=get_results_gallery_keyboard(
-                job.id, len(successful), has_failed=len(failed) > 0
-            ),
+            reply_markup=keyboard,
             parse_mode="HTML",
         )
 
-    await state.update_data(current_job_id=job.id)
+
+async def resume_batch_jobs(bot: Bot) -> int:
+    """Дорабатывает пакетные задачи, прерванные перезапуском бота"""
+    jobs = await batch_service.get_unfinished_jobs()
+
+    async def _resume(job):
+        try:
+            progress_msg = await bot.send_message(
+                job.user_id,
+                f"🔄 <b>Бот был перезапущен</b>\n\n"
+                f"Продолжаю пакетное редактирование <code>{job.id}</code>...",
+                parse_mode="HTML",
+            )
+            # В личных чатах chat_id совпадает с telegram_id пользователя
+            await stream_batch_results(
+                bot, job.user_id, job, track_batch_progress(progress_msg)
+            )
+            progress_renderer.update(
+                progress_msg.chat.id,
+                progress_msg.message_id,
+                batch_progress_text(job),
+                final=True,
+            )
+            await deliver_batch_results(bot, job.user_id, job)
+        except Exception as e:
+            logger.exception(f"Failed to resume batch job {job.id}: {e}")
+
+    for job in jobs:
+        logger.info(f"Resuming batch job {job.id}")
+        asyncio.create_task(_resume(job))
+
+    return len(jobs)
 
 
 @router.callback_query(F.data.startswith("batchview_"))
 async def view_single_result(callback: types.CallbackQuery, state: FSMContext):
-    """Показывает один результат в полном размере с публичным URL"""
+    """Показывает один результат (превью) с кнопками апскейла и скачивания"""
 
     parts = callback.data.split("_")
     job_id = parts[1]
     item_index = int(parts[2])
 
-    job = batch_service.get_job(job_id)
+    job = await batch_service.get_job(job_id)
     if not job or item_index >= len(job.items):
         await callback.answer("Результат не найден")
         return
 
     item = job.items[item_index]
-    if not item.result_url:
-        await callback.answer("Этот вариант не был сгенерирован или URL недоступен")
+    if not item.has_result:
+        await callback.answer("Этот вариант не был сгенерирован")
         return
 
     # Показываем изображение с информацией
@@ -513,14 +628,43 @@ async def view_single_result(callback: types.CallbackQuery, state: FSMContext):
     builder.button(text="📥 Скачать", callback_data=f"download_{job_id}_{item_index}")
     builder.button(text="🔙 К галерее", callback_data=f"batchback_{job_id}")
 
-    await callback.message.answer_photo(
-        photo=item.result_url,
+    await preview_renderer.send_photo(
+        callback.message.answer_photo,
+        lambda: batch_service.read_blob(item.result_hash),
+        digest=item.result_hash,
         caption=info_text,
         reply_markup=builder.as_markup(),
         parse_mode="HTML",
     )
 
 
+@router.callback_query(F.data.startswith("download_"))
+async def download_single_result(callback: types.CallbackQuery):
+    """Отправляет оригинал варианта без сжатия документом"""
+    job_id, item_index = callback.data.replace("download_", "").rsplit("_", 1)
+    item_index = int(item_index)
+
+    job = await batch_service.get_job(job_id)
+    if not job or item_index >= len(job.items) or not job.items[item_index].has_result:
+        await callback.answer("Результат не найден")
+        return
+
+    item = job.items[item_index]
+    await callback.answer("📥 Отправляю оригинал...")
+
+    sent = await media_registry.send(
+        callback.message.answer_document,
+        "document",
+        lambda: batch_service.read_blob(item.result_hash),
+        f"variant_{item.index + 1}.png",
+        url=item.result_url,
+        digest=item.result_hash,
+        caption=f"📥 Вариант {item.index + 1} — оригинал без сжатия",
+    )
+    if sent is None:
+        await callback.message.answer("❌ Файл уже удалён")
+
+
 @router.callback_query(F.data.startswith("upscalemenu_"))
 async def show_upscale_options(callback: types.CallbackQuery):
     """Показывает опции апскейла"""
@@ -590,7 +734,7 @@ async def download_all_results(callback: types.CallbackQuery, bot: Bot):
     """Отправляет все результаты как альбом с публичными ссылками"""
 
     job_id = callback.data.replace("batchdownload_", "")
-    job = batch_service.get_job(job_id)
+    job = await batch_service.get_job(job_id)
 
     if not job:
         await callback.answer("Задача не найдена")
@@ -601,16 +745,39 @@ async def download_all_results(callback: types.CallbackQuery, bot: Bot):
         await callback.answer("Нет результатов для скачивания")
         return
 
-    # Формируем медиа-группу из публичных URL (максимум 10)
-    media_group = []
-    for i, item in enumerate(successful[:10]):
-        media = types.InputMediaPhoto(
-            media=item.result_url,
-            caption=f"Вариант {i+1}" if i == 0 else None,
-        )
-        media_group.append(media)
+    # Медиа-группа (максимум 10): уже отправленные варианты — по file_id,
+    # остальные Telegram заберёт по публичному URL
+    items = successful[:10]
+    keys = [
+        await media_registry.keys_for(url=i.result_url, digest=i.result_hash)
+        for i in items
+    ]
+    file_ids = [await media_registry.lookup(k, "photo") for k in keys]
+
+    def media_group():
+        return [
+            types.InputMediaPhoto(
+                media=file_id or item.result_url,
+                caption=f"Вариант {n + 1}" if n == 0 else None,
+            )
+            for n, (item, file_id) in enumerate(zip(items, file_ids))
+        ]
+
+    try:
+        messages = await callback.message.answer_media_group(media=media_group())
+    except TelegramBadRequest as e:
+        if not any(file_ids):
+            raise
+        logger.warning(f"Media group by file_id failed, resending by URL: {e}")
+        for file_id in filter(None, file_ids):
+            await media_registry.forget(file_id)
+        file_ids = [None] * len(items)
+        messages = await callback.message.answer_media_group(media=media_group())
+
+    for message, item_keys, file_id in zip(messages, keys, file_ids):
+        if not file_id:
+            await media_registry.remember(item_keys, "photo", message)
 
-    await callback.message.answer_media_group(media=media_group)
     await callback.answer("✅ Отправлено!")
 
 
@@ -627,13 +794,13 @@ async def cancel_batch(callback: types.CallbackQuery, state: FSMContext):
 async def back_to_results(callback: types.CallbackQuery):
     """Возврат к галерее результатов"""
     job_id = callback.data.replace("batchback_", "")
-    job = batch_service.get_job(job_id)
+    job = await batch_service.get_job(job_id)
 
     if not job:
         await callback.answer("Задача не найдена")
         return
 
-    successful = [i for i in job.items if i.result]
+    successful = [i for i in job.items if i.has_result]
 
     await callback.message.edit_text(
         f"✅ <b>Результаты пакетной генерации</b>\n\n"
@@ -6,13 +6,23 @@ from aiogram.filters import Command, CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
 
 from bot.database import (
+    complete_transaction,
     get_or_create_user,
+    get_transaction_by_order,
+    get_user_credits,
     get_user_settings,
     get_user_stats,
     save_user_settings,
+    unmark_recipient_blocked,
+)
+from bot.keyboards import (
+    get_back_keyboard,
+    get_category_keyboard,
+    get_main_menu_keyboard,
+    get_settings_keyboard,
 )
-from bot.keyboards import get_back_keyboard, get_main_menu_keyboard
 from bot.services.preset_manager import preset_manager
+from bot.services.tbank_service import tbank_service
 from bot.states import AdminStates, GenerationStates, PaymentStates
 
 logger = logging.getLogger(__name__)
@@ -29,6 +39,8 @@ async def cmd_start(message: types.Message):
     """Обработчик команды /start"""
     # Создаём или получаем пользователя
     user = await get_or_create_user(message.from_user.id)
+    # Вернувшийся пользователь снова получает рассылки
+    await unmark_recipient_blocked(message.from_user.id)
 
     # Проверяем deep linking для возврата после оплаты
     args = message.text.split()[1:] if len(message.text.split()) > 1 else []
@@ -38,36 +50,30 @@ async def cmd_start(message: types.Message):
         order_id = args[0].replace("success_", "")
 
         # Проверяем транзакцию в базе данных
-        from bot.database import (
-            add_credits,
-            get_transaction_by_order,
-            update_transaction_status,
-        )
-        from bot.services.tbank_service import tbank_service
-
         transaction = await get_transaction_by_order(order_id)
 
         if transaction:
-            if transaction.status == "completed":
-                # Кредиты уже были начислены
-                await message.answer(
-                    f"✅ <b>Оплата уже обработана!</b>\n\n"
-                    f"🍌 Ваш баланс: <code>{user.credits}</code> бананов",
-                    reply_markup=get_main_menu_keyboard(user.credits),
-                    parse_mode="HTML",
-                )
-                return
-            elif transaction.status == "pending":
+            if transaction.status == "pending":
                 # Проверяем статус в Т-Банке
                 result = await tbank_service.get_state(transaction.payment_id)
-                if result and result.get("Status") == "CONFIRMED":
-                    # Начисляем кредиты
-                    await add_credits(message.from_user.id, transaction.credits)
-                    await update_transaction_status(order_id, "completed")
+                if not result or result.get("Status") != "CONFIRMED":
+                    # Ожидаем подтверждения от банка
+                    await message.answer(
+                        "⏳ <b>Оплата в обработке...</b>\n\n"
+                        "Пожалуйста, подождите. Кредиты будут начислены в течение нескольких минут.",
+                        reply_markup=get_main_menu_keyboard(user.credits),
+                        parse_mode="HTML",
+                    )
+                    return
+
+                # Начисляет только complete_transaction: вебхук и сверка
+                # закрывают тот же платёж, кредиты получит один из вызовов
+                telegram_id = await complete_transaction(order_id)
 
-                    # Получаем обновлённый баланс
-                    user = await get_or_create_user(message.from_user.id)
+                # Получаем обновлённый баланс
+                user = await get_or_create_user(message.from_user.id)
 
+                if telegram_id is not None:
                     await message.answer(
                         f"🎉 <b>Оплата успешно обработана!</b>\n\n"
                         f"🍌 Начислено: <code>{transaction.credits}</code> бананов\n"
@@ -77,15 +83,16 @@ async def cmd_start(message: types.Message):
                         parse_mode="HTML",
                     )
                     return
-                else:
-                    # Ожидаем подтверждения от банка
-                    await message.answer(
-                        "⏳ <b>Оплата в обработке...</b>\n\n"
-                        "Пожалуйста, подождите. Кредиты будут начислены в течение нескольких минут.",
-                        reply_markup=get_main_menu_keyboard(user.credits),
-                        parse_mode="HTML",
-                    )
-                    return
+
+            if transaction.status in ("pending", "completed"):
+                # Кредиты уже были начислены (в том числе вебхуком или сверкой)
+                await message.answer(
+                    f"✅ <b>Оплата уже обработана!</b>\n\n"
+                    f"🍌 Ваш баланс: <code>{user.credits}</code> бананов",
+                    reply_markup=get_main_menu_keyboard(user.credits),
+                    parse_mode="HTML",
+                )
+                return
         else:
             await message.answer(
                 "❌ <b>Транзакция не найдена</b>\n\n"
@@ -279,8 +286,6 @@ async def show_balance(callback: types.CallbackQuery):
 @router.callback_query(F.data == "menu_settings")
 async def show_settings(callback: types.CallbackQuery, state: FSMContext):
     """Показывает настройки с выбором модели"""
-    from bot.keyboards import get_settings_keyboard
-
     # Загружаем настройки из БД
     db_settings = await get_user_settings(callback.from_user.id)
 
@@ -329,8 +334,6 @@ async def handle_settings_model(callback: types.CallbackQuery, state: FSMContext
     # Показываем подтверждение (короткое)
     model_name = "Flash" if model_type == "flash" else "Pro"
 
-    from bot.keyboards import get_settings_keyboard
-
     # Также получаем текущую модель видео
     data = await state.get_data()
     current_video_model = data.get("preferred_video_model", "v3_std")
@@ -369,8 +372,6 @@ async def handle_settings_video_model(callback: types.CallbackQuery, state: FSMC
 
     model_name = video_names.get(video_model, video_model)
 
-    from bot.keyboards import get_settings_keyboard
-
     # Также получаем текущую модель изображений
     data = await state.get_data()
     current_model = data.get("preferred_model", "flash")
@@ -407,8 +408,6 @@ async def handle_settings_i2v_model(callback: types.CallbackQuery, state: FSMCon
 
     model_name = i2v_names.get(i2v_model, i2v_model)
 
-    from bot.keyboards import get_settings_keyboard
-
     # Получаем текущие модели
     data = await state.get_data()
     current_model = data.get("preferred_model", "flash")
@@ -438,8 +437,6 @@ async def back_to_category(callback: types.CallbackQuery, state: FSMContext):
     )
 
     # Просто редактируем сообщение категории
-    from bot.services.preset_manager import preset_manager
-
     presets = preset_manager.get_category_presets(category)
     categories = preset_manager.get_categories()
 
@@ -448,15 +445,11 @@ async def back_to_category(callback: types.CallbackQuery, state: FSMContext):
         return
 
     user_credits = 0  # Default value
-    from bot.database import get_user_credits
-
     try:
         user_credits = await get_user_credits(callback.from_user.id)
     except:
         pass
 
-    from bot.keyboards import get_category_keyboard
-
     await callback.message.edit_text(
         f"📂 <b>{categories[category]['name']}</b>\n"
         f"📝 {categories[category].get('description', '')}\n\n"
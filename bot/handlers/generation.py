@@ -7,8 +7,10 @@ import uuid
 from datetime import datetime
 from typing import Optional
 
+import aiohttp
 from aiogram import Bot, F, Router, types
 from aiogram.fsm.context import FSMContext
+from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from bot.config import config
 from bot.database import (
@@ -21,6 +23,7 @@ from bot.database import (
     get_or_create_user,
     get_task_by_id,
     get_user_credits,
+    get_user_last_generation,
     get_user_settings,
 )
 from bot.keyboards import (
@@ -45,9 +48,17 @@ from bot.keyboards import (
     get_video_edit_input_type_keyboard,
     get_video_edit_keyboard,
     get_video_options_no_preset_keyboard,
+    get_video_result_keyboard,
 )
+from bot.services.admins import admin_registry
+from bot.services.coalescer import request_coalescer
 from bot.services.gemini_service import gemini_service
+from bot.services.kling_service import kling_service
+from bot.services.media_registry import media_registry
 from bot.services.preset_manager import preset_manager
+from bot.services.preview import preview_renderer
+from bot.services.progress import progress_renderer
+from bot.services.result_cache import result_cache
 from bot.states import GenerationStates
 from bot.utils.help_texts import (
     UserHints,
@@ -299,8 +310,6 @@ async def start_video_editing(callback: types.CallbackQuery, state: FSMContext):
     }
     await state.update_data(video_edit_options=video_edit_options)
 
-    from bot.keyboards import get_video_edit_input_type_keyboard
-
     await callback.message.edit_text(
         f"✂️ <b>Видео-эффекты</b>\n\n"
         f"🍌 Ваш баланс: <code>{user_credits}</code> бананов\n"
@@ -424,8 +433,6 @@ async def handle_video_edit_change_type(
     await state.clear()
     await state.update_data(video_edit_options=video_edit_options)
 
-    from bot.keyboards import get_video_edit_input_type_keyboard
-
     user_credits = await get_user_credits(callback.from_user.id)
 
     await callback.message.edit_text(
@@ -604,7 +611,7 @@ async def show_preset_details(callback: types.CallbackQuery, state: FSMContext):
     )
 
     user_credits = await get_user_credits(callback.from_user.id)
-    is_admin = config.is_admin(callback.from_user.id)
+    is_admin = admin_registry.is_admin(callback.from_user.id)
 
     # Админы могут использовать бесплатно
     if not is_admin and user_credits < preset.cost:
@@ -1199,8 +1206,6 @@ async def start_no_preset_generation(
         )
 
         try:
-            from bot.services.gemini_service import gemini_service
-
             result = await gemini_service.generate_image(
                 prompt=prompt,
                 model="gemini-2.5-flash-image",
@@ -1217,17 +1222,15 @@ async def start_no_preset_generation(
 
                 # Создаём задачу в БД
                 if saved_url:
-                    from bot.database import add_generation_task, complete_video_task
-
                     user = await get_or_create_user(message.from_user.id)
                     task_id = f"img_{uuid.uuid4().hex[:12]}"
                     await add_generation_task(user.id, task_id, "image", "no_preset")
                     await complete_video_task(task_id, saved_url)
 
                 # Отправляем
-                photo = types.BufferedInputFile(result, filename="generated.png")
-                await message.answer_photo(
-                    photo=photo,
+                await preview_renderer.send_photo(
+                    message.answer_photo,
+                    result,
                     caption=f"✅ <b>Готово!</b>\n\n" f"<code>{cost}</code>🍌 списано",
                     parse_mode="HTML",
                     reply_markup=get_multiturn_keyboard("no_preset"),
@@ -1254,8 +1257,6 @@ async def start_no_preset_generation(
         )
 
         try:
-            from bot.services.kling_service import kling_service
-
             # Ensure duration is int (it might come as string from callback_data)
             duration = int(video_options.get("duration", 5))
             logger.info(
@@ -1274,8 +1275,6 @@ async def start_no_preset_generation(
             await processing.delete()
 
             if result and result.get("task_id"):
-                from bot.database import add_generation_task
-
                 user = await get_or_create_user(message.from_user.id)
                 await add_generation_task(
                     user.id, result["task_id"], "video", "no_preset"
@@ -1443,6 +1442,24 @@ async def execute_generation(
     callback: types.CallbackQuery, state: FSMContext, bot: Bot
 ):
     """Запускает процесс генерации через пресеты"""
+    # Ключ — сама кнопка: после первого запуска состояние уже очищено,
+    # и повторная доставка callback'а иначе ушла бы с промптом пресета
+    key = request_coalescer.make_key(
+        callback.from_user.id, "preset", callback.message.message_id, callback.data
+    )
+    if request_coalescer.pending(key):
+        await callback.answer("⏳ Этот запрос уже выполняется")
+
+    await request_coalescer.run(key, lambda: _execute_generation(callback, state, bot))
+
+
+async def _execute_generation(
+    callback: types.CallbackQuery, state: FSMContext, bot: Bot
+):
+    """
+    Возвращает True, если кредиты списаны и генерация запущена: только такой
+    запуск request_coalescer запоминает, остальные можно сразу повторить.
+    """
     callback_data = callback.data
 
     preset_id = callback_data.replace("run_", "")
@@ -1451,18 +1468,18 @@ async def execute_generation(
 
     if not preset:
         await callback.answer("Пресет не найден")
-        return
+        return False
 
     # Проверяем возможность оплаты (админы всегда могут)
     if not await check_can_afford(callback.from_user.id, preset.cost):
         await callback.answer("Недостаточно кредитов!", show_alert=True)
-        return
+        return False
 
     # Списываем кредиты (админам - бесплатно)
     success = await deduct_credits(callback.from_user.id, preset.cost)
     if not success:
         await callback.answer("Ошибка списания кредитов", show_alert=True)
-        return
+        return False
 
     await callback.answer("🚀 Запускаю генерацию...")
 
@@ -1490,6 +1507,7 @@ async def execute_generation(
     await add_generation_history(user.id, preset_id, final_prompt, preset.cost)
 
     await state.clear()
+    return True
 
 
 async def generate_image(
@@ -1510,17 +1528,37 @@ async def generate_image(
     )
 
     try:
-        from bot.services.gemini_service import gemini_service
+        model = options.get("model", preset.model)
+        aspect_ratio = options.get("aspect_ratio", preset.aspect_ratio)
+        resolution = options.get("resolution", "1K")
+        enable_search = options.get("enable_search", False)
+        reference_images = options.get("reference_images", [])
+
+        # Детерминированные пресеты отдаём из кэша (поиск делает ответ недетерминированным)
+        result = None
+        cache_key = None
+        if preset.cacheable and not enable_search:
+            cache_key = result_cache.make_key(
+                prompt=prompt,
+                model=model,
+                aspect_ratio=aspect_ratio,
+                resolution=resolution,
+                images=[image_bytes, *reference_images],
+            )
+            result = await result_cache.get(cache_key)
 
-        result = await gemini_service.generate_image(
-            prompt=prompt,
-            model=options.get("model", preset.model),
-            aspect_ratio=options.get("aspect_ratio", preset.aspect_ratio),
-            image_input=image_bytes,
-            resolution=options.get("resolution", "1K"),
-            enable_search=options.get("enable_search", False),
-            reference_images=options.get("reference_images", []),
-        )
+        if result is None:
+            result = await gemini_service.generate_image(
+                prompt=prompt,
+                model=model,
+                aspect_ratio=aspect_ratio,
+                image_input=image_bytes,
+                resolution=resolution,
+                enable_search=enable_search,
+                reference_images=reference_images,
+            )
+            if result and cache_key:
+                await result_cache.put(cache_key, result, cost=preset.cost)
 
         if result:
             # Сохраняем изображение на сервере для возможности скачивания
@@ -1528,9 +1566,8 @@ async def generate_image(
 
             # Создаём задачу в БД для возможности скачивания
             if saved_url:
-                from bot.database import add_generation_task
-
                 user = await get_or_create_user(callback.from_user.id)
+                task_id = f"img_{uuid.uuid4().hex[:12]}"
                 await add_generation_task(
                     user_id=user.id,
                     task_id=task_id,
@@ -1538,19 +1575,17 @@ async def generate_image(
                     preset_id=preset.id,
                 )
                 # Обновляем URL результата
-                from bot.database import complete_video_task
-
                 await complete_video_task(task_id, saved_url)
 
-            # Отправляем результат с опциями многоходового редактирования
-            photo = types.BufferedInputFile(result, filename="generated.png")
-
+            # Отправляем превью с опциями многоходового редактирования;
+            # оригинал без сжатия — по кнопке «Скачать»
             success_text = get_success_message(preset.name, preset.cost)
             if saved_url:
                 success_text += f"\n\n📥 <i>Вы можете скачать это изображение позже</i>"
 
-            await callback.message.answer_photo(
-                photo=photo,
+            await preview_renderer.send_photo(
+                callback.message.answer_photo,
+                result,
                 caption=success_text,
                 reply_markup=get_multiturn_keyboard(preset.id),
                 parse_mode="HTML",
@@ -1582,9 +1617,6 @@ async def generate_video(
     callback, preset, prompt, image_bytes, bot: Bot, state: FSMContext
 ):
     """Генерация видео через Kling (асинхронно)"""
-    from bot.config import config
-    from bot.services.kling_service import kling_service
-
     data = await state.get_data()
     video_options = data.get("video_options", {})
 
@@ -1646,7 +1678,7 @@ async def generate_video(
                 preset_id=preset.id,
             )
 
-            await callback.message.answer(
+            status_msg = await callback.message.answer(
                 f"✅ <b>Задача создана</b>\n\n"
                 f"ID: <code>{result['task_id']}</code>\n"
                 f"🍌 Списано: <code>{preset.cost}</code>🍌\n\n"
@@ -1658,7 +1690,10 @@ async def generate_video(
             # Запускаем фоновый опрос статуса
             asyncio.create_task(
                 poll_video_task_status(
-                    task_id=result["task_id"], user_id=callback.from_user.id, bot=bot
+                    task_id=result["task_id"],
+                    user_id=callback.from_user.id,
+                    bot=bot,
+                    status_message=status_msg,
                 )
             )
         else:
@@ -1724,8 +1759,6 @@ async def run_editing_inline(
         )
 
         try:
-            from bot.services.gemini_service import gemini_service
-
             result = await gemini_service.generate_image(
                 prompt=user_input,
                 model="gemini-2.5-flash-image",
@@ -1740,8 +1773,6 @@ async def run_editing_inline(
                 saved_url = save_uploaded_file(result, "png")
 
                 if saved_url:
-                    from bot.database import add_generation_task, complete_video_task
-
                     user = await get_or_create_user(message.from_user.id)
                     task_id = f"img_{uuid.uuid4().hex[:12]}"
                     await add_generation_task(
@@ -1749,9 +1780,9 @@ async def run_editing_inline(
                     )
                     await complete_video_task(task_id, saved_url)
 
-                photo = types.BufferedInputFile(result, filename="edited.png")
-                await message.answer_photo(
-                    photo=photo,
+                await preview_renderer.send_photo(
+                    message.answer_photo,
+                    result,
                     caption=f"✏️ <b>Готово!</b>\n\n" f"<code>{cost}</code>🍌 списано",
                     parse_mode="HTML",
                     reply_markup=get_multiturn_keyboard("no_preset_edit"),
@@ -1808,8 +1839,6 @@ async def run_no_preset_editing(callback: types.CallbackQuery, state: FSMContext
         )
 
         try:
-            from bot.services.gemini_service import gemini_service
-
             result = await gemini_service.generate_image(
                 prompt=user_input,
                 model="gemini-2.5-flash-image",
@@ -1824,8 +1853,6 @@ async def run_no_preset_editing(callback: types.CallbackQuery, state: FSMContext
                 saved_url = save_uploaded_file(result, "png")
 
                 if saved_url:
-                    from bot.database import add_generation_task, complete_video_task
-
                     user = await get_or_create_user(callback.from_user.id)
                     task_id = f"img_{uuid.uuid4().hex[:12]}"
                     await add_generation_task(
@@ -1833,9 +1860,9 @@ async def run_no_preset_editing(callback: types.CallbackQuery, state: FSMContext
                     )
                     await complete_video_task(task_id, saved_url)
 
-                photo = types.BufferedInputFile(result, filename="edited.png")
-                await callback.message.answer_photo(
-                    photo=photo,
+                await preview_renderer.send_photo(
+                    callback.message.answer_photo,
+                    result,
                     caption=f"✏️ <b>Готово!</b>\n\n" f"<code>{cost}</code>🍌 списано",
                     parse_mode="HTML",
                     reply_markup=get_multiturn_keyboard("no_preset_edit"),
@@ -2184,6 +2211,28 @@ async def run_no_preset_image_generation(
     if user_id is None:
         user_id = message.from_user.id
 
+    # Двойное нажатие «Запустить» не должно списывать и генерировать дважды
+    key = request_coalescer.make_key(
+        user_id, "image", message.message_id, prompt, aspect_ratio, preferred_model
+    )
+    await request_coalescer.run(
+        key,
+        lambda: _run_no_preset_image_generation(
+            message, state, prompt, aspect_ratio, user_id, preferred_model
+        ),
+    )
+
+
+async def _run_no_preset_image_generation(
+    message: types.Message,
+    state: FSMContext,
+    prompt: str,
+    aspect_ratio: str,
+    user_id: int,
+    preferred_model: str,
+):
+    """True, если кредиты списаны и не возвращены (см. _execute_generation)"""
+
     # Определяем модель и стоимость
     if preferred_model == "flash":
         model = "gemini-2.5-flash-image"
@@ -2199,10 +2248,11 @@ async def run_no_preset_image_generation(
             reply_markup=get_main_menu_keyboard(),
         )
         await state.clear()
-        return
+        return False
 
     # Списываем
     await deduct_credits(user_id, cost)
+    charged = True
 
     # Генерируем изображение
     model_emoji = "⚡" if preferred_model == "flash" else "💎"
@@ -2215,8 +2265,6 @@ async def run_no_preset_image_generation(
     )
 
     try:
-        from bot.services.gemini_service import gemini_service
-
         result = await gemini_service.generate_image(
             prompt=prompt,
             model=model,
@@ -2231,16 +2279,14 @@ async def run_no_preset_image_generation(
             saved_url = save_uploaded_file(result, "png")
 
             if saved_url:
-                from bot.database import add_generation_task, complete_video_task
-
                 user = await get_or_create_user(message.from_user.id)
                 task_id = f"img_{uuid.uuid4().hex[:12]}"
                 await add_generation_task(user.id, task_id, "image", "no_preset")
                 await complete_video_task(task_id, saved_url)
 
-            photo = types.BufferedInputFile(result, filename="generated.png")
-            await message.answer_photo(
-                photo=photo,
+            await preview_renderer.send_photo(
+                message.answer_photo,
+                result,
                 caption=f"✅ <b>Готово!</b>\n\n"
                 f"📐 Формат: <code>{aspect_ratio}</code>\n"
                 f"<code>{cost}</code>🍌 списано",
@@ -2250,13 +2296,16 @@ async def run_no_preset_image_generation(
         else:
             await add_credits(message.from_user.id, cost)
             await message.answer("❌ Не удалось сгенерировать. Бананы возвращены.")
+            charged = False
 
     except Exception as e:
         logger.exception(f"Error: {e}")
         await add_credits(message.from_user.id, cost)
         await message.answer(f"❌ Ошибка: {str(e)[:100]}")
+        charged = False
 
     await state.clear()
+    return charged
 
 
 async def run_no_preset_image_edit(
@@ -2313,8 +2362,6 @@ async def run_no_preset_image_edit(
     )
 
     try:
-        from bot.services.gemini_service import gemini_service
-
         result = await gemini_service.generate_image(
             prompt=prompt,
             model=model,
@@ -2329,16 +2376,14 @@ async def run_no_preset_image_edit(
             saved_url = save_uploaded_file(result, "png")
 
             if saved_url:
-                from bot.database import add_generation_task, complete_video_task
-
                 user = await get_or_create_user(message.from_user.id)
                 task_id = f"img_{uuid.uuid4().hex[:12]}"
                 await add_generation_task(user.id, task_id, "image", "no_preset_edit")
                 await complete_video_task(task_id, saved_url)
 
-            photo = types.BufferedInputFile(result, filename="edited.png")
-            await message.answer_photo(
-                photo=photo,
+            await preview_renderer.send_photo(
+                message.answer_photo,
+                result,
                 caption=f"✏️ <b>Готово!</b>\n\n"
                 f"📐 Формат: <code>{aspect_ratio}</code>\n"
                 f"<code>{cost}</code>🍌 списано",
@@ -2484,9 +2529,6 @@ async def execute_video_edit(
     )
 
     try:
-        from bot.config import config
-        from bot.services.kling_service import kling_service
-
         result = await kling_service.generate_video(
             prompt=prompt,
             model=model,
@@ -2506,8 +2548,6 @@ async def execute_video_edit(
         await processing.delete()
 
         if result and result.get("task_id"):
-            from bot.database import add_generation_task
-
             user = await get_or_create_user(message.from_user.id)
             await add_generation_task(user.id, result["task_id"], "video", "video_edit")
 
@@ -2581,9 +2621,6 @@ async def execute_video_edit_image(
     elements = [{"reference_image_urls": [image_url], "frontal_image_url": image_url}]
 
     try:
-        from bot.config import config
-        from bot.services.kling_service import kling_service
-
         # Для I2V передаём image_url и elements для сохранения лица
         result = await kling_service.generate_video(
             prompt=prompt,
@@ -2607,8 +2644,6 @@ async def execute_video_edit_image(
         await processing.delete()
 
         if result and result.get("task_id"):
-            from bot.database import add_generation_task
-
             user = await get_or_create_user(message.from_user.id)
             await add_generation_task(
                 user.id, result["task_id"], "video", "video_edit_image"
@@ -2638,8 +2673,6 @@ async def upload_video_for_kling(video_bytes: bytes) -> Optional[str]:
     """Загружает видео для Kling API на временный хостинг"""
     try:
         # Пробуем загрузить на imgbb (работает и для видео)
-        import aiohttp
-
         # Сначала пробуем сохранить локально как временный файл
         date_str = datetime.now().strftime("%Y%m%d")
         upload_dir = os.path.join("static", "uploads", "temp")
@@ -2653,8 +2686,6 @@ async def upload_video_for_kling(video_bytes: bytes) -> Optional[str]:
 
         # Пробуем загрузить на временный хостинг
         # Попробуем использовать imgbb API
-        from bot.config import config
-
         if hasattr(config, "IMGBB_API_KEY") and config.IMGBB_API_KEY:
             # Загружаем на imgbb
             form = aiohttp.FormData()
@@ -2846,8 +2877,6 @@ async def toggle_audio(callback: types.CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("multiturn_download_"))
 async def handle_download(callback: types.CallbackQuery, state: FSMContext):
     """Обработка кнопки скачивания - отправляет файл для скачивания"""
-    import aiohttp
-
     preset_id = callback.data.replace("multiturn_download_", "")
 
     # Получаем данные из состояния - там хранится последнее сгенерированное изображение
@@ -2858,8 +2887,6 @@ async def handle_download(callback: types.CallbackQuery, state: FSMContext):
 
     if not image_url:
         # Если нет в состоянии, пробуем найти в БД по последней задаче пользователя
-        from bot.database import get_or_create_user, get_user_last_generation
-
         user = await get_or_create_user(callback.from_user.id)
         last_gen = await get_user_last_generation(user.id)
         if last_gen:
@@ -2874,15 +2901,6 @@ async def handle_download(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer("📥 Скачиваю...")
 
     try:
-        # Скачиваем файл
-        async with aiohttp.ClientSession() as session:
-            async with session.get(image_url) as resp:
-                if resp.status != 200:
-                    await callback.message.answer("❌ Не удалось скачать файл")
-                    return
-
-                file_bytes = await resp.read()
-
         # Определяем тип файла по URL
         file_ext = "jpg"
         if ".png" in image_url.lower():
@@ -2892,25 +2910,31 @@ async def handle_download(callback: types.CallbackQuery, state: FSMContext):
         elif ".webm" in image_url.lower():
             file_ext = "webm"
 
-        # Отправляем файл пользователю
-        filename = f"generated.{file_ext}"
+        async def download() -> Optional[bytes]:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(image_url) as resp:
+                    if resp.status != 200:
+                        return None
+                    return await resp.read()
 
+        # Уже отправленный файл уходит по file_id, без скачивания и загрузки.
+        # Изображения — документом: в чате было сжатое превью, здесь оригинал
         if file_ext == "mp4" or file_ext == "webm":
-            # Видео
-            video = types.BufferedInputFile(file_bytes, filename=filename)
-            await callback.message.answer_video(
-                video=video,
-                caption=f"📥 <b>Скачано</b>\n\nПресет: {preset_id}",
-                parse_mode="HTML",
-            )
+            send, kind = callback.message.answer_video, "video"
         else:
-            # Изображение
-            photo = types.BufferedInputFile(file_bytes, filename=filename)
-            await callback.message.answer_photo(
-                photo=photo,
-                caption=f"📥 <b>Скачано</b>\n\nПресет: {preset_id}",
-                parse_mode="HTML",
-            )
+            send, kind = callback.message.answer_document, "document"
+
+        sent = await media_registry.send(
+            send,
+            kind,
+            download,
+            f"generated.{file_ext}",
+            url=image_url,
+            caption=f"📥 <b>Скачано</b>\n\nПресет: {preset_id}",
+            parse_mode="HTML",
+        )
+        if sent is None:
+            await callback.message.answer("❌ Не удалось скачать файл")
 
     except Exception as e:
         logger.exception(f"Download error: {e}")
@@ -2932,8 +2956,6 @@ async def handle_save(callback: types.CallbackQuery, state: FSMContext):
     image_url = data.get("last_generated_image_url")
 
     if not image_url:
-        from bot.database import get_or_create_user, get_user_last_generation
-
         user = await get_or_create_user(callback.from_user.id)
         last_gen = await get_user_last_generation(user.id)
         if last_gen:
@@ -3080,9 +3102,6 @@ async def run_image_to_video(message: types.Message, state: FSMContext, prompt:
     )
 
     try:
-        from bot.config import config
-        from bot.services.kling_service import kling_service
-
         # Используем сохранённый URL или сохраняем локально
         image_url = uploaded_image_url
         if not image_url and uploaded_image:
@@ -3134,8 +3153,6 @@ async def run_image_to_video(message: types.Message, state: FSMContext, prompt:
         await processing.delete()
 
         if result and result.get("task_id"):
-            from bot.database import add_generation_task
-
             user = await get_or_create_user(message.from_user.id)
             await add_generation_task(
                 user.id, result["task_id"], "video", "image_to_video"
@@ -3175,12 +3192,33 @@ async def run_image_to_video(message: types.Message, state: FSMContext, prompt:
 
 
 async def poll_video_task_status(
-    task_id: str, user_id: int, bot: Bot, max_attempts: int = 60, delay: int = 10
+    task_id: str,
+    user_id: int,
+    bot: Bot,
+    max_attempts: int = 60,
+    delay: int = 10,
+    status_message: Optional[types.Message] = None,
 ):
     """Фоновый опрос статуса задачи видео от Freepik/Kling"""
-    from bot.services.kling_service import kling_service
-
     logger.info(f"Starting poll for task {task_id}, user {user_id}")
+    started = time.monotonic()
+
+    def show_status(status: str, final: bool = False):
+        # Правки идут через общий отрисовщик — опрос не ждёт Telegram
+        if status_message is None:
+            return
+        elapsed = int(time.monotonic() - started)
+        progress_renderer.update(
+            status_message.chat.id,
+            status_message.message_id,
+            f"🎬 <b>Видео генерируется</b>\n\n"
+            f"ID: <code>{task_id}</code>\n"
+            f"Статус: <code>{status}</code>\n"
+            f"⏱ Прошло: <code>{elapsed}</code> сек\n\n"
+            f"Я пришлю видео автоматически.",
+            reply_markup=get_main_menu_keyboard(),
+            final=final,
+        )
 
     for attempt in range(max_attempts):
         try:
@@ -3196,6 +3234,7 @@ async def poll_video_task_status(
             status = task_data.get("status")
 
             logger.info(f"Task {task_id}: status = {status}, attempt {attempt + 1}")
+            show_status(status, final=status in ("COMPLETED", "FAILED"))
 
             if status == "COMPLETED":
                 # Задача завершена — получаем URL видео
@@ -3208,11 +3247,11 @@ async def poll_video_task_status(
 
                         # Отправляем пользователю
                         try:
-                            from bot.keyboards import get_video_result_keyboard
-
-                            await bot.send_video(
+                            await media_registry.send(
+                                bot.send_video,
+                                "video",
+                                video_url,
                                 chat_id=user_id,
-                                video=video_url,
                                 caption="🎬 <b>Ваше видео готово!</b>",
                                 parse_mode="HTML",
                                 reply_markup=get_video_result_keyboard(video_url),
@@ -3221,8 +3260,6 @@ async def poll_video_task_status(
                         except Exception as e:
                             # Если не удалось отправить видео по URL, отправляем ссылкой
                             logger.warning(f"Failed to send video: {e}")
-                            from bot.keyboards import get_video_result_keyboard
-
                             await bot.send_message(
                                 chat_id=user_id,
                                 text=f"🎬 <b>Ваше видео готово!</b>\n\n<a href='{video_url}'>Скачать видео</a>",
@@ -3380,6 +3417,11 @@ async def set_no_preset_audio(callback: types.CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "run_no_preset_video")
 async def run_no_preset_video(callback: types.CallbackQuery, state: FSMContext):
     """Запускает генерацию видео без пресета"""
+    # Дубль нажатия: отвечаем сразу, иначе у кнопки висят часики
+    if request_coalescer.pending(_no_preset_video_key(callback)):
+        await callback.answer("⏳ Этот запрос уже выполняется")
+        return
+
     data = await state.get_data()
     user_prompt = data.get("user_prompt", "")
 
@@ -3397,6 +3439,24 @@ async def start_no_preset_video_generation(
     callback: types.CallbackQuery, state: FSMContext, prompt: str
 ):
     """Запускает генерацию видео без пресета (выделено для совместимости с callback)"""
+    await request_coalescer.run(
+        _no_preset_video_key(callback),
+        lambda: _start_no_preset_video_generation(callback, state, prompt),
+    )
+
+
+def _no_preset_video_key(callback: types.CallbackQuery) -> str:
+    # Ключ — сама кнопка: повторная доставка после очистки состояния
+    # пришла бы с пустым промптом и снова списала бы бананы
+    return request_coalescer.make_key(
+        callback.from_user.id, "video", callback.message.message_id, callback.data
+    )
+
+
+async def _start_no_preset_video_generation(
+    callback: types.CallbackQuery, state: FSMContext, prompt: str
+):
+    """True, если кредиты списаны и не возвращены (см. _execute_generation)"""
     cost = 4
 
     # Проверяем баланс
@@ -3406,10 +3466,11 @@ async def start_no_preset_video_generation(
             reply_markup=get_main_menu_keyboard(),
         )
         await state.clear()
-        return
+        return False
 
     # Списываем
     await deduct_credits(callback.from_user.id, cost)
+    charged = True
 
     data = await state.get_data()
     video_options = data.get("video_options", {})
@@ -3427,9 +3488,6 @@ async def start_no_preset_video_generation(
     )
 
     try:
-        from bot.config import config
-        from bot.services.kling_service import kling_service
-
         # Генерируем с webhook для асинхронной обработки
         result = await kling_service.generate_video(
             prompt=prompt,
@@ -3445,14 +3503,10 @@ async def start_no_preset_video_generation(
             task_id = result["task_id"]
 
             # Сохраняем задачу в БД для обработки webhook'ом
-            from bot.database import add_generation_task
-
             user = await get_or_create_user(callback.from_user.id)
             await add_generation_task(user.id, task_id, "video", "no_preset")
 
             # Клавиатура с кнопкой главного меню
-            from aiogram.utils.keyboard import InlineKeyboardBuilder
-
             menu_builder = InlineKeyboardBuilder()
             menu_builder.button(text="🏠 Главное меню", callback_data="back_main")
 
@@ -3473,6 +3527,7 @@ async def start_no_preset_video_generation(
                 "❌ Не удалось создать задачу на генерацию видео. Бананы возвращены.",
                 reply_markup=get_main_menu_keyboard(),
             )
+            charged = False
 
     except Exception as e:
         logger.exception(f"Video generation error: {e}")
@@ -3481,5 +3536,7 @@ async def start_no_preset_video_generation(
         await callback.message.answer(
             f"❌ Ошибка генерации: {str(e)[:100]}", reply_markup=get_main_menu_keyboard()
         )
+        charged = False
 
     await state.clear()
+    return charged
@@ -6,13 +6,11 @@ from aiogram.fsm.context import FSMContext
 
 from bot.config import config
 from bot.database import (
-    add_credits,
+    complete_transaction,
     create_transaction,
     get_or_create_user,
-    get_telegram_id_by_user_id,
     get_transaction_by_order,
     get_user_credits,
-    update_transaction_status,
 )
 from bot.keyboards import (
     get_back_keyboard,
@@ -146,10 +144,8 @@ async def check_payment_status(callback: types.CallbackQuery):
         result = await tbank_service.get_state(transaction.payment_id)
 
         if result and result.get("Status") == "CONFIRMED":
-            # Начисляем бананы
-            user = await get_or_create_user(transaction.user_id)
-            await add_credits(user.telegram_id, transaction.credits)
-            await update_transaction_status(order_id, "completed")
+            # Начисляем бананы; None — платёж уже закрыли вебхук или сверка
+            await complete_transaction(order_id)
 
             await callback.message.edit_text(
                 f"✅ <b>Оплата подтверждена!</b>\n\n"
@@ -187,9 +183,23 @@ async def back_to_packages(callback: types.CallbackQuery):
     await show_packages(callback)
 
 
+def payment_success_text(transaction) -> str:
+    """Уведомление о зачисленной оплате"""
+    return (
+        f"🎉 <b>Оплата успешна!</b>\n\n"
+        f"🍌 Начислено: <code>{transaction.credits}</code> бананов\n"
+        f"💰 Сумма: <code>{transaction.amount_rub}</code> ₽\n\n"
+        f"Теперь вы можете создавать контент!"
+    )
+
+
 # Вебхук для Т-Банка (обрабатывается в aiohttp сервере)
-async def handle_tbank_webhook(request):
-    """Обработчик уведомлений от Т-Банка"""
+async def handle_tbank_webhook(request, bot: Bot):
+    """
+    Обработчик уведомлений от Т-Банка.
+
+    bot — бот диспетчера, чтобы уведомление шло через OutboundMiddleware.
+    """
     from aiohttp import web
 
     try:
@@ -209,36 +219,26 @@ async def handle_tbank_webhook(request):
             transaction = await get_transaction_by_order(order_id)
 
             if transaction and transaction.status == "pending":
-                # Получаем telegram_id по internal user_id
-                telegram_id = await get_telegram_id_by_user_id(transaction.user_id)
+                # Начисление и смена статуса — одна транзакция; повторный
+                # вебхук или сверка платежей второй раз не начислят
+                telegram_id = await complete_transaction(order_id)
 
                 if telegram_id:
-                    # Начисляем кредиты
-                    await add_credits(telegram_id, transaction.credits)
-                    await update_transaction_status(order_id, "completed")
-
                     logger.info(
                         f"Credits added: {transaction.credits} to user {telegram_id}"
                     )
 
                     # Уведомляем пользователя
                     try:
-                        bot = Bot(token=config.BOT_TOKEN)
                         await bot.send_message(
                             telegram_id,
-                            f"🎉 <b>Оплата успешна!</b>\n\n"
-                            f"🍌 Начислено: <code>{transaction.credits}</code> бананов\n"
-                            f"💰 Сумма: <code>{transaction.amount_rub}</code> ₽\n\n"
-                            f"Теперь вы можете создавать контент!",
+                            payment_success_text(transaction),
                             parse_mode="HTML",
                         )
-                        await bot.session.close()
                     except Exception as e:
                         logger.error(f"Failed to notify user: {e}")
                 else:
-                    logger.error(
-                        f"Cannot find telegram_id for user_id {transaction.user_id}"
-                    )
+                    logger.info(f"Transaction {order_id} already completed")
 
         return web.Response(text="OK", status=200)
 
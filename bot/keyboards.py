@@ -1,7 +1,13 @@
 from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from bot.utils.keyboard_cache import cached_keyboard
 
+# Клавиатуры кэшируются по аргументам (см. bot.utils.keyboard_cache):
+# функция не должна зависеть ни от чего, кроме своих аргументов
+
+
+@cached_keyboard(key=lambda user_credits=0: user_credits >= 20)
 def get_main_menu_keyboard(user_credits: int = 0):
     """Главное меню с опциональной кнопкой PRO"""
     builder = InlineKeyboardBuilder()
@@ -30,6 +36,7 @@ def get_main_menu_keyboard(user_credits: int = 0):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_settings_keyboard(
     current_model: str = "flash",
     current_video_model: str = "v3_std",
@@ -115,6 +122,13 @@ def get_settings_keyboard(
     return builder.as_markup()
 
 
+@cached_keyboard(
+    presets=True,
+    key=lambda category, presets, user_credits: (
+        category,
+        tuple((p.id, user_credits >= p.cost) for p in presets),
+    ),
+)
 def get_category_keyboard(category: str, presets: list, user_credits: int):
     """Клавиатура выбора пресета в категории"""
     builder = InlineKeyboardBuilder()
@@ -136,6 +150,7 @@ def get_category_keyboard(category: str, presets: list, user_credits: int):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_preset_action_keyboard(preset_id: str, has_input: bool, category: str = None):
     """Действия с выбранным пресетом"""
     builder = InlineKeyboardBuilder()
@@ -164,6 +179,7 @@ def get_preset_action_keyboard(preset_id: str, has_input: bool, category: str =
     return builder.as_markup()
 
 
+@cached_keyboard(presets=True, key=lambda packages: tuple(p["id"] for p in packages))
 def get_payment_packages_keyboard(packages: list):
     """Клавиатура выбора пакета бананов"""
     builder = InlineKeyboardBuilder()
@@ -191,6 +207,7 @@ def get_payment_confirmation_keyboard(payment_url: str, order_id: str):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_admin_keyboard():
     """Админ-панель"""
     builder = InlineKeyboardBuilder()
@@ -204,6 +221,7 @@ def get_admin_keyboard():
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_back_keyboard(callback_data: str = "back_main"):
     """Простая кнопка назад"""
     builder = InlineKeyboardBuilder()
@@ -211,6 +229,7 @@ def get_back_keyboard(callback_data: str = "back_main"):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_confirm_keyboard(confirm_data: str, cancel_data: str):
     """Клавиатура подтверждения действия"""
     builder = InlineKeyboardBuilder()
@@ -220,6 +239,7 @@ def get_confirm_keyboard(confirm_data: str, cancel_data: str):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_duration_keyboard(preset_id: str, current_duration: int = 5):
     """Клавиатура выбора длительности видео"""
     builder = InlineKeyboardBuilder()
@@ -237,6 +257,7 @@ def get_duration_keyboard(preset_id: str, current_duration: int = 5):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_aspect_ratio_keyboard(preset_id: str, current_ratio: str = "16:9"):
     """Клавиатура выбора формата видео"""
     builder = InlineKeyboardBuilder()
@@ -258,6 +279,7 @@ def get_aspect_ratio_keyboard(preset_id: str, current_ratio: str = "16:9"):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_image_aspect_ratio_no_preset_keyboard(current_ratio: str = "1:1"):
     """
     Клавиатура выбора формата изображения для генерации без пресета.
@@ -290,6 +312,7 @@ def get_image_aspect_ratio_no_preset_keyboard(current_ratio: str = "1:1"):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_image_aspect_ratio_no_preset_edit_keyboard(current_ratio: str = "1:1"):
     """
     Клавиатура выбора формата изображения для редактирования без пресета.
@@ -322,6 +345,7 @@ def get_image_aspect_ratio_no_preset_edit_keyboard(current_ratio: str = "1:1"):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_video_options_keyboard(preset_id: str):
     """Клавиатура дополнительных опций видео"""
     builder = InlineKeyboardBuilder()
@@ -337,6 +361,7 @@ def get_video_options_keyboard(preset_id: str):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_video_options_no_preset_keyboard(
     current_duration: int = 5, current_ratio: str = "16:9", current_audio: bool = True
 ):
@@ -382,6 +407,7 @@ def get_video_options_no_preset_keyboard(
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_quality_keyboard(preset_id: str):
     """Клавиатура выбора качества видео"""
     builder = InlineKeyboardBuilder()
@@ -403,6 +429,7 @@ def get_quality_keyboard(preset_id: str):
 # =============================================================================
 
 
+@cached_keyboard
 def get_model_selection_keyboard(preset_id: str, current_model: str = None):
     """
     Клавиатура выбора модели генерации
@@ -431,6 +458,7 @@ def get_model_selection_keyboard(preset_id: str, current_model: str = None):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_resolution_keyboard(preset_id: str, current_resolution: str = "1K"):
     """
     Клавиатура выбора разрешения изображения
@@ -458,6 +486,7 @@ def get_resolution_keyboard(preset_id: str, current_resolution: str = "1K"):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_image_aspect_ratio_keyboard(preset_id: str, current_ratio: str = "1:1"):
     """
     Клавиатура выбора формата изображения
@@ -486,6 +515,7 @@ def get_image_aspect_ratio_keyboard(preset_id: str, current_ratio: str = "1:1"):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_reference_images_keyboard(preset_id: str):
     """
     Клавиатура для работы с референсными изображениями
@@ -507,6 +537,7 @@ def get_reference_images_keyboard(preset_id: str):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_search_grounding_keyboard(preset_id: str, enabled: bool = False):
     """
     Клавиатура для поискового заземления (Grounding)
@@ -528,6 +559,7 @@ def get_search_grounding_keyboard(preset_id: str, enabled: bool = False):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_advanced_options_keyboard(preset_id: str):
     """
     Клавиатура расширенных опций генерации
@@ -547,6 +579,7 @@ def get_advanced_options_keyboard(preset_id: str):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_image_editing_options_keyboard(preset_id: str):
     """
     Клавиатура опций редактирования изображений
@@ -574,6 +607,7 @@ def get_image_editing_options_keyboard(preset_id: str):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_multiturn_keyboard(preset_id: str):
     """
     Клавиатура для многоходового редактирования
@@ -592,6 +626,7 @@ def get_multiturn_keyboard(preset_id: str):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_video_edit_input_type_keyboard():
     """
     Клавиатура выбора типа входных данных для видео-эффектов
@@ -608,6 +643,7 @@ def get_video_edit_input_type_keyboard():
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_video_edit_keyboard(
     preset_id: str = None,
     input_type: str = "video",
@@ -676,6 +712,7 @@ def get_video_edit_keyboard(
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_video_edit_confirm_keyboard():
     """
     Клавиатура подтверждения для видео-эффектов
@@ -689,6 +726,7 @@ def get_video_edit_confirm_keyboard():
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_prompt_tips_keyboard(preset_id: str):
     """
     Клавиатура с советами по промптам
@@ -715,6 +753,7 @@ def get_prompt_tips_keyboard(preset_id: str):
 # =============================================================================
 
 
+@cached_keyboard
 def get_batch_mode_keyboard():
     """Клавиатура выбора режима пакетной генерации"""
     builder = InlineKeyboardBuilder()
@@ -727,6 +766,9 @@ def get_batch_mode_keyboard():
     return builder.as_markup()
 
 
+@cached_keyboard(
+    presets=True, key=lambda presets, mode: (tuple(p.id for p in presets[:8]), mode)
+)
 def get_preset_selection_keyboard(presets: list, mode: str):
     """Клавиатура выбора пресета для пакетной генерации"""
     builder = InlineKeyboardBuilder()
@@ -747,6 +789,7 @@ def get_preset_selection_keyboard(presets: list, mode: str):
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_confirmation_keyboard(
     yes_data: str, no_data: str, yes_text: str = "✅ Да", no_text: str = "❌ Нет"
 ):
@@ -760,6 +803,7 @@ def get_confirmation_keyboard(
     return builder.as_markup()
 
 
+@cached_keyboard
 def get_batch_count_keyboard(preset_id: str, max_count: int):
     """Клавиатура выбора количества изображений для пакетной генерации"""
     builder = InlineKeyboardBuilder()
@@ -3,6 +3,7 @@ import json
 import logging
 import os
 import sys
+from typing import Optional
 
 # Добавляем родительскую директорию в путь для импортов
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -30,16 +31,38 @@ from bot.handlers import (
     generation_router,
     payments_router,
 )
-from bot.handlers.payments import handle_tbank_webhook
+from bot.handlers.batch_generation import resume_batch_jobs
+from bot.handlers.payments import handle_tbank_webhook, payment_success_text
+from bot.services.batch_service import batch_service
+from bot.services.broadcast import broadcast_service
+from bot.services.gemini_service import gemini_service
+from bot.services.image_pool import image_pool
+from bot.services.media_registry import media_registry
+from bot.services.outbound import OutboundMiddleware, outbound_scheduler
+from bot.services.payment_reconciler import payment_reconciler
 from bot.services.preset_manager import preset_manager
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler("logs/bot.log", encoding="utf-8"),
+from bot.services.progress import progress_renderer
+from bot.services.result_cache import result_cache
+from bot.services.tbank_service import tbank_service
+from bot.utils.logging_config import parse_sampling, setup_logging
+
+# Настройка логирования: запись в файл идёт из отдельного потока
+# (директория нужна до создания FileHandler)
+os.makedirs("logs", exist_ok=True)
+log_listener = setup_logging(
+    level=config.LOG_LEVEL,
+    log_file="logs/bot.log",
+    json_format=config.LOG_FORMAT == "json",
+    max_length=config.LOG_MAX_MESSAGE,
+    sampling=parse_sampling(config.LOG_SAMPLING),
+    secrets=[
+        config.BOT_TOKEN,
+        config.TBANK_SECRET_KEY,
+        config.OPENROUTER_API_KEY,
+        config.NANOBANANA_API_KEY,
+        config.FREEPIK_API_KEY,
+        config.GEMINI_API_KEY,
+        config.KLING_API_KEY,
     ],
 )
 logger = logging.getLogger(__name__)
@@ -58,9 +81,64 @@ async def on_startup(bot: Bot):
         await bot.set_webhook(config.webhook_url)
         logger.info(f"Webhook set to {config.webhook_url}")
 
-    # Загружаем пресеты
-    preset_manager.load_all()
+    # Загружаем пресеты и следим за изменениями файлов
+    await preset_manager.reload_async()
     logger.info(f"Loaded {len(preset_manager._presets)} presets")
+    if config.PRESETS_WATCH_INTERVAL > 0:
+        asyncio.create_task(preset_manager.watch(config.PRESETS_WATCH_INTERVAL))
+
+    # Прогреваем процессы обработки изображений в фоне: старт не ждёт
+    # запуска процессов, а до первой тяжёлой задачи они успеют подняться
+    asyncio.create_task(image_pool.warm_up())
+
+    # Фоновая очистка простаивающих сессий многоходового редактирования
+    asyncio.create_task(sweep_chat_sessions())
+
+    # Правки сообщений о прогрессе идут из отдельной задачи
+    progress_renderer.start(bot)
+
+    # Дорабатываем пакетные задачи, прерванные перезапуском
+    resumed = await resume_batch_jobs(bot)
+    if resumed:
+        logger.info(f"Resumed {resumed} batch jobs")
+    asyncio.create_task(cleanup_batch_jobs())
+
+    # Продолжаем рассылки с последней контрольной точки
+    resumed = await broadcast_service.resume(bot)
+    if resumed:
+        logger.info(f"Resumed {resumed} broadcasts")
+
+    # Сверяем платежи, по которым не пришёл вебхук Т-Банка
+    async def notify_payment(telegram_id: int, transaction):
+        await bot.send_message(
+            telegram_id, payment_success_text(transaction), parse_mode="HTML"
+        )
+
+    asyncio.create_task(payment_reconciler.run(notify_payment))
+
+
+async def sweep_chat_sessions(interval: int = 300):
+    """Периодически вытесняет простаивающие сессии чатов Gemini"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            evicted = await gemini_service.sweep_chats()
+            if evicted:
+                logger.info(f"Evicted {evicted} idle chat sessions")
+        except Exception as e:
+            logger.exception(f"Chat sweep failed: {e}")
+
+
+async def cleanup_batch_jobs(interval: int = 3600):
+    """Периодически удаляет старые пакетные задачи и их изображения"""
+    while True:
+        try:
+            removed = await batch_service.cleanup_old_jobs(config.BATCH_JOB_TTL_HOURS)
+            if removed:
+                logger.info(f"Removed {removed} batch blobs")
+        except Exception as e:
+            logger.exception(f"Batch cleanup failed: {e}")
+        await asyncio.sleep(interval)
 
 
 async def on_shutdown(bot: Bot):
@@ -68,6 +146,16 @@ async def on_shutdown(bot: Bot):
     logger.info("Bot shutting down...")
     await bot.delete_webhook()
 
+    # Сохраняем LRU-порядок и счётчики кэша результатов
+    await result_cache.flush()
+    # Активные чаты многоходового редактирования переживут перезапуск
+    await gemini_service.flush_chats()
+
+    await progress_renderer.stop()
+    await tbank_service.close()
+
+    image_pool.shutdown()
+
 
 async def errors_handler(event: types.ErrorEvent):
     """Глобальный обработчик ошибок"""
@@ -158,15 +246,17 @@ async def handle_telegram_webhook(
         return web.Response(text="OK", status=200)
 
 
-async def handle_kling_webhook(request: web.Request) -> web.Response:
-    """Обработчик уведомлений от Kling API"""
-    try:
-        # Логируем все заголовки для отладки
-        logger.info(f"Kling webhook headers: {dict(request.headers)}")
+async def handle_kling_webhook(request: web.Request, bot: Bot) -> web.Response:
+    """
+    Обработчик уведомлений от Kling API.
 
+    bot — бот диспетчера: видео уходит через OutboundMiddleware с его
+    лимитами и приоритетами, как и остальные исходящие сообщения.
+    """
+    try:
         # Проверяем, есть ли данные в теле запроса
         body = await request.text()
-        logger.info(f"Kling webhook raw body: {repr(body)}")
+        logger.debug(f"Kling webhook body ({len(body)} chars): {body[:500]}")
 
         if not body:
             logger.warning("Kling webhook received empty body")
@@ -178,11 +268,10 @@ async def handle_kling_webhook(request: web.Request) -> web.Response:
             logger.warning(f"Kling webhook received invalid JSON: {e}")
             return web.Response(status=200)
 
-        logger.info(f"Kling webhook parsed data: {data}")
-
         # Обработка завершения генерации видео
         task_id = data.get("task_id")
         status = data.get("status")
+        logger.info(f"Kling webhook: task {task_id}, status {status}")
 
         if status == "COMPLETED":
             # Получаем URL видео из массива generated
@@ -227,14 +316,14 @@ async def handle_kling_webhook(request: web.Request) -> web.Response:
             )
 
             # Отправляем видео пользователю
-            bot_instance = Bot(token=config.BOT_TOKEN)
-
             try:
                 from bot.keyboards import get_video_result_keyboard
 
-                await bot_instance.send_video(
+                await media_registry.send(
+                    bot.send_video,
+                    "video",
+                    video_url,
                     chat_id=telegram_id,
-                    video=video_url,
                     caption=f"✅ <b>Ваше видео готово!</b>\n\n"
                     f"🎯 Пресет: {task.preset_id}",
                     parse_mode="HTML",
@@ -250,15 +339,14 @@ async def handle_kling_webhook(request: web.Request) -> web.Response:
                 try:
                     from bot.keyboards import get_video_result_keyboard
 
-                    await bot_instance.send_message(
+                    await bot.send_message(
                         chat_id=telegram_id,
                         text=f"🎬 Ваше видео готово!\n\n{video_url}",
                         reply_markup=get_video_result_keyboard(video_url),
+                        parse_mode=None,  # Ссылка как есть, без разбора HTML
                     )
                 except Exception as fallback_error:
                     logger.error(f"Failed to send fallback message: {fallback_error}")
-            finally:
-                await bot_instance.session.close()
 
         return web.Response(status=200)
 
@@ -267,9 +355,35 @@ async def handle_kling_webhook(request: web.Request) -> web.Response:
         return web.Response(status=500)
 
 
-def setup_web_server(dp: Dispatcher, bot: Bot) -> web.Application:
-    """Настройка aiohttp сервера для вебхуков"""
-    app = web.Application()
+def setup_web_server(
+    dp: Dispatcher,
+    bot: Bot,
+    ready: Optional[asyncio.Event] = None,
+    failed: Optional[asyncio.Event] = None,
+) -> web.Application:
+    """
+    Настройка aiohttp сервера для вебхуков.
+
+    ready — событие окончания on_startup. Порт начинает слушаться сразу,
+    а вебхуки, пришедшие до готовности, ждут его и не теряются; /health
+    до этого отвечает 503. failed ставится вместе с ready, если on_startup
+    упал: ждавшие запросы получают 503, и Telegram их повторит.
+    """
+    if ready is None:
+        ready = asyncio.Event()
+        ready.set()
+    if failed is None:
+        failed = asyncio.Event()
+
+    @web.middleware
+    async def wait_ready(request: web.Request, handler):
+        if not ready.is_set() and request.path != "/health":
+            await ready.wait()
+            if failed.is_set():
+                return web.Response(text="STARTUP FAILED", status=503)
+        return await handler(request)
+
+    app = web.Application(middlewares=[wait_ready])
 
     # Вебхук Telegram
     async def telegram_webhook_handler(request: web.Request) -> web.Response:
@@ -278,13 +392,21 @@ def setup_web_server(dp: Dispatcher, bot: Bot) -> web.Application:
     app.router.add_post(config.WEBHOOK_PATH, telegram_webhook_handler)
 
     # Вебхук Т-Банка
-    app.router.add_post("/tbank/webhook", handle_tbank_webhook)
+    async def tbank_webhook_handler(request: web.Request) -> web.Response:
+        return await handle_tbank_webhook(request, bot)
+
+    app.router.add_post("/tbank/webhook", tbank_webhook_handler)
 
     # Вебхук Kling
-    app.router.add_post("/webhook/kling", handle_kling_webhook)
+    async def kling_webhook_handler(request: web.Request) -> web.Response:
+        return await handle_kling_webhook(request, bot)
+
+    app.router.add_post("/webhook/kling", kling_webhook_handler)
 
     # Health check endpoint
     async def health_check(request: web.Request) -> web.Response:
+        if not ready.is_set() or failed.is_set():
+            return web.Response(text="STARTING", status=503)
         return web.Response(text="OK")
 
     app.router.add_get("/health", health_check)
@@ -294,9 +416,6 @@ def setup_web_server(dp: Dispatcher, bot: Bot) -> web.Application:
 
 async def main():
     """Главная функция"""
-    # Создаём директорию для логов если её нет
-    os.makedirs("logs", exist_ok=True)
-
     # Проверяем наличие токена
     if not config.BOT_TOKEN:
         logger.error(
@@ -308,6 +427,8 @@ async def main():
     bot = Bot(
         token=config.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
+    # Все исходящие запросы к чатам проходят через лимиты Telegram
+    bot.session.middleware(OutboundMiddleware(outbound_scheduler))
 
     # Настраиваем диспатчер
     dp = setup_dispatcher()
@@ -317,7 +438,8 @@ async def main():
     if config.WEBHOOK_HOST:
         # Webhook mode (для production)
         logger.info("Starting in webhook mode...")
-        app = setup_web_server(dp, bot)
+        ready, failed = asyncio.Event(), asyncio.Event()
+        app = setup_web_server(dp, bot, ready, failed)
         runner = web.AppRunner(app)
         await runner.setup()
 
@@ -326,8 +448,25 @@ async def main():
 
         logger.info(f"Server started on port {config.WEBHOOK_PORT}")
 
+        # В режиме вебхука startup/shutdown диспетчера вызываем сами.
+        # Если startup упал, ждущие вебхуки отпускаются с 503, а процесс
+        # завершается с ошибкой, чтобы его перезапустили
+        try:
+            await dp.emit_startup(bot=bot)
+        except BaseException:
+            failed.set()
+            ready.set()
+            await runner.cleanup()
+            raise
+        ready.set()
+        logger.info("Bot ready to accept updates")
+
         # Держим бота запущенным
-        await asyncio.Event().wait()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await dp.emit_shutdown(bot=bot)
+            await runner.cleanup()
     else:
         # Polling mode (для разработки)
         logger.info("Starting in polling mode...")
@@ -335,9 +474,14 @@ async def main():
 
 
 if __name__ == "__main__":
+    exit_code = 0
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
         logger.exception(f"Bot crashed: {e}")
+        exit_code = 1
+    finally:
+        log_listener.stop()
+    sys.exit(exit_code)
@@ -3,9 +3,13 @@ Services for the Telegram bot
 """
 
 from .batch_service import BatchEditingService, BatchJob, BatchStatus, batch_service
+from .coalescer import RequestCoalescer, request_coalescer
 from .gemini_service import GeminiService, gemini_service
+from .image_pool import ImageProcessPool, image_pool
 from .kling_service import KlingService, kling_service
+from .media_registry import MediaRegistry, media_registry
 from .preset_manager import Preset, PresetManager, preset_manager
+from .result_cache import ResultCache, result_cache
 from .tbank_service import TBankService, tbank_service
 
 __all__ = [
@@ -22,4 +26,12 @@ __all__ = [
     "BatchGenerationService",
     "BatchJob",
     "BatchStatus",
+    "result_cache",
+    "ResultCache",
+    "image_pool",
+    "ImageProcessPool",
+    "request_coalescer",
+    "RequestCoalescer",
+    "media_registry",
+    "MediaRegistry",
 ]
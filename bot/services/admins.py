@@ -0,0 +1,37 @@
+from typing import FrozenSet, Iterable, Optional
+
+from bot.services.preset_manager import PresetManager
+
+
+class AdminRegistry:
+    """
+    Единый список администраторов.
+
+    Объединяет ADMIN_IDS из окружения и admin_ids из price.json в один
+    frozenset, так что проверка прав — поиск в множестве. Список из
+    price.json пересобирается, когда PresetManager перезагружает
+    конфигурацию (меняется его version).
+    """
+
+    def __init__(self, presets: PresetManager, env_ids: Iterable[int] = ()):
+        self.presets = presets
+        self.env_ids = frozenset(env_ids)
+        self._ids = self.env_ids
+        self._version: Optional[int] = None
+
+    @property
+    def ids(self) -> FrozenSet[int]:
+        if self._version != self.presets.version:
+            self._ids = self.env_ids | self.presets.get_admin_ids()
+            self._version = self.presets.version
+        return self._ids
+
+    def is_admin(self, user_id: int) -> bool:
+        return user_id in self.ids
+
+
+# Глобальный список администраторов
+from bot.config import config
+from bot.services.preset_manager import preset_manager
+
+admin_registry = AdminRegistry(preset_manager, config.admin_ids)
@@ -1,17 +1,29 @@
 import asyncio
-import io
+import hashlib
+import json
 import logging
 import os
 import time
 import uuid
-from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 
 from bot.config import config
+from bot.database import (
+    delete_old_batch_states,
+    find_recent_batch_result,
+    get_batch_job_ids_by_status,
+    get_batch_state,
+    save_batch_state,
+    update_batch_cost,
+    update_batch_item,
+    update_batch_status,
+)
+from bot.services.blob_store import blob_store
+from bot.services.concurrency import AdaptiveLimiter, provider_limiters
+from bot.services.gallery import render_gallery_pages
 from bot.services.gemini_service import gemini_service
 
 logger = logging.getLogger(__name__)
@@ -28,28 +40,65 @@ class BatchStatus(Enum):
 @dataclass
 class BatchItem:
     index: int
-    image: bytes  # Исходное изображение (bytes для галереи/превью)
+    image_hash: Optional[str]  # Хеш исходного изображения в BlobStore
     prompt: str  # Промпт пользователя
     image_url: Optional[str] = None  # Публичный URL исходного изображения
     status: BatchStatus = BatchStatus.PENDING
-    result: Optional[bytes] = None
+    result_hash: Optional[str] = None  # Хеш результата в BlobStore
     result_url: Optional[str] = None  # Публичный URL результата
     error: Optional[str] = None
     started_at: Optional[float] = None
     completed_at: Optional[float] = None
 
+    @property
+    def has_result(self) -> bool:
+        return self.result_hash is not None
+
     @property
     def duration(self) -> Optional[float]:
         if self.started_at and self.completed_at:
             return self.completed_at - self.started_at
         return None
 
+    def to_row(self) -> Dict:
+        return {
+            "item_index": self.index,
+            "prompt": self.prompt,
+            "image_hash": self.image_hash,
+            "image_url": self.image_url,
+            "status": self.status.value,
+            "result_hash": self.result_hash,
+            "result_url": self.result_url,
+            "error": self.error,
+            "started_at": self.started_at,
+            "completed_at": self.completed_at,
+        }
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "BatchItem":
+        return cls(
+            index=row["item_index"],
+            image_hash=row["image_hash"],
+            prompt=row["prompt"],
+            image_url=row["image_url"],
+            status=BatchStatus(row["status"]),
+            result_hash=row["result_hash"],
+            result_url=row["result_url"],
+            error=row["error"],
+            started_at=row["started_at"],
+            completed_at=row["completed_at"],
+        )
+
 
 @dataclass
 class BatchJob:
+    """
+    Пакетная задача. В памяти держится только то, что нужно для прогресса:
+    сами изображения лежат в BlobStore, состояние — в SQLite.
+    """
+
     id: str
     user_id: int
-    images: List[bytes]  # Список исходных изображений
     prompt: str  # Промпт от пользователя
     aspect_ratio: str  # Соотношение сторон (1:1, 16:9 и т.д.)
     total_cost: int
@@ -58,6 +107,11 @@ class BatchJob:
     created_at: float = field(default_factory=time.time)
     completed_at: Optional[float] = None
     progress_callback: Optional[Callable] = None
+    # Ключи дедупликации, за которые списаны кредиты (только в памяти)
+    billed_keys: set = field(default_factory=set)
+    generated_keys: set = field(default_factory=set)  # Запрошено этим пакетом
+    duplicates: int = 0  # Элементы, не требующие отдельного запроса
+    refund: int = 0  # Сколько вернуть: работа нашлась готовой при выполнении
 
     @property
     def progress_percent(self) -> int:
@@ -72,17 +126,66 @@ class BatchJob:
             i.status in (BatchStatus.COMPLETED, BatchStatus.FAILED) for i in self.items
         )
 
+    def to_row(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "user_id": self.user_id,
+            "prompt": self.prompt,
+            "aspect_ratio": self.aspect_ratio,
+            "total_cost": self.total_cost,
+            "status": self.status.value,
+            "created_at": self.created_at,
+            "completed_at": self.completed_at,
+        }
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "BatchJob":
+        return cls(
+            id=row["job_id"],
+            user_id=row["user_id"],
+            prompt=row["prompt"],
+            aspect_ratio=row["aspect_ratio"],
+            total_cost=row["total_cost"],
+            items=[BatchItem.from_row(item) for item in row["items"]],
+            status=BatchStatus(row["status"]),
+            created_at=row["created_at"],
+            completed_at=row["completed_at"],
+        )
+
 
 class BatchEditingService:
     """Сервис пакетного редактирования изображений"""
 
-    MAX_CONCURRENT = 3
-    COST_PER_IMAGE = 2  # 2 банана за изображение
+    COST_PER_IMAGE = 3  # 3 банана за изображение (Pro модель)
+    MODEL = "gemini-3-pro-image-preview"  # Pro модель с высоким качеством
+    RESOLUTION = "4K"
 
     def __init__(self):
-        self._semaphore = asyncio.Semaphore(self.MAX_CONCURRENT)
+        # Только выполняющиеся задачи; завершённые читаются из БД
         self._active_jobs: Dict[str, BatchJob] = {}
-        self._executor = ThreadPoolExecutor(max_workers=4)
+        # Single-flight: ключ дедупликации -> ожидание результата в полёте
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def dedup_key(self, image_hash: Optional[str], prompt: str, aspect_ratio: str):
+        """Ключ одинаковой работы: исходник, промпт, формат и модель"""
+        payload = json.dumps(
+            [image_hash, " ".join(prompt.split()), aspect_ratio]
+            + [self.MODEL, self.RESOLUTION]
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def _find_recent_result(self, key: str) -> Optional[dict]:
+        """Готовый результат той же работы (ключ dedup_key) из недавних пакетов"""
+        since = time.time() - config.BATCH_DEDUP_WINDOW_HOURS * 3600
+        try:
+            found = await find_recent_batch_result(key, since)
+        except Exception as e:
+            logger.error(f"Batch dedup lookup failed: {e}")
+            return None
+        # Блоб мог быть удалён очисткой — тогда результат не годится
+        if found and await asyncio.to_thread(blob_store.exists, found["result_hash"]):
+            return found
+        return None
 
     def _save_result_file(
         self, file_bytes: bytes, file_ext: str = "png"
@@ -129,31 +232,56 @@ class BatchEditingService:
         if not images or not prompt:
             return None
 
-        # Рассчитываем стоимость (Pro модель = 3 банана)
-        total_cost = len(images) * 3
+        # ID задачи уникален и без "_": обработчики делят callback_data по "_"
+        job_id = uuid.uuid4().hex
 
-        # Генерируем ID задачи
-        job_id = f"batch_{user_id}_{int(time.time())}"
+        # Исходники уходят в BlobStore, в задаче остаются только хеши
+        hashes = await asyncio.to_thread(
+            lambda: [blob_store.put(image) for image in images]
+        )
 
         # Создаём элементы - каждое изображение с одним промптом
         items = []
-        for i, image in enumerate(images):
+        for i, image_hash in enumerate(hashes):
             image_url = image_urls[i] if image_urls and i < len(image_urls) else None
             items.append(
-                BatchItem(index=i, image=image, prompt=prompt, image_url=image_url)
+                BatchItem(
+                    index=i, image_hash=image_hash, prompt=prompt, image_url=image_url
+                )
             )
 
+        # Платится только уникальная работа: повторы внутри пакета и то, что
+        # уже готово в недавних пакетах, кредитов не стоят
+        keys = [self.dedup_key(i.image_hash, prompt, aspect_ratio) for i in items]
+        billed_keys = set()
+        seen = set()
+        for key in keys:
+            if key in seen:
+                continue
+            seen.add(key)
+            found = await self._find_recent_result(key)
+            if not found:
+                billed_keys.add(key)
+
         job = BatchJob(
             id=job_id,
             user_id=user_id,
-            images=images,
             prompt=prompt,
             aspect_ratio=aspect_ratio,
-            total_cost=total_cost,
+            total_cost=len(billed_keys) * self.COST_PER_IMAGE,
             items=items,
+            billed_keys=billed_keys,
+            duplicates=len(items) - len(billed_keys),
         )
 
-        self._active_jobs[job_id] = job
+        try:
+            # Ключ хранится с элементом: по нему ищут готовые результаты
+            rows = [{**i.to_row(), "dedup_key": k} for i, k in zip(items, keys)]
+            await save_batch_state(job.to_row(), rows)
+        except Exception as e:
+            logger.exception(f"Failed to persist batch job {job_id}: {e}")
+            return None
+
         return job
 
     async def execute_batch(
@@ -162,71 +290,182 @@ class BatchEditingService:
         progress_callback: Optional[Callable[[BatchJob], Any]] = None,
     ) -> BatchJob:
         """Выполняет пакетное редактирование с прогрессом"""
+        async for _ in self.iter_batch(job, progress_callback):
+            pass
+        return job
 
-        job.status = BatchStatus.RUNNING
-        job.progress_callback = progress_callback
-
-        # Используем Pro модель с высоким качеством
-        model = "gemini-3-pro-image-preview"
+    async def iter_batch(
+        self,
+        job: BatchJob,
+        progress_callback: Optional[Callable[[BatchJob], Any]] = None,
+    ) -> AsyncIterator[BatchItem]:
+        """
+        Выполняет пакетное редактирование, отдавая элементы по мере готовности.
 
-        # Пакетное редактирование — параллельная обработка
-        await self._execute_parallel_editing(job, model)
+        Если потребитель прекратит итерацию раньше, оставшиеся элементы всё
+        равно доделываются — кредиты за них уже списаны.
+        """
 
-        # Финальная сборка
-        await self._finalize_job(job)
+        job.status = BatchStatus.RUNNING
+        job.progress_callback = progress_callback
+        self._active_jobs[job.id] = job
+        await update_batch_status(job.id, job.status.value)
+
+        # Общий для всех пользователей адаптивный лимит на провайдера/модель;
+        # слоты раздаются по кругу между пользователями и их задачами
+        limiter = provider_limiters.get("gemini", self.MODEL)
+
+        # Уже обработанные элементы (например, до перезапуска) пропускаем
+        pending = [
+            item
+            for item in job.items
+            if item.status not in (BatchStatus.COMPLETED, BatchStatus.FAILED)
+        ]
 
-        return job
+        # Пакетное редактирование — параллельная обработка (лимитер ограничит)
+        tasks = [
+            asyncio.create_task(self._edit_item(job, item, limiter))
+            for item in pending
+        ]
 
-    async def _execute_parallel_editing(self, job: BatchJob, model: str):
-        """Параллельное редактирование с ограничением конкурентности"""
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            # Финальная сборка
+            try:
+                await self._finalize_job(job)
+            finally:
+                self._active_jobs.pop(job.id, None)
+
+    async def _edit_item(
+        self, job: BatchJob, item: BatchItem, limiter: AdaptiveLimiter
+    ) -> BatchItem:
+        """
+        Редактирует один элемент пакета.
 
-        async def edit_item(item: BatchItem):
-            async with self._semaphore:
+        Одинаковая работа (см. dedup_key) выполняется один раз: первый элемент
+        делает запрос, повторы из этого и других пакетов ждут его результат.
+        Если результат уже есть в недавних пакетах, запроса нет вовсе.
+        """
+        key = self.dedup_key(item.image_hash, item.prompt, job.aspect_ratio)
+
+        shared = self._inflight.get(key)
+        if shared is not None:
+            item.status = BatchStatus.RUNNING
+            item.started_at = time.time()
+            # shield: отмена одного ожидающего не должна отменять общий запрос
+            await self._apply_result(job, item, await asyncio.shield(shared))
+            return item
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            found = await self._find_recent_result(key)
+            if found:
                 item.status = BatchStatus.RUNNING
                 item.started_at = time.time()
+                await self._apply_result(job, item, found)
+            else:
+                job.generated_keys.add(key)
+                await self._generate_item(job, item, limiter)
+        finally:
+            self._inflight.pop(key, None)
+            future.set_result(
+                {
+                    "result_hash": item.result_hash,
+                    "result_url": item.result_url,
+                    "error": item.error,
+                }
+            )
 
-                try:
-                    # Редактирование изображения через Gemini с Pro моделью, 4K качеством
-                    # Используем публичный URL если доступен, иначе bytes
-                    result = await gemini_service.generate_image(
-                        prompt=item.prompt,
-                        model=model,
-                        aspect_ratio=job.aspect_ratio,
-                        image_input=item.image if not item.image_url else None,
-                        image_input_url=item.image_url,
-                        resolution="4K",
-                    )
-
-                    if result:
-                        item.result = result
-                        # Сохраняем результат в файл и получаем публичный URL
-                        result_url = self._save_result_file(result, "png")
-                        if result_url:
-                            item.result_url = result_url
-                        item.status = BatchStatus.COMPLETED
-                    else:
-                        item.status = BatchStatus.FAILED
-                        item.error = "Empty response"
-
-                except Exception as e:
-                    logger.exception(f"Item {item.index} failed: {e}")
+        return item
+
+    async def _generate_item(
+        self, job: BatchJob, item: BatchItem, limiter: AdaptiveLimiter
+    ):
+        """Запрос к провайдеру для одного элемента"""
+        async with limiter.slot(user=job.user_id, flow=job.id):
+            item.status = BatchStatus.RUNNING
+            item.started_at = time.time()
+
+            try:
+                # Используем публичный URL если доступен, иначе bytes
+                image = None
+                if not item.image_url:
+                    image = await self.read_blob(item.image_hash)
+
+                # Редактирование изображения через Gemini с Pro моделью, 4K качеством
+                result = await gemini_service.generate_image(
+                    prompt=item.prompt,
+                    model=self.MODEL,
+                    aspect_ratio=job.aspect_ratio,
+                    image_input=image,
+                    image_input_url=item.image_url,
+                    resolution=self.RESOLUTION,
+                )
+
+                if result:
+                    item.result_hash = await asyncio.to_thread(blob_store.put, result)
+                    # Сохраняем результат в файл и получаем публичный URL
+                    result_url = self._save_result_file(result, "png")
+                    if result_url:
+                        item.result_url = result_url
+                    item.status = BatchStatus.COMPLETED
+                else:
                     item.status = BatchStatus.FAILED
-                    item.error = str(e)
-                finally:
-                    item.completed_at = time.time()
+                    item.error = "Empty response"
+
+            except Exception as e:
+                logger.exception(f"Item {item.index} failed: {e}")
+                item.status = BatchStatus.FAILED
+                item.error = str(e)
+            finally:
+                await self._complete_item(job, item)
+
+    async def _apply_result(self, job: BatchJob, item: BatchItem, result: dict):
+        """Раздаёт элементу результат общего запроса или прошлого пакета"""
+        if result.get("result_hash"):
+            item.result_hash = result["result_hash"]
+            item.result_url = result.get("result_url")
+            item.status = BatchStatus.COMPLETED
+        else:
+            item.status = BatchStatus.FAILED
+            item.error = result.get("error") or "Shared request failed"
+        await self._complete_item(job, item)
 
-                    # Уведомляем о прогрессе
-                    if job.progress_callback:
-                        await job.progress_callback(job)
+    async def _complete_item(self, job: BatchJob, item: BatchItem):
+        item.completed_at = time.time()
+        await self._save_item(job, item)
 
-        # Запускаем все задачи параллельно (семафор ограничит)
-        await asyncio.gather(*[edit_item(item) for item in job.items])
+        # Уведомляем о прогрессе
+        if job.progress_callback:
+            await job.progress_callback(job)
+
+    async def _save_item(self, job: BatchJob, item: BatchItem):
+        try:
+            await update_batch_item(job.id, item.to_row())
+        except Exception as e:
+            logger.error(f"Failed to persist batch item {job.id}/{item.index}: {e}")
 
     async def _finalize_job(self, job: BatchJob):
         """Финализирует задачу — сборка галереи, метрики"""
 
         job.completed_at = time.time()
 
+        # Оплаченная работа, которую за нас сделал другой пакет, возвращается
+        saved = len(job.billed_keys - job.generated_keys) * self.COST_PER_IMAGE
+        if saved:
+            job.refund += saved
+            job.total_cost -= saved
+            job.billed_keys &= job.generated_keys
+            try:
+                await update_batch_cost(job.id, job.total_cost)
+            except Exception as e:
+                logger.error(f"Failed to persist batch cost {job.id}: {e}")
+
         successful = [i for i in job.items if i.status == BatchStatus.COMPLETED]
 
         if len(successful) == len(job.items):
@@ -236,6 +475,11 @@ class BatchEditingService:
         else:
             job.status = BatchStatus.FAILED
 
+        try:
+            await update_batch_status(job.id, job.status.value, job.completed_at)
+        except Exception as e:
+            logger.error(f"Failed to persist batch status {job.id}: {e}")
+
         # Сохраняем в БД для истории
         await self._save_job_results(job)
 
@@ -259,83 +503,36 @@ class BatchEditingService:
         except Exception as e:
             logger.error(f"Failed to save batch job: {e}")
 
-    async def create_gallery_preview(self, job: BatchJob) -> Optional[bytes]:
-        """Создаёт превью-галерею из результатов"""
-
-        successful = [i for i in job.items if i.result]
-        if not successful:
-            return None
-
-        def _create_gallery():
-            from PIL import Image, ImageDraw, ImageFont
-
-            # Определяем разметку
-            count = len(successful)
-            if count <= 2:
-                cols, rows = count, 1
-            elif count <= 4:
-                cols, rows = 2, 2
-            else:
-                cols, rows = 3, 2
-
-            # Размер превью
-            thumb_size = 512
-            gallery_width = cols * thumb_size
-            gallery_height = rows * thumb_size
-
-            gallery = Image.new("RGB", (gallery_width, gallery_height), (240, 240, 240))
-
-            for idx, item in enumerate(successful):
-                if idx >= cols * rows:
-                    break
-
-                img = Image.open(io.BytesIO(item.result))
-                img.thumbnail(
-                    (thumb_size - 20, thumb_size - 20), Image.Resampling.LANCZOS
-                )
-
-                row = idx // cols
-                col = idx % cols
-
-                x = col * thumb_size + 10
-                y = row * thumb_size + 10
-
-                # Вставляем
-                gallery.paste(img, (x, y))
-
-                # Номер
-                draw = ImageDraw.Draw(gallery)
-                try:
-                    font = ImageFont.truetype(
-                        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 20
-                    )
-                except:
-                    font = ImageFont.load_default()
+    async def create_gallery_pages(self, job: BatchJob) -> List[bytes]:
+        """Создаёт превью-галерею из результатов (по 6 плиток на страницу)"""
 
-                draw.text((x + 5, y + 5), str(idx + 1), fill=(255, 255, 255), font=font)
-
-            # Сохраняем
-            buf = io.BytesIO()
-            gallery.save(buf, format="JPEG", quality=85)
-            return buf.getvalue()
+        hashes = [i.result_hash for i in job.items if i.has_result]
+        try:
+            frames = [f for f in await self.read_blobs(hashes) if f]
+            return await render_gallery_pages(frames)
+        except Exception as e:
+            logger.exception(f"Failed to render gallery for {job.id}: {e}")
+            return []
 
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self._executor, _create_gallery)
+    async def create_gallery_preview(self, job: BatchJob) -> Optional[bytes]:
+        """Первая страница превью-галереи"""
+        pages = await self.create_gallery_pages(job)
+        return pages[0] if pages else None
 
     async def upscale_selected(
         self, job_id: str, item_index: int, target_resolution: str = "4K"
     ) -> Optional[bytes]:
         """Апскейл выбранного изображения до высокого разрешения"""
 
-        job = self._active_jobs.get(job_id)
+        job = await self.get_job(job_id)
         if not job:
             return None
 
         if item_index >= len(job.items):
             return None
 
-        item = job.items[item_index]
-        if not item.result:
+        image = await self.read_blob(job.items[item_index].result_hash)
+        if not image:
             return None
 
         # Используем Gemini 3 Pro для апскейла
@@ -349,39 +546,65 @@ class BatchEditingService:
         result = await gemini_service.generate_image(
             prompt=upscale_prompt,
             model="gemini-3-pro-image-preview",
-            image_input=item.result,
+            image_input=image,
         )
 
         return result
 
-    def get_job(self, job_id: str) -> Optional[BatchJob]:
-        """Получает активную задачу"""
-        return self._active_jobs.get(job_id)
+    async def get_job(self, job_id: str) -> Optional[BatchJob]:
+        """Получает задачу: выполняющуюся из памяти, остальные из БД"""
+        job = self._active_jobs.get(job_id)
+        if job:
+            return job
+
+        row = await get_batch_state(job_id)
+        return BatchJob.from_row(row) if row else None
+
+    async def read_blob(self, digest: Optional[str]) -> Optional[bytes]:
+        """Читает изображение из BlobStore вне event loop"""
+        if not digest:
+            return None
+        return await asyncio.to_thread(blob_store.get, digest)
+
+    async def read_blobs(self, digests: List[str]) -> List[Optional[bytes]]:
+        return await asyncio.to_thread(lambda: [blob_store.get(d) for d in digests])
+
+    async def get_unfinished_jobs(self) -> List[BatchJob]:
+        """
+        Задачи, прерванные перезапуском. Элементы, которые были в работе,
+        возвращаются в очередь.
+        """
+        jobs = []
+        for job_id in await get_batch_job_ids_by_status(BatchStatus.RUNNING.value):
+            if job_id in self._active_jobs:
+                continue
+
+            job = await self.get_job(job_id)
+            if not job:
+                continue
+
+            for item in job.items:
+                if item.status == BatchStatus.RUNNING:
+                    item.status = BatchStatus.PENDING
+                    item.started_at = None
+            jobs.append(job)
+
+        return jobs
 
     def get_batch_modes(self) -> Dict[str, Dict]:
         """Получает все доступные режимы пакетного редактирования"""
-        try:
-            presets_path = Path("data/presets.json")
-            with open(presets_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            return data.get("batch_edit_modes", {})
-        except:
-            return {}
-
-    async def cleanup_old_jobs(self, max_age_hours: int = 24):
-        """Очищает старые задачи из памяти"""
-        cutoff = time.time() - (max_age_hours * 3600)
+        from bot.services.preset_manager import preset_manager
 
-        to_remove = [
-            jid
-            for jid, job in self._active_jobs.items()
-            if job.completed_at and job.completed_at < cutoff
-        ]
+        return dict(preset_manager.get_batch_modes())
+
+    async def cleanup_old_jobs(self, max_age_hours: int = 72) -> int:
+        """Удаляет старые невыполняющиеся задачи из БД и их блобы с диска"""
+        cutoff = time.time() - (max_age_hours * 3600)
 
-        for jid in to_remove:
-            del self._active_jobs[jid]
+        orphaned = await delete_old_batch_states(cutoff)
+        await asyncio.to_thread(lambda: [blob_store.delete(d) for d in orphaned])
 
-        return len(to_remove)
+        return len(orphaned)
 
 
 # Глобальный сервис
@@ -0,0 +1,77 @@
+import hashlib
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStore:
+    """
+    Контентно-адресуемое хранилище бинарных данных на диске.
+
+    Каждый блоб сохраняется под своим SHA-256 хешем:
+    <root>/<первые 2 символа>/<полный хеш>
+    Повторная запись одинакового содержимого не создаёт копий.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        """Возвращает SHA-256 хеш содержимого"""
+        return hashlib.sha256(data).hexdigest()
+
+    def path_for(self, digest: str) -> Path:
+        """Путь к файлу блоба по хешу"""
+        return self.root / digest[:2] / digest
+
+    def exists(self, digest: str) -> bool:
+        return self.path_for(digest).exists()
+
+    def put(self, data: bytes) -> str:
+        """Сохраняет блоб и возвращает его хеш (атомарная запись)"""
+        digest = self.hash_bytes(data)
+        path = self.path_for(digest)
+
+        if path.exists():
+            return digest
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{digest}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """Читает блоб по хешу, None если его нет"""
+        try:
+            with open(self.path_for(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def size(self, digest: str) -> int:
+        try:
+            return self.path_for(digest).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def delete(self, digest: str) -> bool:
+        """Удаляет блоб, возвращает True если файл был"""
+        try:
+            self.path_for(digest).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+
+# Глобальное хранилище блобов
+from bot.config import config
+
+blob_store = BlobStore(config.BLOB_STORE_DIR)
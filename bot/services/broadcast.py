@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from bot.database import (
+    create_broadcast,
+    finish_broadcast,
+    get_broadcast,
+    get_broadcast_ids_by_status,
+    get_broadcast_recipients,
+    mark_recipient_blocked,
+    save_broadcast_progress,
+)
+from bot.services.outbound import Priority, send_priority
+from bot.services.progress import progress_renderer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BroadcastState:
+    id: int
+    text: str
+    admin_chat_id: Optional[int] = None
+    progress_message_id: Optional[int] = None
+    last_user_id: int = 0
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    sent_at_start: int = 0  # Для скорости после возобновления
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return (self.sent - self.sent_at_start) / elapsed if elapsed > 0 else 0.0
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "BroadcastState":
+        return cls(
+            id=row["id"],
+            text=row["text"],
+            admin_chat_id=row["admin_chat_id"],
+            progress_message_id=row["progress_message_id"],
+            last_user_id=row["last_user_id"],
+            sent=row["sent"],
+            failed=row["failed"],
+            blocked=row["blocked"],
+            sent_at_start=row["sent"],
+        )
+
+
+class BroadcastService:
+    """
+    Рассылка сообщений всем пользователям.
+
+    Получатели читаются страницами по users.id, каждая страница отправляется
+    параллельно (темп задаёт OutboundScheduler, приоритет — BULK), после
+    страницы прогресс сохраняется в таблицу broadcasts. После перезапуска
+    рассылка продолжается с контрольной точки; сообщения из недосохранённой
+    страницы могут уйти повторно. Заблокировавшие бота пользователи
+    помечаются и в следующие рассылки не попадают.
+    """
+
+    def __init__(self, page_size: int = 100, concurrency: int = 20):
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    async def start(
+        self,
+        bot: Bot,
+        text: str,
+        admin_chat_id: int,
+        progress_message_id: Optional[int] = None,
+    ) -> int:
+        """Создаёт рассылку и запускает её в фоне, не дожидаясь окончания"""
+        broadcast_id = await create_broadcast(text, admin_chat_id, progress_message_id)
+        state = BroadcastState(
+            id=broadcast_id,
+            text=text,
+            admin_chat_id=admin_chat_id,
+            progress_message_id=progress_message_id,
+        )
+        self._spawn(bot, state)
+        return broadcast_id
+
+    async def resume(self, bot: Bot) -> int:
+        """Продолжает рассылки, прерванные перезапуском"""
+        resumed = 0
+        for broadcast_id in await get_broadcast_ids_by_status("running"):
+            if broadcast_id in self._tasks:
+                continue
+            row = await get_broadcast(broadcast_id)
+            if row:
+                logger.info(
+                    f"Resuming broadcast {broadcast_id} after user {row['last_user_id']}"
+                )
+                self._spawn(bot, BroadcastState.from_row(row))
+                resumed += 1
+        return resumed
+
+    async def wait(self, broadcast_id: int):
+        task = self._tasks.get(broadcast_id)
+        if task:
+            await task
+
+    def _spawn(self, bot: Bot, state: BroadcastState):
+        task = asyncio.create_task(self._run(bot, state))
+        self._tasks[state.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(state.id, None))
+
+    # =========================================================================
+    # ВЫПОЛНЕНИЕ
+    # =========================================================================
+
+    async def _run(self, bot: Bot, state: BroadcastState):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(telegram_id: int):
+            async with semaphore:
+                await self._send_one(bot, state, telegram_id)
+
+        try:
+            # Рассылка уступает общий лимит ответам и результатам генераций
+            with send_priority(Priority.BULK):
+                while True:
+                    page = await get_broadcast_recipients(
+                        state.last_user_id, self.page_size
+                    )
+                    if not page:
+                        break
+
+                    await asyncio.gather(
+                        *[deliver(telegram_id) for _, telegram_id in page]
+                    )
+
+                    state.last_user_id = page[-1][0]
+                    await save_broadcast_progress(
+                        state.id,
+                        state.last_user_id,
+                        state.sent,
+                        state.failed,
+                        state.blocked,
+                    )
+                    self._report(state)
+
+            await finish_broadcast(state.id)
+            self._report(state, final=True)
+            logger.info(
+                f"Broadcast {state.id} done: sent={state.sent}, "
+                f"failed={state.failed}, blocked={state.blocked}"
+            )
+        except asyncio.CancelledError:
+            # Остановка бота — рассылка продолжится с контрольной точки
+            raise
+        except Exception as e:
+            logger.exception(f"Broadcast {state.id} failed: {e}")
+            await finish_broadcast(state.id, "failed")
+            self._report(state, final=True, error=str(e))
+
+    async def _send_one(self, bot: Bot, state: BroadcastState, telegram_id: int):
+        try:
+            await bot.send_message(telegram_id, state.text, parse_mode="HTML")
+            state.sent += 1
+        except TelegramForbiddenError as e:
+            # Бот заблокирован или аккаунт удалён
+            state.blocked += 1
+            await mark_recipient_blocked(telegram_id, str(e)[:200])
+        except TelegramBadRequest as e:
+            if "chat not found" in str(e).lower():
+                state.blocked += 1
+                await mark_recipient_blocked(telegram_id, str(e)[:200])
+            else:
+                logger.warning(f"Broadcast failed for {telegram_id}: {e}")
+                state.failed += 1
+        except Exception as e:
+            logger.warning(f"Broadcast failed for {telegram_id}: {e}")
+            state.failed += 1
+
+    def _report(
+        self, state: BroadcastState, final: bool = False, error: Optional[str] = None
+    ):
+        """Живой прогресс в сообщении администратора"""
+        if not state.admin_chat_id or not state.progress_message_id:
+            return
+
+        if error:
+            title = "❌ <b>Рассылка прервана</b>"
+        elif final:
+            title = "📢 <b>Рассылка завершена!</b>"
+        else:
+            title = "📢 <b>Рассылка идёт...</b>"
+
+        text = (
+            f"{title}\n\n"
+            f"✅ Успешно: <code>{state.sent}</code>\n"
+            f"🚫 Заблокировали бота: <code>{state.blocked}</code>\n"
+            f"❌ Ошибок: <code>{state.failed}</code>\n"
+            f"⚡ Скорость: <code>{state.rate:.1f}</code> сообщ./сек"
+        )
+        if error:
+            text += f"\n\nОшибка: {error[:100]}"
+
+        reply_markup = None
+        if final:
+            from bot.keyboards import get_admin_keyboard
+
+            reply_markup = get_admin_keyboard()
+
+        progress_renderer.update(
+            state.admin_chat_id,
+            state.progress_message_id,
+            text,
+            reply_markup=reply_markup,
+            final=final,
+        )
+
+
+# Глобальный сервис рассылок
+from bot.config import config
+
+broadcast_service = BroadcastService(concurrency=config.BROADCAST_CONCURRENCY)
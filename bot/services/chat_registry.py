@@ -0,0 +1,362 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChatSession:
+    chat: Any  # Объект чата google-genai
+    model: str
+    enable_search: bool = False
+    created_at: float = 0.0
+    last_access: float = 0.0
+    memory_bytes: int = 0  # Оценка объёма истории (текст + изображения)
+    turns: int = 0
+
+
+class ChatSessionRegistry:
+    """
+    Реестр сессий многоходового редактирования.
+
+    Ограничивает количество сессий и суммарный объём их истории,
+    вытесняет простаивающие (idle TTL) и давно не использованные (LRU)
+    сессии. Если задан persist_dir, история вытесненной сессии
+    сериализуется на диск и восстанавливается при следующем обращении —
+    в том числе после перезапуска бота; активные сессии при остановке
+    сохраняет flush().
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 200,
+        idle_ttl: float = 1800,
+        max_total_bytes: int = 512 * 1024 * 1024,
+        persist_dir: Optional[str] = None,
+        persist_ttl: float = 7 * 24 * 3600,
+        restore: Optional[Callable[[str, bool, List[Dict]], Any]] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_total_bytes = max_total_bytes
+        self.persist_dir = Path(persist_dir) if persist_dir else None
+        self.persist_ttl = persist_ttl
+        self._restore = restore
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._total_bytes = 0
+        self._to_persist: List[tuple] = []
+        self._persist_task: Optional[asyncio.Task] = None
+        self._evicted = 0
+        self._restored = 0
+
+    # =========================================================================
+    # СОВМЕСТИМОСТЬ С DICT
+    # =========================================================================
+
+    def __contains__(self, chat_id: str) -> bool:
+        return chat_id in self._sessions
+
+    def __getitem__(self, chat_id: str) -> Any:
+        session = self._sessions[chat_id]
+        self._touch(chat_id, session)
+        return session.chat
+
+    def __setitem__(self, chat_id: str, chat: Any):
+        self._register(chat_id, chat, model="", enable_search=False)
+
+    def __delitem__(self, chat_id: str):
+        self._discard(chat_id)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    # =========================================================================
+    # ОСНОВНЫЕ ОПЕРАЦИИ
+    # =========================================================================
+
+    async def put(
+        self, chat_id: str, chat: Any, model: str, enable_search: bool = False
+    ):
+        """Регистрирует новую сессию (с вытеснением лишних)"""
+        self._register(chat_id, chat, model, enable_search)
+        await self._persist_pending()
+
+    async def get(self, chat_id: str) -> Optional[Any]:
+        """Возвращает чат, при необходимости восстанавливая историю с диска"""
+        self._evict_expired()
+
+        session = self._sessions.get(chat_id)
+        if session is None:
+            # Только что вытесненная сессия ещё в памяти — возвращаем её,
+            # остальные ожидающие записи сбрасываем до чтения с диска
+            session = self._take_pending(chat_id)
+        if session is None:
+            await self._persist_pending()
+            session = await self._load_persisted(chat_id)
+
+        await self._persist_pending()
+
+        if session is None:
+            return None
+
+        self._touch(chat_id, session)
+        return session.chat
+
+    def account(self, chat_id: str, nbytes: int):
+        """Учитывает объём очередного хода в памяти сессии"""
+        session = self._sessions.get(chat_id)
+        if session is None:
+            return
+
+        session.memory_bytes += nbytes
+        session.turns += 1
+        self._total_bytes += nbytes
+        self._evict_over_limits(keep=chat_id)
+        if self._to_persist:
+            self._schedule_persist()
+
+    async def remove(self, chat_id: str) -> bool:
+        """Закрывает сессию и удаляет её сохранённую историю"""
+        existed = self._discard(chat_id)
+
+        if self.persist_dir:
+            path = self._history_path(chat_id)
+            removed = await asyncio.to_thread(self._unlink, path)
+            existed = existed or removed
+
+        return existed
+
+    async def sweep(self) -> int:
+        """Вытесняет простаивающие сессии и чистит устаревшую историю на диске"""
+        evicted = self._evict_expired()
+        await self._persist_pending()
+
+        if self.persist_dir:
+            await asyncio.to_thread(self._cleanup_persisted)
+
+        return evicted
+
+    async def flush(self) -> int:
+        """
+        Сохраняет на диск все сессии, включая активные (при остановке бота).
+        Сессии остаются в памяти. Возвращает число записанных сессий.
+        """
+        if not self.persist_dir:
+            return 0
+
+        await self._persist_pending()
+        saved = 0
+        for chat_id, session in list(self._sessions.items()):
+            if not session.model:
+                continue
+            try:
+                await asyncio.to_thread(self._write_history, chat_id, session)
+                saved += 1
+            except Exception as e:
+                logger.warning(f"Failed to persist chat {chat_id}: {e}")
+
+        logger.info(f"Chat sessions flushed to disk: {saved}")
+        return saved
+
+    def stats(self) -> Dict:
+        return {
+            "sessions": len(self._sessions),
+            "memory_bytes": self._total_bytes,
+            "max_bytes": self.max_total_bytes,
+            "evicted": self._evicted,
+            "restored": self._restored,
+        }
+
+    # =========================================================================
+    # ВЫТЕСНЕНИЕ
+    # =========================================================================
+
+    def _register(self, chat_id: str, chat: Any, model: str, enable_search: bool):
+        self._discard(chat_id)
+
+        now = time.time()
+        self._sessions[chat_id] = ChatSession(
+            chat=chat,
+            model=model,
+            enable_search=enable_search,
+            created_at=now,
+            last_access=now,
+        )
+        self._evict_expired()
+        self._evict_over_limits(keep=chat_id)
+
+    def _touch(self, chat_id: str, session: ChatSession):
+        session.last_access = time.time()
+        self._sessions.move_to_end(chat_id)
+
+    def _discard(self, chat_id: str) -> bool:
+        session = self._sessions.pop(chat_id, None)
+        if session is None:
+            return False
+        self._total_bytes -= session.memory_bytes
+        return True
+
+    def _evict(self, chat_id: str):
+        session = self._sessions.get(chat_id)
+        if session is None:
+            return
+
+        self._discard(chat_id)
+        self._evicted += 1
+
+        if self.persist_dir and session.model:
+            self._to_persist.append((chat_id, session))
+        logger.info(f"Chat session evicted: {chat_id} ({session.memory_bytes} bytes)")
+
+    def _evict_expired(self) -> int:
+        """Сессии упорядочены по last_access, поэтому хватает прохода с начала"""
+        cutoff = time.time() - self.idle_ttl
+        evicted = 0
+
+        while self._sessions:
+            chat_id, session = next(iter(self._sessions.items()))
+            if session.last_access >= cutoff:
+                break
+            self._evict(chat_id)
+            evicted += 1
+
+        return evicted
+
+    def _evict_over_limits(self, keep: Optional[str] = None):
+        while self._sessions and (
+            len(self._sessions) > self.max_sessions
+            or self._total_bytes > self.max_total_bytes
+        ):
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                if len(self._sessions) == 1:
+                    break
+                self._sessions.move_to_end(oldest)
+                continue
+            self._evict(oldest)
+
+    # =========================================================================
+    # СОХРАНЕНИЕ ИСТОРИИ НА ДИСК
+    # =========================================================================
+
+    def _history_path(self, chat_id: str) -> Path:
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", chat_id)
+        return self.persist_dir / f"{safe_id}.json"
+
+    async def _persist_pending(self):
+        while self._to_persist:
+            # Запись остаётся в очереди, пока файл не записан: get() в это
+            # время найдёт сессию в памяти, а не пустой диск
+            item = self._to_persist[-1]
+            chat_id, session = item
+            try:
+                await asyncio.to_thread(self._write_history, chat_id, session)
+            except Exception as e:
+                logger.warning(f"Failed to persist chat {chat_id}: {e}")
+            self._to_persist = [x for x in self._to_persist if x is not item]
+
+    def _schedule_persist(self):
+        """Фоновая запись вытесненных сессий из синхронного кода"""
+        if self._persist_task and not self._persist_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Нет event loop — запишем при следующем get/put/sweep
+        self._persist_task = loop.create_task(self._persist_pending())
+
+    def _take_pending(self, chat_id: str) -> Optional[ChatSession]:
+        """Возвращает в реестр сессию, ожидающую записи на диск"""
+        for i, (pending_id, session) in enumerate(self._to_persist):
+            if pending_id == chat_id:
+                del self._to_persist[i]
+                self._sessions[chat_id] = session
+                self._total_bytes += session.memory_bytes
+                self._evict_over_limits(keep=chat_id)
+                return session
+        return None
+
+    def _write_history(self, chat_id: str, session: ChatSession):
+        history = [
+            content.model_dump(mode="json", exclude_none=True)
+            for content in session.chat.get_history()
+        ]
+
+        self.persist_dir.mkdir(parents=True, exist_ok=True)
+        path = self._history_path(chat_id)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "chat_id": chat_id,
+                    "model": session.model,
+                    "enable_search": session.enable_search,
+                    "created_at": session.created_at,
+                    "turns": session.turns,
+                    "history": history,
+                },
+                f,
+            )
+        os.replace(tmp_path, path)
+
+    async def _load_persisted(self, chat_id: str) -> Optional[ChatSession]:
+        if not self.persist_dir or not self._restore:
+            return None
+
+        path = self._history_path(chat_id)
+        try:
+            data = await asyncio.to_thread(self._read_json, path)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Failed to load chat history {chat_id}: {e}")
+            return None
+
+        try:
+            chat = self._restore(data["model"], data["enable_search"], data["history"])
+        except Exception as e:
+            logger.exception(f"Failed to restore chat {chat_id}: {e}")
+            return None
+
+        self._register(chat_id, chat, data["model"], data["enable_search"])
+        self.account(chat_id, path.stat().st_size if path.exists() else 0)
+        session = self._sessions[chat_id]
+        session.created_at = data.get("created_at", session.created_at)
+        session.turns = data.get("turns", 0)
+        self._restored += 1
+
+        logger.info(f"Chat session restored from disk: {chat_id}")
+        return session
+
+    @staticmethod
+    def _read_json(path: Path) -> Dict:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _unlink(path: Path) -> bool:
+        try:
+            path.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _cleanup_persisted(self):
+        if not self.persist_dir.exists():
+            return
+
+        cutoff = time.time() - self.persist_ttl
+        for path in self.persist_dir.glob("*.json"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCoalescer:
+    """
+    Single-flight для одинаковых запросов одного пользователя.
+
+    Двойное нажатие кнопки и повторная доставка callback'а от Telegram
+    не должны запускать вторую генерацию и второй раз списывать кредиты.
+    Пока запрос выполняется, дубли ждут тот же future; после успешного
+    завершения ключ ещё window секунд считается выполненным и дубли
+    получают запомненный результат.
+    """
+
+    def __init__(self, window: float = 60.0, max_recent: int = 4096):
+        self.window = window
+        self.max_recent = max_recent
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # key -> (время завершения, результат), от старых к новым
+        self._recent: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._coalesced = 0
+
+    @staticmethod
+    def make_key(user_id: int, kind: str, *parts: Any) -> str:
+        """Ключ из пользователя, типа запроса и его нормализованных параметров"""
+        normalized = [user_id, kind]
+        for part in parts:
+            if isinstance(part, (bytes, bytearray)):
+                part = hashlib.sha256(part).hexdigest()
+            elif isinstance(part, str):
+                part = " ".join(part.split())
+            normalized.append(part)
+        raw = json.dumps(normalized, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def pending(self, key: str) -> bool:
+        """Выполняется ли запрос сейчас или завершился недавно"""
+        self._prune()
+        return key in self._inflight or key in self._recent
+
+    async def run(
+        self, key: str, func: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Optional[Any], bool]:
+        """
+        Выполняет func один раз на ключ.
+
+        Возвращает (результат, leader): leader=True только у вызова, который
+        действительно выполнил запрос. Запоминается только истинный
+        результат: ложный (нет кредитов, пресет не найден) или исключение
+        лидера означают, что запрос не выполнен, и повтор сразу разрешён.
+        """
+        self._prune()
+
+        if key in self._recent:
+            self._coalesced += 1
+            logger.info(f"Coalesced recent request {key[:12]}")
+            return self._recent[key][1], False
+
+        shared = self._inflight.get(key)
+        if shared is not None:
+            self._coalesced += 1
+            logger.info(f"Coalesced in-flight request {key[:12]}")
+            # shield: отмена дубля не должна отменять запрос лидера
+            return await asyncio.shield(shared), False
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        result = None
+        try:
+            result = await func()
+            if result:
+                self._remember(key, result)
+            return result, True
+        finally:
+            self._inflight.pop(key, None)
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, int]:
+        self._prune()
+        return {
+            "inflight": len(self._inflight),
+            "recent": len(self._recent),
+            "coalesced": self._coalesced,
+        }
+
+    def _remember(self, key: str, result: Any):
+        self._recent[key] = (time.monotonic(), result)
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.max_recent:
+            self._recent.popitem(last=False)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.window
+        while self._recent:
+            key, (finished_at, _) = next(iter(self._recent.items()))
+            if finished_at >= cutoff:
+                break
+            del self._recent[key]
+
+
+# Глобальный координатор запросов
+from bot.config import config
+
+request_coalescer = RequestCoalescer(window=config.REQUEST_COALESCE_WINDOW)
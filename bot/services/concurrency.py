@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# СИГНАЛ ПЕРЕГРУЗКИ ОТ ПРОВАЙДЕРА
+# =============================================================================
+
+
+@dataclass
+class _Outcome:
+    overloaded: bool = False
+    reason: str = ""
+
+
+_current_outcome: ContextVar[Optional[_Outcome]] = ContextVar(
+    "provider_outcome", default=None
+)
+
+
+def signal_overload(reason: str):
+    """
+    Сообщает лимитеру, что провайдер перегружен (429/503/таймаут).
+
+    Вызывается из сервисов API в том же задании, что держит слот;
+    вне слота ничего не делает.
+    """
+    outcome = _current_outcome.get()
+    if outcome is not None:
+        outcome.overloaded = True
+        outcome.reason = reason
+
+
+def is_overload_status(status: int) -> bool:
+    return status in (429, 503)
+
+
+# =============================================================================
+# AIMD-ЛИМИТЕР С ЧЕСТНОЙ ОЧЕРЕДЬЮ
+# =============================================================================
+
+
+class AdaptiveLimiter:
+    """
+    Адаптивный лимит параллельных запросов к одному провайдеру/модели.
+
+    Лимит растёт на 1 за каждое «окно» успешных ответов (additive increase)
+    и делится пополам при перегрузке (multiplicative decrease). Ожидающие
+    запросы обслуживаются по кругу (round-robin): сначала по пользователям,
+    внутри пользователя — по его задачам, так что большой пакет одного
+    пользователя не блокирует остальных.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = 3,
+        min_limit: int = 1,
+        max_limit: int = 16,
+        backoff: float = 0.5,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._window = 0
+
+        # user -> flow -> очередь ожидающих
+        self._waiters: "OrderedDict[Hashable, OrderedDict[Hashable, Deque]]" = (
+            OrderedDict()
+        )
+
+        self._successes = 0
+        self._overloads = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for flows in self._waiters.values() for q in flows.values())
+
+    @asynccontextmanager
+    async def slot(self, user: Hashable, flow: Hashable = None):
+        """Занимает слот; исход запроса определяется по signal_overload и исключениям"""
+        await self._acquire(user, flow)
+        started = time.monotonic()
+        outcome = _Outcome()
+        token = _current_outcome.set(outcome)
+        try:
+            yield
+        except asyncio.TimeoutError:
+            outcome.overloaded = True
+            outcome.reason = "timeout"
+            raise
+        finally:
+            _current_outcome.reset(token)
+            self._release(outcome, started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "queued": self.queued,
+            "successes": self._successes,
+            "overloads": self._overloads,
+        }
+
+    # =========================================================================
+    # ОЧЕРЕДЬ
+    # =========================================================================
+
+    async def _acquire(self, user: Hashable, flow: Hashable):
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        flows = self._waiters.setdefault(user, OrderedDict())
+        flows.setdefault(flow, deque()).append(future)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан — возвращаем его следующему
+                self._in_flight -= 1
+                self._dispatch()
+            else:
+                self._remove_waiter(user, flow, future)
+            raise
+
+    def _remove_waiter(self, user: Hashable, flow: Hashable, future):
+        flows = self._waiters.get(user)
+        if not flows or flow not in flows:
+            return
+        try:
+            flows[flow].remove(future)
+        except ValueError:
+            return
+        if not flows[flow]:
+            del flows[flow]
+        if not flows:
+            del self._waiters[user]
+
+    def _next_waiter(self):
+        """Round-robin: по слоту каждому пользователю, затем следующему"""
+        while self._waiters:
+            user, flows = next(iter(self._waiters.items()))
+
+            # Внутри пользователя — по кругу между его задачами
+            flow, queue = next(iter(flows.items()))
+            future = queue.popleft()
+            if queue:
+                flows.move_to_end(flow)
+            else:
+                del flows[flow]
+
+            if flows:
+                self._waiters.move_to_end(user)
+            else:
+                del self._waiters[user]
+
+            if not future.cancelled():
+                return future
+        return None
+
+    def _dispatch(self):
+        while self._in_flight < self.limit:
+            future = self._next_waiter()
+            if future is None:
+                return
+            self._in_flight += 1
+            future.set_result(None)
+
+    # =========================================================================
+    # AIMD
+    # =========================================================================
+
+    def _release(self, outcome: _Outcome, started: float):
+        self._in_flight -= 1
+
+        if outcome.overloaded:
+            self._overloads += 1
+            # Одна перегрузка на «поколение» запросов: ответы, начатые до
+            # предыдущего снижения, лимит повторно не режут
+            if started >= self._last_decrease:
+                old = self.limit
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+                self._window = 0
+                self._last_decrease = time.monotonic()
+                logger.warning(
+                    f"Concurrency {self.name}: {old} -> {self.limit} ({outcome.reason})"
+                )
+        else:
+            self._successes += 1
+            self._window += 1
+            # Окно — столько успешных ответов подряд, каков текущий лимит
+            if self._window >= self.limit and self.limit < self.max_limit:
+                self._window = 0
+                self._limit = self.limit + 1
+                logger.info(f"Concurrency {self.name}: -> {self.limit}")
+
+        self._dispatch()
+
+
+class ProviderLimiters:
+    """Реестр адаптивных лимитеров по ключу провайдер/модель"""
+
+    def __init__(self, initial: int = 3, max_limit: int = 16):
+        self.initial = initial
+        self.max_limit = max_limit
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+
+    def get(self, provider: str, model: str) -> AdaptiveLimiter:
+        key = f"{provider}/{model}"
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveLimiter(
+                key, initial=self.initial, max_limit=self.max_limit
+            )
+            self._limiters[key] = limiter
+        return limiter
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {key: limiter.stats() for key, limiter in self._limiters.items()}
+
+
+# Глобальный реестр лимитеров
+from bot.config import config
+
+provider_limiters = ProviderLimiters(
+    initial=config.PROVIDER_INITIAL_CONCURRENCY,
+    max_limit=config.PROVIDER_MAX_CONCURRENCY,
+)
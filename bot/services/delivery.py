@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from enum import Enum
+from typing import Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryMethod(str, Enum):
+    FILE_ID = "file_id"  # Уже в Telegram — мгновенно
+    URL = "url"  # Telegram сам скачивает со static-хоста
+    UPLOAD = "upload"  # Загружаем байты через наш канал
+
+
+class DeliveryPlanner:
+    """
+    Выбор способа отправки файла в Telegram.
+
+    Известный file_id всегда выигрывает. Иначе сравниваются две оценки:
+    загрузка байтов (базовая задержка + размер / измеренная скорость
+    канала) и отправка по URL (измеренное время, за которое Telegram
+    забирает файл со static-хоста). URL не используется, если файл больше
+    лимита Telegram для ссылок или static-хост недоступен: хост проверяется
+    фоновым HEAD-запросом, а отказ Telegram скачать ссылку выключает URL
+    на host_cooldown секунд. Оценки — экспоненциальные скользящие средние
+    по реальным отправкам.
+    """
+
+    # Лимиты Telegram на файлы, отправляемые по URL
+    URL_LIMITS = {"photo": 5 * 1024 * 1024, "document": 20 * 1024 * 1024}
+    DEFAULT_URL_LIMIT = 20 * 1024 * 1024
+
+    # Загрузки меньше этого размера меряют задержку, а не скорость канала
+    SMALL_UPLOAD = 64 * 1024
+
+    def __init__(
+        self,
+        static_base_url: Optional[str] = None,
+        upload_rate: float = 1024 * 1024,
+        upload_latency: float = 0.5,
+        url_latency: float = 2.0,
+        alpha: float = 0.2,
+        host_cooldown: float = 300,
+        probe_interval: float = 300,
+    ):
+        self.static_base_url = static_base_url
+        self.upload_rate = upload_rate  # Байт в секунду
+        self.upload_latency = upload_latency
+        self.url_latency = url_latency
+        self.alpha = alpha
+        self.host_cooldown = host_cooldown
+        self.probe_interval = probe_interval
+
+        self._host_down_until = 0.0
+        self._probed_at: Optional[float] = None
+        self._probe: Optional[asyncio.Task] = None
+        self._chosen: Dict[str, int] = {m.value: 0 for m in DeliveryMethod}
+
+    def choose(
+        self,
+        kind: str,
+        size: Optional[int],
+        has_file_id: bool = False,
+        has_url: bool = False,
+    ) -> DeliveryMethod:
+        """Способ отправки файла размером size байт (None — неизвестен)"""
+        if has_file_id:
+            method = DeliveryMethod.FILE_ID
+        elif not has_url or not self.host_available():
+            method = DeliveryMethod.UPLOAD
+        elif size is None:
+            method = DeliveryMethod.URL
+        elif size > self.URL_LIMITS.get(kind, self.DEFAULT_URL_LIMIT):
+            method = DeliveryMethod.UPLOAD
+        elif self.estimate_upload(size) > self.url_latency:
+            method = DeliveryMethod.URL
+        else:
+            method = DeliveryMethod.UPLOAD
+
+        self._chosen[method.value] += 1
+        return method
+
+    def serves(self, url: str) -> bool:
+        """Ссылка на наш static-хост: только по таким меряется url_latency"""
+        return bool(self.static_base_url) and url.startswith(self.static_base_url)
+
+    def estimate_upload(self, size: int) -> float:
+        return self.upload_latency + size / self.upload_rate
+
+    def record_upload(self, size: int, seconds: float):
+        if size < self.SMALL_UPLOAD:
+            self.upload_latency = self._ewma(self.upload_latency, seconds)
+            return
+        transfer = max(seconds - self.upload_latency, 0.05)
+        self.upload_rate = self._ewma(self.upload_rate, size / transfer)
+
+    def record_url(self, seconds: float):
+        self.url_latency = self._ewma(self.url_latency, seconds)
+
+    def url_failed(self, reason: str = ""):
+        """Telegram не смог скачать ссылку — временно отправляем байтами"""
+        logger.warning(
+            f"URL delivery disabled for {self.host_cooldown:.0f}s: {reason[:100]}"
+        )
+        self._host_down_until = time.monotonic() + self.host_cooldown
+
+    def host_available(self) -> bool:
+        if time.monotonic() < self._host_down_until:
+            return False
+        self._schedule_probe()
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            "chosen": dict(self._chosen),
+            "upload_rate_kbps": round(self.upload_rate / 1024),
+            "upload_latency": round(self.upload_latency, 2),
+            "url_latency": round(self.url_latency, 2),
+            "host_available": time.monotonic() >= self._host_down_until,
+        }
+
+    def _ewma(self, current: float, sample: float) -> float:
+        return (1 - self.alpha) * current + self.alpha * sample
+
+    # =========================================================================
+    # ПРОВЕРКА STATIC-ХОСТА
+    # =========================================================================
+
+    def _schedule_probe(self):
+        """Фоновая проверка хоста не чаще раза в probe_interval секунд"""
+        if not self.static_base_url:
+            return
+        now = time.monotonic()
+        if self._probed_at is not None and now - self._probed_at < self.probe_interval:
+            return
+        if self._probe and not self._probe.done():
+            return
+        try:
+            self._probe = asyncio.get_running_loop().create_task(self._probe_host())
+        except RuntimeError:
+            return  # Нет event loop — проверим при следующей отправке
+        self._probed_at = now
+
+    async def _probe_host(self):
+        # Любой HTTP-ответ, даже 404, значит, что хост принимает запросы
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.head(
+                    self.static_base_url, timeout=aiohttp.ClientTimeout(total=5)
+                ):
+                    pass
+        except Exception as e:
+            self.url_failed(f"static host probe failed: {e}")
+
+
+# Глобальный выбор способа доставки
+from bot.config import config
+
+delivery_planner = DeliveryPlanner(static_base_url=config.static_base_url)
@@ -0,0 +1,141 @@
+"""
+Компоновщик превью-галерей для пакетного редактирования.
+
+Каждая плитка готовится в отдельном процессе ImageProcessPool: JPEG
+декодируется сразу в уменьшенном масштабе (Image.draft), остальные
+форматы уменьшаются через reducing_gap. Готовые плитки собираются
+в страницы по GALLERY_COLS × GALLERY_ROWS (сетка растёт, если на
+странице больше плиток), номера плиток сквозные.
+"""
+
+import asyncio
+import io
+import math
+from functools import lru_cache
+from typing import List
+
+TILE_SIZE = 512
+TILE_PADDING = 10
+GALLERY_COLS = 3
+GALLERY_ROWS = 2
+PAGE_TILES = GALLERY_COLS * GALLERY_ROWS
+
+BACKGROUND = (240, 240, 240)
+FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+FONT_SIZE = 20
+
+
+# =============================================================================
+# КОД, ВЫПОЛНЯЕМЫЙ В РАБОЧИХ ПРОЦЕССАХ
+# =============================================================================
+
+
+@lru_cache(maxsize=None)
+def _font():
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.truetype(FONT_PATH, FONT_SIZE)
+    except OSError:
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=8)
+def _blank(width: int, height: int):
+    """Пустой холст нужного размера; наружу отдаются только копии"""
+    from PIL import Image
+
+    return Image.new("RGB", (width, height), BACKGROUND)
+
+
+def page_layout(count: int) -> tuple:
+    """Возвращает (cols, rows) для страницы из count плиток"""
+    if count <= 2:
+        return count, 1
+    if count <= 4:
+        return 2, 2
+    if count <= PAGE_TILES:
+        return GALLERY_COLS, GALLERY_ROWS
+    # Страница крупнее стандартной — почти квадратная сетка на все плитки
+    cols = max(GALLERY_COLS, math.ceil(math.sqrt(count)))
+    return cols, math.ceil(count / cols)
+
+
+def render_tile(frame: bytes, label: str, tile_size: int = TILE_SIZE) -> bytes:
+    """Уменьшает кадр до плитки с номером, возвращает сырые RGB-байты"""
+    from PIL import Image, ImageDraw
+
+    inner = tile_size - 2 * TILE_PADDING
+    tile = _blank(tile_size, tile_size).copy()
+
+    with Image.open(io.BytesIO(frame)) as img:
+        # Для JPEG декодер сразу масштабирует в 1/2…1/8 — полный 4K не нужен
+        img.draft("RGB", (inner, inner))
+        img.thumbnail((inner, inner), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        tile.paste(img, (TILE_PADDING, TILE_PADDING))
+
+    ImageDraw.Draw(tile).text(
+        (TILE_PADDING + 5, TILE_PADDING + 5),
+        label,
+        fill=(255, 255, 255),
+        font=_font(),
+    )
+    return tile.tobytes()
+
+
+def compose_page(*tiles: bytes, tile_size: int = TILE_SIZE, quality: int = 85) -> bytes:
+    """Собирает готовые плитки в одну JPEG-страницу"""
+    from PIL import Image
+
+    cols, rows = page_layout(len(tiles))
+    page = _blank(cols * tile_size, rows * tile_size).copy()
+
+    for idx, raw in enumerate(tiles):
+        tile = Image.frombytes("RGB", (tile_size, tile_size), raw)
+        page.paste(tile, ((idx % cols) * tile_size, (idx // cols) * tile_size))
+
+    buf = io.BytesIO()
+    page.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+# =============================================================================
+# АСИНХРОННЫЙ ИНТЕРФЕЙС
+# =============================================================================
+
+
+async def render_gallery_pages(
+    frames: List[bytes],
+    tile_size: int = TILE_SIZE,
+    per_page: int = PAGE_TILES,
+) -> List[bytes]:
+    """
+    Рендерит галерею из любого числа кадров.
+
+    Плитки готовятся параллельно в пуле процессов, затем каждая страница
+    (не более per_page плиток) собирается в отдельный JPEG.
+    """
+    from bot.services.image_pool import image_pool
+
+    if per_page < 1:
+        raise ValueError(f"per_page must be positive, got {per_page}")
+    if not frames:
+        return []
+
+    tiles = await asyncio.gather(
+        *[
+            image_pool.run(render_tile, frame, label=str(idx + 1), tile_size=tile_size)
+            for idx, frame in enumerate(frames)
+        ]
+    )
+
+    return await asyncio.gather(
+        *[
+            image_pool.run(
+                compose_page, *tiles[start : start + per_page], tile_size=tile_size
+            )
+            for start in range(0, len(tiles), per_page)
+        ]
+    )
@@ -1,10 +1,14 @@
+import asyncio
 import base64
-import io
 import logging
 from typing import Any, Dict, List, Optional, Union
 
 import aiohttp
-from PIL import Image
+
+from bot.services.chat_registry import ChatSessionRegistry
+from bot.services.concurrency import is_overload_status, signal_overload
+from bot.services.image_ops import prepare_gemini_image, sniff_mime
+from bot.services.image_pool import image_pool
 
 logger = logging.getLogger(__name__)
 
@@ -47,14 +51,28 @@ class GeminiService:
     ]
 
     def __init__(
-        self, api_key: str, nanobanana_key: str = "", openrouter_key: str = ""
+        self,
+        api_key: str,
+        nanobanana_key: str = "",
+        openrouter_key: str = "",
+        chat_max_sessions: int = 200,
+        chat_idle_ttl: float = 1800,
+        chat_max_memory_mb: int = 512,
+        chat_history_dir: str = "",
     ):
         self.api_key = api_key  # Legacy Gemini key
         self.nanobanana_key = nanobanana_key
         self.openrouter_key = openrouter_key
         self._client = None
         self._session = None
-        self._chats = {}  # Для многоходового редактирования
+        # Для многоходового редактирования (ограниченный реестр с TTL и LRU)
+        self._chats = ChatSessionRegistry(
+            max_sessions=chat_max_sessions,
+            idle_ttl=chat_idle_ttl,
+            max_total_bytes=chat_max_memory_mb * 1024 * 1024,
+            persist_dir=chat_history_dir or None,
+            restore=self._restore_chat,
+        )
 
     @property
     def client(self):
@@ -258,9 +276,15 @@ class GeminiService:
                     logger.error(
                         f"Nano Banana API error: {response.status} - {error_text}"
                     )
+                    if is_overload_status(response.status):
+                        signal_overload(f"nanobanana {response.status}")
 
             return None
 
+        except asyncio.TimeoutError:
+            logger.error("Nano Banana request timed out")
+            signal_overload("nanobanana timeout")
+            return None
         except Exception as e:
             logger.exception(f"Nano Banana generation failed: {e}")
             return None
@@ -361,11 +385,14 @@ class GeminiService:
             ) as response:
                 response_text = await response.text()
                 logger.info(
-                    f"OpenRouter raw response ({response.status}): {response_text[:2000]}"
+                    f"OpenRouter response {response.status}, "
+                    f"{len(response_text)} chars"
                 )
 
                 if response.status != 200:
                     logger.error(f"OpenRouter API error: {response.status}")
+                    if is_overload_status(response.status):
+                        signal_overload(f"openrouter {response.status}")
                     return None
 
                 try:
@@ -468,6 +495,10 @@ class GeminiService:
                 )
                 return None
 
+        except asyncio.TimeoutError:
+            logger.error("OpenRouter request timed out")
+            signal_overload("openrouter timeout")
+            return None
         except Exception as e:
             logger.exception(f"OpenRouter generation failed: {e}")
             return None
@@ -544,12 +575,10 @@ class GeminiService:
             # Добавляем референсные изображения
             if reference_images:
                 for ref_img in reference_images[:14]:
-                    img = Image.open(io.BytesIO(ref_img))
-                    contents.append(img)
+                    contents.append(await self._image_part(ref_img))
 
             if image_input:
-                img = Image.open(io.BytesIO(image_input))
-                contents.append(img)
+                contents.append(await self._image_part(image_input))
 
             # Формируем конфиг согласно banana_api.md
             config_params = types.GenerateContentConfig(
@@ -583,9 +612,26 @@ class GeminiService:
             logger.error(f"Missing dependency: {e}")
         except Exception as e:
             logger.exception(f"Native Gemini generation failed: {e}")
+            if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
+                signal_overload("gemini 429")
 
         return None
 
+    async def _image_part(self, data: bytes):
+        """
+        Готовит изображение для нативного API без декодирования на event loop.
+        JPEG/PNG/WebP узнаются по сигнатуре и уходят как есть, остальные
+        форматы перекодируются в PNG в пуле процессов.
+        """
+        from google.genai import types
+
+        mime_type = sniff_mime(data)
+        if mime_type is None:
+            mime_type, converted = await image_pool.run(prepare_gemini_image, data)
+            data = converted or data
+
+        return types.Part.from_bytes(data=data, mime_type=mime_type)
+
     # =========================================================================
     # МНОГОХОДОВОЕ РЕДАКТИРОВАНИЕ (согласно banana_api.md)
     # =========================================================================
@@ -613,7 +659,9 @@ class GeminiService:
                 config.tools = [{"google_search": {}}]
 
             chat = self.client.chats.create(model=model, config=config)
-            self._chats[chat_id] = chat
+            await self._chats.put(
+                chat_id, chat, model=model, enable_search=enable_search
+            )
             logger.info(f"Chat created: {chat_id}")
             return True
 
@@ -621,6 +669,18 @@ class GeminiService:
             logger.exception(f"Failed to create chat: {e}")
             return False
 
+    def _restore_chat(self, model: str, enable_search: bool, history: List[Dict]):
+        """Пересоздаёт чат из сохранённой на диске истории"""
+        from google.genai import types
+
+        config = types.GenerateContentConfig(response_modalities=["TEXT", "IMAGE"])
+
+        if enable_search:
+            config.tools = [{"google_search": {}}]
+
+        contents = [types.Content.model_validate(item) for item in history]
+        return self.client.chats.create(model=model, config=config, history=contents)
+
     async def send_message_to_chat(
         self,
         chat_id: str,
@@ -631,7 +691,8 @@ class GeminiService:
         Отправляет сообщение в чат для многоходового редактирования
         Согласно banana_api.md: позволяет итеративно улучшать изображение
         """
-        if chat_id not in self._chats:
+        chat = await self._chats.get(chat_id)
+        if chat is None:
             logger.error(f"Chat {chat_id} not found")
             return None
 
@@ -639,27 +700,36 @@ class GeminiService:
             contents = [message]
 
             if image_input:
-                img = Image.open(io.BytesIO(image_input))
-                contents.append(img)
+                contents.append(await self._image_part(image_input))
 
-            response = await self._chats[chat_id].send_message_async(contents)
+            response = await chat.send_message_async(contents)
+
+            turn_bytes = len(message.encode("utf-8")) + len(image_input or b"")
 
             for part in response.parts:
                 if part.inline_data:
+                    turn_bytes += len(part.inline_data.data)
+                    self._chats.account(chat_id, turn_bytes)
                     return part.inline_data.data
 
+            self._chats.account(chat_id, turn_bytes)
             return None
 
         except Exception as e:
             logger.exception(f"Chat message failed: {e}")
             return None
 
+    async def sweep_chats(self) -> int:
+        """Вытесняет простаивающие сессии чатов (вызывается периодически)"""
+        return await self._chats.sweep()
+
+    async def flush_chats(self) -> int:
+        """Сохраняет историю активных чатов на диск (при остановке бота)"""
+        return await self._chats.flush()
+
     async def close_chat(self, chat_id: str) -> bool:
-        """Закрывает чат"""
-        if chat_id in self._chats:
-            del self._chats[chat_id]
-            return True
-        return False
+        """Закрывает чат и удаляет сохранённую историю"""
+        return await self._chats.remove(chat_id)
 
     # =========================================================================
     # РЕДАКТИРОВАНИЕ ИЗОБРАЖЕНИЙ (согласно banana_api.md)
@@ -1001,4 +1071,8 @@ gemini_service = GeminiService(
     api_key=config.GEMINI_API_KEY,
     nanobanana_key=config.NANOBANANA_API_KEY,
     openrouter_key=config.OPENROUTER_API_KEY,
+    chat_max_sessions=config.CHAT_MAX_SESSIONS,
+    chat_idle_ttl=config.CHAT_IDLE_TTL,
+    chat_max_memory_mb=config.CHAT_MAX_MEMORY_MB,
+    chat_history_dir=config.CHAT_HISTORY_DIR,
 )
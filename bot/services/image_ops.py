@@ -0,0 +1,52 @@
+"""
+Операции над изображениями (PIL).
+
+Функции этого модуля выполняются в процессах ImageProcessPool, поэтому
+они должны быть чистыми: принимают байты кадров, возвращают байты или
+простые значения и не зависят от глобального состояния бота.
+"""
+
+import io
+from typing import Optional, Tuple
+
+# Форматы, которые Gemini принимает без перекодирования
+GEMINI_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+}
+
+
+def sniff_mime(data: bytes) -> Optional[str]:
+    """Определяет MIME-тип по сигнатуре файла без декодирования"""
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def prepare_gemini_image(data: bytes) -> Tuple[str, Optional[bytes]]:
+    """
+    Проверяет изображение и приводит его к формату, который принимает Gemini.
+
+    Возвращает (mime_type, converted). converted равен None, если исходные
+    байты можно отправить как есть — так результат не гоняется обратно
+    между процессами.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        mime_type = GEMINI_MIME_TYPES.get(img.format)
+        if mime_type:
+            return mime_type, None
+
+        img.load()
+        if img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA")
+
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        return "image/png", buf.getvalue()
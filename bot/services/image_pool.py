@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# КОД, ВЫПОЛНЯЕМЫЙ В РАБОЧИХ ПРОЦЕССАХ
+# =============================================================================
+
+
+def _init_worker():
+    """Прогревает процесс: импортирует PIL и регистрирует все кодеки"""
+    from PIL import Image, ImageDraw, ImageFont  # noqa: F401
+
+    Image.init()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _read_frame(spec: Tuple) -> bytes:
+    kind, payload, size = spec
+    if kind == "raw":
+        return payload
+
+    shm = shared_memory.SharedMemory(name=payload)
+    try:
+        return bytes(shm.buf[:size])
+    finally:
+        shm.close()
+
+
+def _call(func: Callable, specs: List[Tuple], kwargs: dict, shm_threshold: int):
+    frames = [_read_frame(spec) for spec in specs]
+    result = func(*frames, **kwargs)
+
+    # Большой результат возвращаем через разделяемую память, а не pickle
+    if isinstance(result, bytes) and len(result) >= shm_threshold:
+        shm = shared_memory.SharedMemory(create=True, size=len(result))
+        try:
+            shm.buf[: len(result)] = result
+        finally:
+            shm.close()
+        return ("shm", shm.name, len(result))
+
+    return ("raw", result, 0)
+
+
+# =============================================================================
+# ПУЛ
+# =============================================================================
+
+
+class ImageProcessPool:
+    """
+    Общий пул процессов для всех операций PIL.
+
+    Декодирование и ресайз изображений держат GIL, поэтому выносятся
+    в отдельные процессы. Рабочие процессы прогреваются при старте бота,
+    а кадры крупнее shm_threshold передаются через разделяемую память —
+    4K-изображения не сериализуются через pickle.
+    """
+
+    def __init__(
+        self, max_workers: Optional[int] = None, shm_threshold: int = 256 * 1024
+    ):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.shm_threshold = shm_threshold
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Трекер запускается до форка, чтобы процессы пула делили его
+            # с основным: блок, созданный в одном процессе, удаляется в другом
+            resource_tracker.ensure_running()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_worker
+            )
+        return self._executor
+
+    async def warm_up(self):
+        """Запускает все рабочие процессы заранее, до первого запроса"""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        pids = await asyncio.gather(
+            *[loop.run_in_executor(executor, _ping) for _ in range(self.max_workers)]
+        )
+        logger.info(f"Image pool ready: {len(set(pids))} workers")
+
+    async def run(self, func: Callable, *frames: bytes, **kwargs) -> Any:
+        """
+        Выполняет func(*frames, **kwargs) в рабочем процессе.
+
+        func должна быть функцией уровня модуля (см. bot.services.image_ops).
+        """
+        blocks: List[shared_memory.SharedMemory] = []
+        specs = []
+        try:
+            for frame in frames:
+                if len(frame) < self.shm_threshold:
+                    specs.append(("raw", frame, len(frame)))
+                    continue
+
+                shm = shared_memory.SharedMemory(create=True, size=len(frame))
+                shm.buf[: len(frame)] = frame
+                blocks.append(shm)
+                specs.append(("shm", shm.name, len(frame)))
+
+            loop = asyncio.get_running_loop()
+            kind, payload, size = await loop.run_in_executor(
+                self._get_executor(),
+                _call,
+                func,
+                specs,
+                kwargs,
+                self.shm_threshold,
+            )
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+        if kind == "raw":
+            return payload
+
+        shm = shared_memory.SharedMemory(name=payload)
+        try:
+            return bytes(shm.buf[:size])
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+# Глобальный пул обработки изображений
+from bot.config import config
+
+image_pool = ImageProcessPool(max_workers=config.IMAGE_POOL_WORKERS)
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, Tuple, Union
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
+
+from bot.database import delete_media_file, get_media_file_id, save_media_file
+from bot.services.blob_store import BlobStore
+from bot.services.delivery import DeliveryMethod, DeliveryPlanner
+
+logger = logging.getLogger(__name__)
+
+# Что можно отправить: байты, публичный URL или корутина, которая их вернёт
+MediaSource = Union[bytes, str, Callable[[], Awaitable[Union[bytes, str, None]]]]
+
+
+class MediaRegistry:
+    """
+    Реестр file_id файлов, уже отправленных в Telegram.
+
+    После первой отправки Telegram возвращает file_id; повторная отправка
+    по нему мгновенна и не гоняет файл ни к нам, ни в Telegram. Файл
+    регистрируется под своим URL и SHA-256 содержимого, так что скачивание
+    по ссылке, пакетные результаты и повтор той же генерации (из кэша
+    результатов) находят его по любому из ключей. file_id зависит от типа
+    отправки (photo/document/video), поэтому хранится отдельно для каждого.
+    """
+
+    def __init__(self, planner: DeliveryPlanner, max_cached: int = 10000):
+        self.planner = planner
+        self.max_cached = max_cached
+        # (ключ, тип) -> file_id, горячая часть таблицы media_files
+        self._cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._hits = 0
+        self._by_url = 0
+        self._uploads = 0
+
+    @staticmethod
+    async def keys_for(
+        url: Optional[str] = None,
+        digest: Optional[str] = None,
+        data: Optional[bytes] = None,
+    ) -> List[str]:
+        """Ключи файла: URL и хеш содержимого (считается вне event loop)"""
+        keys = []
+        if url:
+            keys.append(f"url:{url}")
+        if digest is None and data:
+            digest = await asyncio.to_thread(BlobStore.hash_bytes, data)
+        if digest:
+            keys.append(f"blob:{digest}")
+        return keys
+
+    async def lookup(self, keys: List[str], kind: str) -> Optional[str]:
+        for key in keys:
+            file_id = self._cache.get((key, kind))
+            if file_id:
+                self._cache.move_to_end((key, kind))
+                return file_id
+
+        file_id = await get_media_file_id(keys, kind)
+        if file_id:
+            self._remember_local(keys, kind, file_id)
+        return file_id
+
+    async def remember(
+        self, keys: List[str], kind: str, message: types.Message
+    ) -> Optional[str]:
+        """Сохраняет file_id из отправленного сообщения"""
+        media = self._media_of(message, kind)
+        if not media or not keys:
+            return None
+        self._remember_local(keys, kind, media.file_id)
+        await save_media_file(keys, kind, media.file_id, media.file_unique_id)
+        return media.file_id
+
+    async def forget(self, file_id: str):
+        for cache_key in [k for k, v in self._cache.items() if v == file_id]:
+            del self._cache[cache_key]
+        await delete_media_file(file_id)
+
+    async def send(
+        self,
+        send: Callable[..., Awaitable[types.Message]],
+        kind: str,
+        source: MediaSource,
+        filename: str = "file",
+        url: Optional[str] = None,
+        digest: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Optional[types.Message]:
+        """
+        Отправляет файл по file_id, по URL или загрузкой байтов.
+
+        send — метод отправки (message.answer_photo, bot.send_video и т.п.),
+        kind — имя его аргумента с файлом, остальные аргументы (chat_id,
+        caption...) передаются как есть. Если есть и байты, и публичный URL,
+        способ выбирает DeliveryPlanner; если Telegram не смог скачать URL,
+        файл загружается. Чужие ссылки (не static_base_url планировщика)
+        в его статистику не попадают. Если source нечего отправить,
+        возвращает None.
+        """
+        url_only = isinstance(source, str)
+        if url_only and url is None:
+            url = source
+        data = source if isinstance(source, bytes) else None
+        keys = await self.keys_for(url, digest, data)
+        own_url = bool(url) and self.planner.serves(url)
+        # Чужую ссылку без байтов выбирать не из чего: file_id или она сама
+        planned = own_url or not url_only
+
+        file_id = await self.lookup(keys, kind)
+        size = len(data) if data is not None else None
+        if planned:
+            method = self.planner.choose(kind, size, bool(file_id), bool(url))
+        else:
+            method = DeliveryMethod.FILE_ID if file_id else DeliveryMethod.URL
+        if method == DeliveryMethod.FILE_ID:
+            try:
+                message = await send(**{kind: file_id}, **kwargs)
+                self._hits += 1
+                return message
+            except TelegramBadRequest as e:
+                logger.warning(f"Stale file_id for {keys[0]}: {e}")
+                await self.forget(file_id)
+                if planned:
+                    method = self.planner.choose(kind, size, has_url=bool(url))
+        if url_only or method == DeliveryMethod.URL:
+            started = time.monotonic()
+            try:
+                message = await send(**{kind: url}, **kwargs)
+            except TelegramBadRequest as e:
+                if url_only:
+                    raise  # Других источников нет — решает вызывающий
+                if own_url:
+                    self.planner.url_failed(str(e))
+            else:
+                if own_url:
+                    self.planner.record_url(time.monotonic() - started)
+                self._by_url += 1
+                await self.remember(keys, kind, message)
+                return message
+
+        if callable(source):
+            source = await source()
+        if not source:
+            return None
+        if isinstance(source, bytes):
+            media = types.BufferedInputFile(source, filename=filename)
+            if digest is None and data is None:
+                keys += await self.keys_for(data=source)
+        else:
+            media = source
+
+        started = time.monotonic()
+        message = await send(**{kind: media}, **kwargs)
+        if isinstance(source, bytes):
+            self.planner.record_upload(len(source), time.monotonic() - started)
+        self._uploads += 1
+        await self.remember(keys, kind, message)
+        return message
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._cache),
+            "hits": self._hits,
+            "by_url": self._by_url,
+            "uploads": self._uploads,
+        }
+
+    @staticmethod
+    def _media_of(message: types.Message, kind: str):
+        if kind == "photo":
+            # Самый большой из размеров, которые сделал Telegram
+            return message.photo[-1] if message.photo else None
+        return getattr(message, kind, None)
+
+    def _remember_local(self, keys: List[str], kind: str, file_id: str):
+        for key in keys:
+            self._cache[(key, kind)] = file_id
+            self._cache.move_to_end((key, kind))
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+
+# Глобальный реестр отправленных файлов
+from bot.services.delivery import delivery_planner
+
+media_registry = MediaRegistry(delivery_planner)
@@ -0,0 +1,241 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+logger = logging.getLogger(__name__)
+
+ChatId = Union[int, str]
+
+
+class Priority(IntEnum):
+    """Чем меньше значение, тем раньше запрос получает общий лимит"""
+
+    RESULT = 0  # Результаты генераций
+    NORMAL = 1  # Обычные ответы и правки
+    BULK = 2  # Рассылки
+
+
+_priority: ContextVar[Priority] = ContextVar(
+    "outbound_priority", default=Priority.NORMAL
+)
+
+
+@contextmanager
+def send_priority(priority: Priority):
+    """Приоритет исходящих запросов, сделанных внутри блока"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # Токенов в секунду
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько ждать до появления токена"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class OutboundScheduler:
+    """
+    Лимиты исходящих запросов к Telegram.
+
+    Каждый запрос к чату сначала ждёт токен своего чата (личные чаты —
+    chat_rate в секунду, группы и каналы — group_per_minute в минуту),
+    затем — общий токен. Общие токены выдаются по приоритету: результаты
+    генераций раньше обычных ответов, рассылки — в последнюю очередь.
+    RetryAfter блокирует чат (или всех, если лимит общий) на указанное время.
+    """
+
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        group_per_minute: float = 20.0,
+        chat_burst: float = 3.0,
+    ):
+        self.chat_rate = chat_rate
+        self.group_rate = group_per_minute / 60.0
+        self.chat_burst = chat_burst
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: "OrderedDict[ChatId, TokenBucket]" = OrderedDict()
+        self._blocked: Dict[ChatId, float] = {}
+        self._global_blocked_until = 0.0
+
+        # Очередь за общим токеном: [priority, seq, future]
+        self._queue: List[list] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self._sent = 0
+        self._retries = 0
+
+    @staticmethod
+    def is_group(chat_id: ChatId) -> bool:
+        # У групп и каналов отрицательный id, у каналов бывает @username
+        return isinstance(chat_id, str) or chat_id < 0
+
+    async def acquire(self, chat_id: ChatId, priority: Priority = Priority.NORMAL):
+        """Ждёт, пока запрос к чату можно отправить"""
+        await self._acquire_chat(chat_id)
+        await self._acquire_global(priority)
+        self._sent += 1
+
+    def block(self, chat_id: Optional[ChatId], seconds: float):
+        """Telegram попросил подождать (RetryAfter)"""
+        self._retries += 1
+        until = time.monotonic() + seconds
+        if chat_id is None:
+            self._global_blocked_until = max(self._global_blocked_until, until)
+        else:
+            self._blocked[chat_id] = max(self._blocked.get(chat_id, 0.0), until)
+
+    def stats(self) -> Dict[str, Any]:
+        depth = {p.name.lower(): 0 for p in Priority}
+        for priority, _, future in self._queue:
+            if not future.done():
+                depth[Priority(priority).name.lower()] += 1
+        return {
+            "queued": sum(depth.values()),
+            "by_priority": depth,
+            "blocked_chats": sum(
+                1 for until in self._blocked.values() if until > time.monotonic()
+            ),
+            "sent": self._sent,
+            "retries": self._retries,
+        }
+
+    # =========================================================================
+    # ЛИМИТ ЧАТА
+    # =========================================================================
+
+    def _chat_bucket(self, chat_id: ChatId) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            rate = self.group_rate if self.is_group(chat_id) else self.chat_rate
+            bucket = TokenBucket(rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+            # Вытесненный чат просто начнёт с полным ведром
+            while len(self._chats) > self.MAX_CHAT_BUCKETS:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def _acquire_chat(self, chat_id: ChatId):
+        while True:
+            now = time.monotonic()
+            bucket = self._chat_bucket(chat_id)
+            blocked = self._blocked.get(chat_id, 0.0) - now
+            wait = max(bucket.delay(now), blocked)
+            if wait <= 0:
+                self._blocked.pop(chat_id, None)
+                bucket.take(now)
+                return
+            await asyncio.sleep(wait)
+
+    # =========================================================================
+    # ОБЩИЙ ЛИМИТ С ПРИОРИТЕТАМИ
+    # =========================================================================
+
+    async def _acquire_global(self, priority: Priority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, [int(priority), next(self._seq), future])
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        while self._queue:
+            future = self._queue[0][2]
+            if future.done():
+                # Ожидающий отменён — пропускаем
+                heapq.heappop(self._queue)
+                continue
+
+            now = time.monotonic()
+            wait = max(self._global.delay(now), self._global_blocked_until - now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            heapq.heappop(self._queue)
+            self._global.take(now)
+            future.set_result(None)
+
+
+class OutboundMiddleware(BaseRequestMiddleware):
+    """Пропускает запросы к чатам через OutboundScheduler и повторяет при 429"""
+
+    def __init__(self, scheduler: OutboundScheduler, max_retries: int = 3):
+        self.scheduler = scheduler
+        self.max_retries = max_retries
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # getUpdates, answerCallbackQuery и т.п. лимитам чатов не подчиняются
+            return await make_request(bot, method)
+
+        priority = _priority.get()
+        for attempt in range(self.max_retries + 1):
+            await self.scheduler.acquire(chat_id, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                logger.warning(
+                    f"Telegram flood control for {chat_id}: retry in {e.retry_after}s"
+                )
+                self.scheduler.block(chat_id, e.retry_after)
+                if attempt == self.max_retries:
+                    raise
+
+
+# Глобальный планировщик исходящих запросов
+from bot.config import config
+
+outbound_scheduler = OutboundScheduler(
+    global_rate=config.TELEGRAM_GLOBAL_RATE,
+    chat_rate=config.TELEGRAM_CHAT_RATE,
+    group_per_minute=config.TELEGRAM_GROUP_PER_MINUTE,
+)
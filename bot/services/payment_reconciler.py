@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from bot.database import (
+    complete_transaction,
+    get_pending_transactions,
+    reject_transaction,
+)
+from bot.services.tbank_service import TBankService
+
+logger = logging.getLogger(__name__)
+
+# Статусы Т-Банка, после которых платёж уже не будет оплачен
+REJECTED_STATUSES = {"REJECTED", "CANCELED", "DEADLINE_EXPIRED", "AUTH_FAIL"}
+
+
+class PaymentReconciler:
+    """
+    Сверка зависших платежей с Т-Банком.
+
+    Если вебхук потерялся, транзакция остаётся 'pending'. Сверка раз в
+    interval секунд берёт ожидающие платежи старше min_age (вебхуку даём
+    время прийти), но моложе max_age, и опрашивает GetState параллельно,
+    не больше concurrency запросов одновременно и не больше batch_size за
+    проход. Каждый платёж проверяется с экспоненциальной паузой, так что
+    число запросов к банку ограничено даже при сотнях зависших платежей.
+    """
+
+    def __init__(
+        self,
+        tbank: TBankService,
+        interval: float = 60,
+        min_age: int = 120,
+        max_age: int = 24 * 3600,
+        batch_size: int = 20,
+        concurrency: int = 5,
+        max_backoff: float = 3600,
+    ):
+        self.tbank = tbank
+        self.interval = interval
+        self.min_age = min_age
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_backoff = max_backoff
+
+        # order_id -> (число проверок, когда проверять снова)
+        self._schedule: Dict[str, tuple] = {}
+        self._requests = 0
+
+    async def run(self, on_confirmed: Optional[Callable] = None):
+        """Фоновый цикл сверки"""
+        while True:
+            try:
+                await self.reconcile_once(on_confirmed)
+            except Exception as e:
+                logger.exception(f"Payment reconciliation failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def reconcile_once(self, on_confirmed: Optional[Callable] = None) -> int:
+        """Один проход сверки; возвращает число подтверждённых платежей"""
+        pending = await get_pending_transactions(self.min_age, self.max_age)
+
+        # Забываем платежи, которые уже закрыты вебхуком или вышли из окна
+        alive = {t.order_id for t in pending}
+        for order_id in list(self._schedule):
+            if order_id not in alive:
+                del self._schedule[order_id]
+
+        now = time.monotonic()
+        due = [
+            t for t in pending if self._schedule.get(t.order_id, (0, 0.0))[1] <= now
+        ][: self.batch_size]
+        if not due:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(transaction) -> bool:
+            async with semaphore:
+                return await self._check(transaction, on_confirmed)
+
+        results = await asyncio.gather(*[check(t) for t in due])
+        confirmed = sum(results)
+        logger.info(
+            f"Payment reconciliation: checked {len(due)}, confirmed {confirmed}"
+        )
+        return confirmed
+
+    def stats(self) -> Dict[str, int]:
+        return {"tracked": len(self._schedule), "requests": self._requests}
+
+    async def _check(self, transaction, on_confirmed: Optional[Callable]) -> bool:
+        self._requests += 1
+        result = await self.tbank.get_state(transaction.payment_id)
+        status = (result or {}).get("Status")
+
+        if status == "CONFIRMED":
+            self._schedule.pop(transaction.order_id, None)
+            telegram_id = await complete_transaction(transaction.order_id)
+            # None — платёж параллельно закрыл вебхук или ручная проверка
+            if telegram_id and on_confirmed:
+                try:
+                    await on_confirmed(telegram_id, transaction)
+                except Exception as e:
+                    logger.warning(f"Failed to notify {telegram_id}: {e}")
+            return telegram_id is not None
+
+        if status in REJECTED_STATUSES:
+            self._schedule.pop(transaction.order_id, None)
+            await reject_transaction(transaction.order_id)
+            logger.info(f"Payment {transaction.order_id} rejected by bank: {status}")
+            return False
+
+        # Ещё не оплачен или банк не ответил — следующая проверка позже
+        attempts = self._schedule.get(transaction.order_id, (0, 0.0))[0] + 1
+        delay = min(self.max_backoff, self.interval * 2 ** (attempts - 1))
+        self._schedule[transaction.order_id] = (attempts, time.monotonic() + delay)
+        return False
+
+
+# Глобальная сверка платежей
+from bot.config import config
+from bot.services.tbank_service import tbank_service
+
+payment_reconciler = PaymentReconciler(
+    tbank_service, interval=config.PAYMENT_RECONCILE_INTERVAL
+)
@@ -1,11 +1,21 @@
+import asyncio
 import json
+import logging
 import os
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Mapping, Optional, Tuple
 
+from bot.services.prompt_template import PromptTemplate
 
-@dataclass
+logger = logging.getLogger(__name__)
+
+# Отпечаток файла для слежения за изменениями: (mtime_ns, size) или None
+FileStamp = Optional[Tuple[int, int]]
+
+
+@dataclass(frozen=True)
 class Preset:
     id: str
     name: str
@@ -15,18 +25,140 @@ class Preset:
     requires_input: bool
     requires_upload: bool = False
     input_prompt: Optional[str] = None
-    placeholders: List[str] = field(default_factory=list)
+    placeholders: Tuple[str, ...] = ()
     aspect_ratio: Optional[str] = None
     duration: Optional[int] = None
     category: str = ""
+    cacheable: bool = False  # Разрешено отдавать результат из кэша
+    # Промпт, разобранный при загрузке
+    template: Optional[PromptTemplate] = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        if self.template is None:
+            object.__setattr__(self, "template", PromptTemplate(self.prompt))
 
     def format_prompt(self, **kwargs) -> str:
-        """Заполняет плейсхолдеры в промпте"""
-        try:
-            return self.prompt.format(**kwargs)
-        except KeyError as e:
-            # Если не все плейсхолдеры заполнены, возвращаем базовый промпт
-            return self.prompt
+        """
+        Заполняет плейсхолдеры в промпте.
+
+        Если значения каких-то плейсхолдеров не переданы — PromptTemplateError.
+        """
+        return self.template.render(kwargs)
+
+
+@dataclass(frozen=True)
+class PresetIndex:
+    """
+    Неизменяемый снимок конфигурации с готовыми индексами.
+
+    Собирается целиком при загрузке и публикуется одним присваиванием,
+    поэтому читатели во время reload() видят либо старый, либо новый
+    снимок, но не смесь.
+    """
+
+    raw_categories: Dict[str, Dict] = field(default_factory=dict)
+    price_config: Dict = field(default_factory=dict)
+    presets: Mapping[str, Preset] = field(default_factory=dict)
+    category_presets: Mapping[str, Tuple[Preset, ...]] = field(default_factory=dict)
+    categories: Mapping[str, Mapping[str, str]] = field(default_factory=dict)
+    packages: Tuple[Dict, ...] = ()
+    packages_by_id: Mapping[str, Dict] = field(default_factory=dict)
+    admin_ids: FrozenSet[int] = frozenset()
+    default_values: Mapping[str, Tuple[str, ...]] = field(default_factory=dict)
+    batch_modes: Mapping[str, Dict] = field(default_factory=dict)
+
+
+def validate_config(presets_data: Dict, price_config: Dict):
+    """Проверяет конфигурацию до публикации; ошибки — ValueError с описанием"""
+    categories = presets_data.get("categories")
+    if not isinstance(categories, dict):
+        raise ValueError("presets.json: categories must be an object")
+
+    seen = set()
+    for cat_key, cat_data in categories.items():
+        if "name" not in cat_data:
+            raise ValueError(f"Category {cat_key}: missing name")
+        for preset_data in cat_data.get("presets", []):
+            preset_id = preset_data.get("id", "?")
+            missing = [
+                key
+                for key in ("id", "name", "prompt", "cost")
+                if key not in preset_data
+            ]
+            if missing:
+                raise ValueError(f"Preset {preset_id}: missing {', '.join(missing)}")
+            cost = preset_data["cost"]
+            if not isinstance(cost, int) or cost < 0:
+                raise ValueError(f"Preset {preset_id}: invalid cost {cost!r}")
+            if preset_id in seen:
+                raise ValueError(f"Preset {preset_id}: duplicate id")
+            seen.add(preset_id)
+
+    package_ids = [pkg.get("id") for pkg in price_config.get("packages", [])]
+    if None in package_ids or len(set(package_ids)) != len(package_ids):
+        raise ValueError("price.json: every package needs a unique id")
+
+
+def build_index(presets_data: Dict, price_config: Dict) -> PresetIndex:
+    """Строит индексы по разобранным presets.json и price.json"""
+    raw_categories = presets_data.get("categories", {})
+    presets: Dict[str, Preset] = {}
+    category_presets: Dict[str, Tuple[Preset, ...]] = {}
+    categories: Dict[str, Mapping[str, str]] = {}
+
+    for cat_key, cat_data in raw_categories.items():
+        for preset_data in cat_data.get("presets", []):
+            preset = Preset(
+                id=preset_data["id"],
+                name=preset_data["name"],
+                prompt=preset_data["prompt"],
+                cost=preset_data["cost"],
+                model=preset_data.get("model", "gemini-2.5-flash-image"),
+                requires_input=preset_data.get("requires_input", False),
+                requires_upload=preset_data.get("requires_upload", False),
+                input_prompt=preset_data.get("input_prompt"),
+                placeholders=tuple(preset_data.get("placeholders", [])),
+                aspect_ratio=preset_data.get("aspect_ratio"),
+                duration=preset_data.get("duration"),
+                category=cat_key,
+                cacheable=preset_data.get("cacheable", False),
+            )
+            undeclared = set(preset.template.placeholders) - set(preset.placeholders)
+            if undeclared:
+                raise ValueError(
+                    f"Preset {preset.id}: undeclared placeholders "
+                    f"{', '.join(sorted(undeclared))}"
+                )
+            presets[preset.id] = preset
+        categories[cat_key] = MappingProxyType(
+            {
+                "name": cat_data["name"],
+                "description": cat_data.get("description", ""),
+            }
+        )
+
+    for cat_key, cat_data in raw_categories.items():
+        ids = [p["id"] for p in cat_data.get("presets", [])]
+        category_presets[cat_key] = tuple(presets[pid] for pid in ids)
+
+    packages = tuple(price_config.get("packages", []))
+    default_values = presets_data.get("default_values", {})
+    batch_modes = presets_data.get("batch_edit_modes", {})
+
+    return PresetIndex(
+        raw_categories=raw_categories,
+        price_config=price_config,
+        presets=MappingProxyType(presets),
+        category_presets=MappingProxyType(category_presets),
+        categories=MappingProxyType(categories),
+        packages=packages,
+        packages_by_id=MappingProxyType({pkg["id"]: pkg for pkg in packages}),
+        admin_ids=frozenset(int(i) for i in price_config.get("admin_ids", [])),
+        default_values=MappingProxyType(
+            {key: tuple(values) for key, values in default_values.items()}
+        ),
+        batch_modes=MappingProxyType(batch_modes),
+    )
 
 
 class PresetManager:
@@ -37,58 +169,63 @@ class PresetManager:
     ):
         self.presets_path = Path(presets_path)
         self.price_path = Path(price_path)
-        self._presets: Dict[str, Preset] = {}
-        self._categories: Dict[str, Dict] = {}
-        self._price_config: Dict = {}
-        self._admin_ids: List[int] = []
-        self._default_values: Dict[str, List[str]] = {}
+        self._index = PresetIndex()
+        # Растёт, когда содержимое конфигурации меняется (сброс кэшей клавиатур)
+        self.version = 0
+        self._reload_lock = asyncio.Lock()
+        self._loaded_stamps: Tuple[FileStamp, ...] = ()
+        self._failed_stamps: Tuple[FileStamp, ...] = ()
+        self._pending_stamps: Tuple[FileStamp, ...] = ()
         self.load_all()
 
     def load_all(self):
-        """Загружает все конфигурации"""
-        self._load_presets()
-        self._load_price()
+        """Загружает все конфигурации и атомарно публикует новый снимок"""
+        self._publish(*self._read_snapshot())
 
-    def _load_presets(self):
-        """Загружает пресеты из JSON"""
+    def _read_snapshot(self) -> Tuple[Tuple[FileStamp, ...], PresetIndex]:
+        """Читает, проверяет и индексирует файлы (можно вызывать из потока)"""
+        # Отпечатки снимаются до чтения: правка во время чтения вызовет ещё одну
+        stamps = self._stamps()
+        presets_data = self._load_presets()
+        price_config = self._load_price()
+        validate_config(presets_data, price_config)
+        return stamps, build_index(presets_data, price_config)
+
+    def _publish(self, stamps: Tuple[FileStamp, ...], index: PresetIndex):
+        before = self._index
+        self._index = index
+        self._loaded_stamps = stamps
+        if (index.raw_categories, index.price_config) != (
+            before.raw_categories,
+            before.price_config,
+        ):
+            self.version += 1
+
+    def _load_presets(self) -> Dict:
+        """Читает пресеты из JSON"""
         if not self.presets_path.exists():
             raise FileNotFoundError(f"Presets file not found: {self.presets_path}")
 
         with open(self.presets_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        self._categories = data.get("categories", {})
-        self._presets = {}
-
-        for cat_key, cat_data in self._categories.items():
-            for preset_data in cat_data.get("presets", []):
-                preset = Preset(
-                    id=preset_data["id"],
-                    name=preset_data["name"],
-                    prompt=preset_data["prompt"],
-                    cost=preset_data["cost"],
-                    model=preset_data.get("model", "gemini-2.5-flash-image"),
-                    requires_input=preset_data.get("requires_input", False),
-                    requires_upload=preset_data.get("requires_upload", False),
-                    input_prompt=preset_data.get("input_prompt"),
-                    placeholders=preset_data.get("placeholders", []),
-                    aspect_ratio=preset_data.get("aspect_ratio"),
-                    duration=preset_data.get("duration"),
-                    category=cat_key,
-                )
-                self._presets[preset.id] = preset
+            return json.load(f)
 
-        # Загружаем значения по умолчанию
-        self._default_values = data.get("default_values", {})
-
-    def _load_price(self):
-        """Загружает прайс-лист"""
+    def _load_price(self) -> Dict:
+        """Читает прайс-лист"""
         if not self.price_path.exists():
             raise FileNotFoundError(f"Price file not found: {self.price_path}")
 
         with open(self.price_path, "r", encoding="utf-8") as f:
-            self._price_config = json.load(f)
-        self._admin_ids = self._price_config.get("admin_ids", [])
+            return json.load(f)
+
+    def _stamps(self) -> Tuple[FileStamp, ...]:
+        stamps = []
+        for path in (self.presets_path, self.price_path):
+            try:
+                stat = path.stat()
+                stamps.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
 
     def reload(self) -> bool:
         """Перезагружает конфигурацию без перезапуска бота"""
@@ -96,48 +233,104 @@ class PresetManager:
             self.load_all()
             return True
         except Exception as e:
-            print(f"Error reloading presets: {e}")
+            logger.error(f"Error reloading presets: {e}")
+            return False
+
+    async def reload_async(self) -> bool:
+        """
+        Перезагрузка без блокировки event loop.
+
+        Файлы читаются, проверяются и индексируются в потоке; новый снимок
+        публикуется одним присваиванием. При ошибке остаётся прежний.
+        """
+        async with self._reload_lock:
+            try:
+                stamps, index = await asyncio.to_thread(self._read_snapshot)
+            except Exception as e:
+                logger.error(f"Error reloading presets: {e}")
+                return False
+            self._publish(stamps, index)
+            return True
+
+    async def check_for_changes(self) -> bool:
+        """
+        Одна проверка файлов; True, если конфигурация перезагружена.
+
+        Изменённый файл перезагружается, когда его отпечаток не меняется
+        между двумя проверками, — чтобы не читать файл, который ещё
+        дописывается. Ошибочная версия не перечитывается, пока файл
+        снова не изменится.
+        """
+        stamps = await asyncio.to_thread(self._stamps)
+        if stamps in (self._loaded_stamps, self._failed_stamps):
+            self._pending_stamps = ()
+            return False
+        if stamps != self._pending_stamps:
+            self._pending_stamps = stamps
             return False
 
+        self._pending_stamps = ()
+        if not await self.reload_async():
+            self._failed_stamps = stamps
+            return False
+        logger.info(
+            f"Presets reloaded from disk: {len(self._index.presets)} presets, "
+            f"version {self.version}"
+        )
+        return True
+
+    async def watch(self, interval: float = 2.0):
+        """Фоновое слежение за presets.json и price.json (опрос mtime)"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.check_for_changes()
+            except Exception as e:
+                logger.exception(f"Preset watcher failed: {e}")
+
+    @property
+    def _presets(self) -> Mapping[str, Preset]:
+        return self._index.presets
+
+    @property
+    def _categories(self) -> Dict[str, Dict]:
+        return self._index.raw_categories
+
     def get_preset(self, preset_id: str) -> Optional[Preset]:
         """Возвращает пресет по ID"""
-        return self._presets.get(preset_id)
+        return self._index.presets.get(preset_id)
 
-    def get_category_presets(self, category: str) -> List[Preset]:
+    def get_category_presets(self, category: str) -> Tuple[Preset, ...]:
         """Возвращает пресеты категории"""
-        cat_data = self._categories.get(category, {})
-        preset_ids = [p["id"] for p in cat_data.get("presets", [])]
-        return [self._presets[pid] for pid in preset_ids if pid in self._presets]
-
-    def get_categories(self) -> Dict[str, Dict]:
-        """Возвращает все категории с метаданными"""
-        return {
-            key: {"name": data["name"], "description": data.get("description", "")}
-            for key, data in self._categories.items()
-        }
-
-    def get_packages(self) -> List[Dict]:
+        return self._index.category_presets.get(category, ())
+
+    def get_categories(self) -> Mapping[str, Mapping[str, str]]:
+        """Возвращает все категории с метаданными (только для чтения)"""
+        return self._index.categories
+
+    def get_packages(self) -> Tuple[Dict, ...]:
         """Возвращает пакеты кредитов"""
-        return self._price_config.get("packages", [])
+        return self._index.packages
 
     def get_package(self, package_id: str) -> Optional[Dict]:
         """Возвращает пакет по ID"""
-        for pkg in self.get_packages():
-            if pkg["id"] == package_id:
-                return pkg
-        return None
+        return self._index.packages_by_id.get(package_id)
 
-    def is_admin(self, user_id: int) -> bool:
-        """Проверяет, является ли пользователь администратором"""
-        return user_id in self._admin_ids
+    def get_admin_ids(self) -> FrozenSet[int]:
+        """Админы из price.json (проверка прав — через admin_registry)"""
+        return self._index.admin_ids
 
-    def get_default_values(self, key: str) -> List[str]:
+    def get_default_values(self, key: str) -> Tuple[str, ...]:
         """Возвращает значения по умолчанию для плейсхолдеров"""
-        return self._default_values.get(key, [])
+        return self._index.default_values.get(key, ())
 
     def get_all_presets(self) -> Dict[str, Preset]:
         """Возвращает все пресеты"""
-        return self._presets.copy()
+        return dict(self._index.presets)
+
+    def get_batch_modes(self) -> Mapping[str, Dict]:
+        """Возвращает режимы пакетного редактирования"""
+        return self._index.batch_modes
 
 
 # Глобальный менеджер пресетов
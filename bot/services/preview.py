@@ -0,0 +1,129 @@
+"""
+Быстрые превью результатов генерации.
+
+Pro-модель отдаёт 4K PNG на десятки мегабайт, а Telegram всё равно
+пережимает фото в JPEG не больше 2560 px по длинной стороне. Поэтому
+в чат сразу уходит готовое превью в этих пределах (JPEG, собирается
+в ImageProcessPool), а оригинал без потерь лежит в static/uploads
+и отправляется документом по кнопке «Скачать».
+"""
+
+import asyncio
+import io
+import logging
+from typing import Any, Awaitable, Callable, Optional, Union
+
+from aiogram import types
+
+from bot.services.image_ops import sniff_mime
+
+logger = logging.getLogger(__name__)
+
+# Пределы фото в Telegram: длинная сторона и размер файла
+PREVIEW_MAX_SIDE = 2560
+PREVIEW_MAX_BYTES = 10 * 1024 * 1024
+
+
+# =============================================================================
+# КОД, ВЫПОЛНЯЕМЫЙ В РАБОЧИХ ПРОЦЕССАХ
+# =============================================================================
+
+
+def render_preview(
+    data: bytes,
+    max_side: int = PREVIEW_MAX_SIDE,
+    quality: int = 87,
+    max_bytes: int = PREVIEW_MAX_BYTES,
+) -> bytes:
+    """Уменьшает изображение до max_side и кодирует в progressive JPEG"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", (max_side, max_side))
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+        if img.mode in ("RGBA", "LA") or "transparency" in img.info:
+            # JPEG без альфа-канала — прозрачность на белом фоне, как в чате
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+
+        while True:
+            buf = io.BytesIO()
+            img.save(
+                buf, format="JPEG", quality=quality, optimize=True, progressive=True
+            )
+            if buf.tell() <= max_bytes or quality <= 50:
+                return buf.getvalue()
+            quality -= 10
+
+
+# =============================================================================
+# АСИНХРОННЫЙ ИНТЕРФЕЙС
+# =============================================================================
+
+
+class PreviewRenderer:
+    """Готовит превью в пуле процессов и отправляет результат как фото"""
+
+    def __init__(self, max_side: int = PREVIEW_MAX_SIDE, quality: int = 87):
+        self.max_side = max_side
+        self.quality = quality
+
+    async def render(self, data: bytes) -> bytes:
+        """
+        Превью для отправки фото.
+
+        Небольшой JPEG отправляется как есть; если изображение не удалось
+        обработать, возвращается оригинал — Telegram разберётся сам.
+        """
+        from bot.services.image_pool import image_pool
+
+        if sniff_mime(data) == "image/jpeg" and len(data) <= 1024 * 1024:
+            return data
+        try:
+            return await image_pool.run(
+                render_preview, data, max_side=self.max_side, quality=self.quality
+            )
+        except Exception as e:
+            logger.warning(f"Preview rendering failed, sending original: {e}")
+            return data
+
+    async def send_photo(
+        self,
+        send: Callable[..., Awaitable[types.Message]],
+        result: Union[bytes, Callable[[], Awaitable[Optional[bytes]]]],
+        digest: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Optional[types.Message]:
+        """
+        Отправляет результат генерации как фото через превью.
+
+        result — байты оригинала или корутина, которая их прочитает (если
+        известен digest, оригинал читается только при отправке без file_id).
+        file_id привязывается к хешу оригинала: повтор той же генерации
+        (из кэша результатов) уходит по file_id без рендера превью.
+        """
+        from bot.services.blob_store import BlobStore
+        from bot.services.media_registry import media_registry
+
+        if digest is None:
+            digest = await asyncio.to_thread(BlobStore.hash_bytes, result)
+
+        async def preview() -> Optional[bytes]:
+            data = result if isinstance(result, bytes) else await result()
+            return await self.render(data) if data else None
+
+        return await media_registry.send(
+            send, "photo", preview, "preview.jpg", digest=digest, **kwargs
+        )
+
+
+# Глобальный отрисовщик превью
+from bot.config import config
+
+preview_renderer = PreviewRenderer(
+    max_side=config.PREVIEW_MAX_SIDE, quality=config.PREVIEW_JPEG_QUALITY
+)
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+MessageKey = Tuple[int, int]  # (chat_id, message_id)
+
+
+@dataclass
+class ProgressUpdate:
+    text: str
+    reply_markup: Any = None
+    parse_mode: Optional[str] = "HTML"
+    final: bool = False  # Последнее обновление — без ожидания интервала
+
+
+class ProgressRenderer:
+    """
+    Общий отрисовщик сообщений о прогрессе.
+
+    Воркеры только кладут новый текст через update() — это не блокирует
+    и не ждёт Telegram. Для каждого сообщения хранится лишь последнее
+    состояние; отдельная задача редактирует сообщения не чаще одного раза
+    в min_interval секунд на сообщение и не чаще max_rate раз в секунду
+    суммарно, соблюдая RetryAfter от Telegram.
+    """
+
+    # Записи о давно не обновлявшихся сообщениях забываются
+    STALE_AFTER = 3600
+
+    def __init__(self, min_interval: float = 5.0, max_rate: float = 20.0):
+        self.min_interval = min_interval
+        self._gap = 1.0 / max_rate
+        self._pending: Dict[MessageKey, ProgressUpdate] = {}
+        # key -> (время последней правки, отправленный текст)
+        self._last_sent: Dict[MessageKey, Tuple[float, str]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._bot: Optional[Bot] = None
+        self._blocked_until = 0.0
+
+        self._sent = 0
+        self._coalesced = 0
+
+    def start(self, bot: Bot):
+        """Запускает фоновую задачу отрисовки"""
+        if self._task and not self._task.done():
+            return
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает отрисовку, отправив последние состояния"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for key, update in list(self._pending.items()):
+            del self._pending[key]
+            await self._send(key, update)
+
+    def update(
+        self,
+        chat_id: int,
+        message_id: int,
+        text: str,
+        reply_markup: Any = None,
+        parse_mode: Optional[str] = "HTML",
+        final: bool = False,
+    ):
+        """Ставит новое состояние сообщения; предыдущее неотправленное заменяется"""
+        key = (chat_id, message_id)
+        if key in self._pending:
+            self._coalesced += 1
+        self._pending[key] = ProgressUpdate(text, reply_markup, parse_mode, final)
+        if self._wakeup:
+            self._wakeup.set()
+
+    def discard(self, chat_id: int, message_id: int):
+        """Забывает сообщение (например, перед его удалением)"""
+        key = (chat_id, message_id)
+        self._pending.pop(key, None)
+        self._last_sent.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "sent": self._sent,
+            "coalesced": self._coalesced,
+        }
+
+    # =========================================================================
+    # ФОНОВАЯ ЗАДАЧА
+    # =========================================================================
+
+    def _due(self, key: MessageKey, update: ProgressUpdate) -> float:
+        last = self._last_sent.get(key)
+        due = self._blocked_until
+        if last and not update.final:
+            due = max(due, last[0] + self.min_interval)
+        return due
+
+    async def _run(self):
+        while True:
+            # Сбрасываем до прохода, чтобы не потерять update() во время отправки
+            self._wakeup.clear()
+            next_due = None
+
+            for key in list(self._pending):
+                update = self._pending.get(key)
+                if update is None:
+                    continue
+                due = self._due(key, update)
+                if due > time.monotonic():
+                    next_due = due if next_due is None else min(next_due, due)
+                    continue
+
+                del self._pending[key]
+                await self._send(key, update)
+                await asyncio.sleep(self._gap)
+
+            self._prune()
+
+            timeout = None
+            if next_due is not None:
+                timeout = max(0.0, next_due - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send(self, key: MessageKey, update: ProgressUpdate):
+        last = self._last_sent.get(key)
+        if last and last[1] == update.text and not update.reply_markup:
+            # Telegram отвечает ошибкой на правку без изменений
+            return
+
+        chat_id, message_id = key
+        try:
+            await self._bot.edit_message_text(
+                text=update.text,
+                chat_id=chat_id,
+                message_id=message_id,
+                parse_mode=update.parse_mode,
+                reply_markup=update.reply_markup,
+            )
+            self._sent += 1
+        except TelegramRetryAfter as e:
+            logger.warning(f"Progress updates throttled for {e.retry_after}s")
+            self._blocked_until = time.monotonic() + e.retry_after
+            # Более свежее состояние, пришедшее за время запроса, важнее
+            self._pending.setdefault(key, update)
+            return
+        except TelegramBadRequest as e:
+            logger.debug(f"Progress message {key} not updated: {e}")
+        except Exception as e:
+            logger.warning(f"Progress message {key} update failed: {e}")
+
+        if update.final:
+            self._last_sent.pop(key, None)
+        else:
+            self._last_sent[key] = (time.monotonic(), update.text)
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.STALE_AFTER
+        for key, (sent_at, _) in list(self._last_sent.items()):
+            if sent_at < cutoff and key not in self._pending:
+                del self._last_sent[key]
+
+
+# Глобальный отрисовщик прогресса
+from bot.config import config
+
+progress_renderer = ProgressRenderer(
+    min_interval=config.PROGRESS_UPDATE_INTERVAL,
+    max_rate=config.PROGRESS_MAX_EDITS_PER_SECOND,
+)
@@ -0,0 +1,65 @@
+"""
+Шаблоны промптов пресетов.
+
+Промпт вида "Logo for '{text}', {style} typography" разбирается один раз
+при загрузке пресетов: литералы и имена плейсхолдеров хранятся готовыми,
+так что подстановка — это проверка набора имён и склейка строк без
+повторного разбора str.format.
+"""
+
+from string import Formatter
+from typing import Any, List, Mapping, Tuple
+
+
+class PromptTemplateError(ValueError):
+    """Шаблон не разбирается или для него не хватает значений"""
+
+
+class PromptTemplate:
+    __slots__ = ("source", "placeholders", "_head", "_pairs")
+
+    def __init__(self, source: str):
+        self.source = source
+        literals = [""]
+        fields = []
+        try:
+            parsed = list(Formatter().parse(source))
+        except ValueError as e:
+            raise PromptTemplateError(f"Invalid template {source[:40]!r}: {e}") from e
+
+        for literal, name, spec, conversion in parsed:
+            literals[-1] += literal
+            if name is None:
+                continue
+            if not name.isidentifier() or spec or conversion:
+                raise PromptTemplateError(f"Unsupported placeholder {{{name}}}")
+            fields.append(name)
+            literals.append("")
+
+        # Литерал до первого плейсхолдера и пары (имя, литерал после него)
+        self._head = literals[0]
+        self._pairs: Tuple[Tuple[str, str], ...] = tuple(zip(fields, literals[1:]))
+        # Уникальные имена в порядке появления
+        self.placeholders: Tuple[str, ...] = tuple(dict.fromkeys(fields))
+
+    def missing(self, values: Mapping[str, Any]) -> List[str]:
+        """Плейсхолдеры, для которых нет значения"""
+        return [name for name in self.placeholders if name not in values]
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        """Подставляет значения; PromptTemplateError, если каких-то не хватает"""
+        missing = self.missing(values)
+        if missing:
+            raise PromptTemplateError(f"Missing placeholders: {', '.join(missing)}")
+        return self._render(values)
+
+    def _render(self, values: Mapping[str, Any]) -> str:
+        if not self._pairs:
+            # Без плейсхолдеров — литерал, в котором {{ и }} уже сняты
+            return self._head
+        return self._head + "".join(
+            [f"{values[name]}{literal}" for name, literal in self._pairs]
+        )
+
+    def __repr__(self) -> str:
+        return f"PromptTemplate({self.source[:40]!r})"
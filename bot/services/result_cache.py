@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from bot.services.blob_store import BlobStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    blob: str  # SHA-256 хеш результата в BlobStore
+    size: int
+    cost: int  # Стоимость генерации, которую экономит попадание
+    created_at: float
+    last_access: float
+    hits: int = 0
+
+
+class ResultCache:
+    """
+    Дисковый кэш результатов детерминированных генераций.
+
+    Ключ — нормализованный кортеж запроса (промпт, модель, формат,
+    разрешение, хеши входных изображений). Результаты лежат в BlobStore,
+    индекс — в JSON-файле. При превышении лимита размера вытесняются
+    давно не использованные записи (LRU).
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._store = BlobStore(str(self.root / "blobs"))
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._saved_cost = 0
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    # =========================================================================
+    # КЛЮЧИ
+    # =========================================================================
+
+    @staticmethod
+    def make_key(
+        prompt: str,
+        model: str,
+        aspect_ratio: Optional[str] = None,
+        resolution: Optional[str] = None,
+        images: Optional[List[bytes]] = None,
+    ) -> str:
+        """Строит ключ кэша из нормализованных параметров запроса"""
+        normalized = [
+            " ".join((prompt or "").split()),
+            (model or "").strip().lower(),
+            (aspect_ratio or "").strip(),
+            (resolution or "1K").strip().upper(),
+            [hashlib.sha256(img).hexdigest() for img in (images or []) if img],
+        ]
+        raw = json.dumps(normalized, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # =========================================================================
+    # ОСНОВНЫЕ ОПЕРАЦИИ
+    # =========================================================================
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Возвращает результат из кэша или None"""
+        async with self._lock:
+            await self._ensure_loaded()
+
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            data = await asyncio.to_thread(self._store.get, entry.blob)
+            if data is None:
+                # Файл пропал с диска — забываем запись
+                self._drop(key)
+                self._misses += 1
+                return None
+
+            entry.hits += 1
+            entry.last_access = time.time()
+            self._entries.move_to_end(key)
+            self._hits += 1
+            self._saved_cost += entry.cost
+
+        logger.info(f"Result cache hit: {key[:12]} (saved {entry.cost})")
+        return data
+
+    async def put(self, key: str, data: bytes, cost: int = 0) -> None:
+        """Сохраняет результат и вытесняет старые записи при переполнении"""
+        if not data or len(data) > self.max_bytes:
+            return
+
+        async with self._lock:
+            await self._ensure_loaded()
+
+            if key in self._entries:
+                self._drop(key)
+
+            blob = await asyncio.to_thread(self._store.put, data)
+            now = time.time()
+            self._entries[key] = CacheEntry(
+                blob=blob,
+                size=len(data),
+                cost=cost,
+                created_at=now,
+                last_access=now,
+            )
+            self._total_bytes += len(data)
+
+            self._evict()
+            await asyncio.to_thread(self._write_index)
+
+    async def flush(self) -> None:
+        """Сохраняет индекс на диск (LRU-порядок и счётчики)"""
+        async with self._lock:
+            if self._loaded:
+                await asyncio.to_thread(self._write_index)
+
+    async def clear(self) -> int:
+        """Полностью очищает кэш, возвращает количество удалённых записей"""
+        async with self._lock:
+            await self._ensure_loaded()
+            count = len(self._entries)
+            for key in list(self._entries):
+                self._drop(key)
+            await asyncio.to_thread(self._write_index)
+            return count
+
+    def stats(self) -> Dict:
+        """Статистика кэша для админ-панели"""
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": (self._hits / lookups * 100) if lookups else 0.0,
+            "saved_cost": self._saved_cost,
+        }
+
+    # =========================================================================
+    # СЛУЖЕБНЫЕ МЕТОДЫ
+    # =========================================================================
+
+    def _drop(self, key: str):
+        """Удаляет запись и её блоб, если на него больше никто не ссылается"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        self._total_bytes -= entry.size
+        if not any(e.blob == entry.blob for e in self._entries.values()):
+            self._store.delete(entry.blob)
+
+    def _evict(self):
+        """Вытесняет самые старые записи, пока кэш не влезет в лимит"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            logger.info(f"Result cache evict: {key[:12]}")
+            self._drop(key)
+
+    async def _ensure_loaded(self):
+        if not self._loaded:
+            await asyncio.to_thread(self._read_index)
+            self._loaded = True
+
+    def _read_index(self):
+        index_path = self.root / self.INDEX_FILE
+        if not index_path.exists():
+            return
+
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Result cache index is unreadable, starting empty: {e}")
+            return
+
+        # Записи в индексе уже упорядочены от старых к новым
+        for key, raw in data.get("entries", []):
+            entry = CacheEntry(**raw)
+            self._entries[key] = entry
+            self._total_bytes += entry.size
+
+        stats = data.get("stats", {})
+        self._hits = stats.get("hits", 0)
+        self._misses = stats.get("misses", 0)
+        self._saved_cost = stats.get("saved_cost", 0)
+
+        self._evict()
+
+    def _write_index(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        index_path = self.root / self.INDEX_FILE
+        tmp_path = index_path.with_suffix(".tmp")
+
+        data = {
+            "entries": [[key, asdict(entry)] for key, entry in self._entries.items()],
+            "stats": {
+                "hits": self._hits,
+                "misses": self._misses,
+                "saved_cost": self._saved_cost,
+            },
+        }
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, index_path)
+
+
+# Глобальный кэш результатов
+from bot.config import config
+
+result_cache = ResultCache(
+    root=config.RESULT_CACHE_DIR,
+    max_bytes=config.RESULT_CACHE_MAX_MB * 1024 * 1024,
+)
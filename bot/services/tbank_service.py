@@ -15,6 +15,17 @@ class TBankService:
         self.terminal_key = terminal_key
         self.secret_key = secret_key
         self.api_url = api_url.rstrip("/")
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Общая сессия: соединения с API переиспользуются между запросами"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
 
     def _generate_token(self, params: Dict[str, Any]) -> str:
         """
@@ -89,28 +100,28 @@ class TBankService:
 
         logger.debug(f"Init payment request: {order_id}, amount: {amount}")
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    f"{self.api_url}/Init",
-                    json=payload,
-                    headers={"Content-Type": "application/json"},
-                    timeout=aiohttp.ClientTimeout(total=15),
-                ) as response:
-                    result = await response.json()
-
-                    if result.get("Success"):
-                        logger.info(f"Payment init success: {result.get('PaymentId')}")
-                        return result
-                    else:
-                        logger.error(
-                            f"Payment init failed: {result.get('ErrorCode')} - {result.get('Message')}"
-                        )
-                        return result
-
-            except Exception as e:
-                logger.exception(f"Payment init exception: {e}")
-                return None
+        session = self._get_session()
+        try:
+            async with session.post(
+                f"{self.api_url}/Init",
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=15),
+            ) as response:
+                result = await response.json()
+
+                if result.get("Success"):
+                    logger.info(f"Payment init success: {result.get('PaymentId')}")
+                    return result
+                else:
+                    logger.error(
+                        f"Payment init failed: {result.get('ErrorCode')} - {result.get('Message')}"
+                    )
+                    return result
+
+        except Exception as e:
+            logger.exception(f"Payment init exception: {e}")
+            return None
 
     async def get_state(self, payment_id: str) -> Optional[Dict]:
         """Проверка статуса платежа"""
@@ -118,18 +129,18 @@ class TBankService:
         token = self._generate_token(token_base)
         payload = {**token_base, "Token": token}
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    f"{self.api_url}/GetState",
-                    json=payload,
-                    headers={"Content-Type": "application/json"},
-                    timeout=aiohttp.ClientTimeout(total=10),
-                ) as response:
-                    return await response.json()
-            except Exception as e:
-                logger.exception(f"Get state exception: {e}")
-                return None
+        session = self._get_session()
+        try:
+            async with session.post(
+                f"{self.api_url}/GetState",
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=10),
+            ) as response:
+                return await response.json()
+        except Exception as e:
+            logger.exception(f"Get state exception: {e}")
+            return None
 
     async def cancel(self, payment_id: str) -> Optional[Dict]:
         """Отмена платежа и возврат денег"""
@@ -137,18 +148,18 @@ class TBankService:
         token = self._generate_token(token_base)
         payload = {**token_base, "Token": token}
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    f"{self.api_url}/Cancel",
-                    json=payload,
-                    headers={"Content-Type": "application/json"},
-                    timeout=aiohttp.ClientTimeout(total=10),
-                ) as response:
-                    return await response.json()
-            except Exception as e:
-                logger.exception(f"Cancel exception: {e}")
-                return None
+        session = self._get_session()
+        try:
+            async with session.post(
+                f"{self.api_url}/Cancel",
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=10),
+            ) as response:
+                return await response.json()
+        except Exception as e:
+            logger.exception(f"Cancel exception: {e}")
+            return None
 
     def verify_notification(self, data: Dict[str, Any]) -> bool:
         """
@@ -196,26 +207,22 @@ class TBankService:
         # Добавляем Password из настроек
         token_params["Password"] = self.secret_key
 
-        # Логируем для отладки
-        logger.info(f"Verifying webhook - params: {token_params}")
-
-        # Сортируем и конкатенируем
+        # Сортируем и конкатенируем (строка содержит пароль — не логируем)
         sorted_keys = sorted(token_params.keys())
         values_str = "".join(token_params[k] for k in sorted_keys)
-        logger.info(f"Concatenated string: '{values_str}'")
 
         # Генерируем ожидаемый токен
         expected_token = hashlib.sha256(values_str.encode("utf-8")).hexdigest()
 
-        logger.info(f"Received token: {received_token}")
-        logger.info(f"Expected token: {expected_token}")
-
         # Сравниваем токены
         if received_token != expected_token:
-            logger.warning("Token mismatch - signature verification failed")
+            logger.warning(
+                f"Token mismatch - signature verification failed "
+                f"(order {data.get('OrderId')}, status {data.get('Status')})"
+            )
             return False
 
-        logger.info("Token verification successful")
+        logger.debug(f"Token verified for order {data.get('OrderId')}")
         return True
 
 
@@ -0,0 +1,121 @@
+"""
+Мемоизация inline-клавиатур.
+
+Почти все клавиатуры зависят от пары аргументов из маленького набора
+значений (пресет, текущий формат, длительность), поэтому собираются
+один раз на набор аргументов. Закэшированная разметка замораживается
+(разметка и кнопки — frozen-модели), так что одна и та же копия
+безопасно отдаётся всем обработчикам. Клавиатуры, собранные из данных
+пресетов, сбрасываются, когда preset_manager.reload() меняет конфигурацию.
+"""
+
+import functools
+import inspect
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from pydantic import ConfigDict
+
+_cached: List[Callable] = []
+
+
+class FrozenInlineKeyboardButton(InlineKeyboardButton):
+    model_config = ConfigDict(frozen=True)
+
+
+class FrozenInlineKeyboardMarkup(InlineKeyboardMarkup):
+    model_config = ConfigDict(frozen=True)
+
+
+def freeze_markup(markup: Any) -> Any:
+    """Неизменяемая копия разметки: общий объект нельзя испортить правкой"""
+    if not isinstance(markup, InlineKeyboardMarkup):
+        return markup
+    return FrozenInlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                FrozenInlineKeyboardButton(**button.model_dump(exclude_unset=True))
+                for button in row
+            ]
+            for row in markup.inline_keyboard
+        ]
+    )
+
+
+def cached_keyboard(
+    func: Optional[Callable] = None,
+    *,
+    key: Optional[Callable[..., Any]] = None,
+    presets: bool = False,
+    maxsize: int = 256,
+):
+    """
+    Декоратор функции-клавиатуры.
+
+    key — функция от тех же аргументов, возвращающая ключ кэша (по
+    умолчанию — все аргументы с учётом значений по умолчанию). Нужна,
+    когда аргументы не хешируются или шире, чем влияют на разметку.
+    presets=True — кэш сбрасывается при смене версии конфигурации пресетов.
+    """
+
+    def decorate(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        cache: "OrderedDict[Any, Any]" = OrderedDict()
+        stats = {"hits": 0, "misses": 0}
+        seen_version = [None]
+
+        def make_key(args, kwargs):
+            if key is not None:
+                return key(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple(bound.arguments.values())
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if presets:
+                from bot.services.preset_manager import preset_manager
+
+                if seen_version[0] != preset_manager.version:
+                    cache.clear()
+                    seen_version[0] = preset_manager.version
+
+            try:
+                cache_key = make_key(args, kwargs)
+                markup = cache.get(cache_key)
+            except TypeError:
+                # Нехешируемые аргументы — собираем без кэша
+                return func(*args, **kwargs)
+
+            if markup is not None:
+                stats["hits"] += 1
+                cache.move_to_end(cache_key)
+                return markup
+
+            stats["misses"] += 1
+            markup = freeze_markup(func(*args, **kwargs))
+            cache[cache_key] = markup
+            if len(cache) > maxsize:
+                cache.popitem(last=False)
+            return markup
+
+        def cache_info() -> Dict[str, int]:
+            return {**stats, "size": len(cache)}
+
+        wrapper.cache_clear = cache.clear
+        wrapper.cache_info = cache_info
+        wrapper.uncached = func
+        _cached.append(wrapper)
+        return wrapper
+
+    return decorate(func) if func is not None else decorate
+
+
+def clear_keyboard_caches():
+    for wrapper in _cached:
+        wrapper.cache_clear()
+
+
+def keyboard_cache_stats() -> Dict[str, Dict[str, int]]:
+    return {wrapper.__name__: wrapper.cache_info() for wrapper in _cached}
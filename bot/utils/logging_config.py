@@ -0,0 +1,193 @@
+"""
+Настройка логирования бота.
+
+Обработчики вызывают logger.* в event loop, поэтому запись в файл и
+stdout вынесена в отдельный поток: на корневом логгере стоит только
+QueueHandler, а QueueListener пишет в файл и консоль. До постановки в
+очередь запись проходит фильтры:
+
+- SamplingFilter — из шумных логгеров пропускается каждое N-е сообщение
+  ниже WARNING;
+- RedactFilter — секреты из конфигурации, пароли, токены и заголовки
+  авторизации маскируются; он стоит до обрезки, иначе секрет на границе
+  max_length или внутри base64 оставил бы в логе своё начало;
+- TruncateFilter — сообщение обрезается до max_length, длинные base64
+  внутри заменяются пометкой, так что цена записи не зависит от размера
+  ответа API.
+
+Формат — текстовый или JSON (одна запись на строку).
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+# Длинные последовательности base64 (картинки в ответах API)
+BASE64_RUN = re.compile(r"[A-Za-z0-9+/]{200,}={0,2}")
+
+# Ключ=значение и ключ: значение для секретных полей
+SECRET_FIELDS = re.compile(
+    r"(?i)(['\"]?(?:password|token|secret|api[_-]?key|authorization)['\"]?"
+    r"\s*[:=]\s*['\"]?)(?:bearer\s+)?[^'\",\s}]+"
+)
+
+# Токен Telegram-бота: 123456789:AA...
+BOT_TOKEN = re.compile(r"\b\d{6,}:[A-Za-z0-9_-]{30,}")
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает каждое every-е сообщение ниже WARNING для логгеров из rates.
+
+    rates — имя логгера (или префикс: правило для "aiohttp" действует на
+    "aiohttp.access") -> доля сообщений, которые остаются (0..1).
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.every = {
+            name: max(1, round(1 / rate)) if rate > 0 else 0
+            for name, rate in rates.items()
+        }
+        self._counters: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.every:
+            return True
+        rule = self._rule_for(record.name)
+        if rule is None:
+            return True
+        every = self.every[rule]
+        if every == 0:
+            return False
+        count = self._counters.get(rule, 0)
+        self._counters[rule] = count + 1
+        return count % every == 0
+
+    def _rule_for(self, name: str) -> Optional[str]:
+        while name:
+            if name in self.every:
+                return name
+            name = name.rpartition(".")[0]
+        return None
+
+
+class TruncateFilter(logging.Filter):
+    """Обрезает сообщение и заменяет длинные base64 пометкой"""
+
+    def __init__(self, max_length: int = 2000):
+        super().__init__()
+        self.max_length = max_length
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        if len(message) > self.max_length:
+            message = (
+                f"{message[: self.max_length]}... "
+                f"[truncated {len(message) - self.max_length} chars]"
+            )
+        message = BASE64_RUN.sub(lambda m: f"<base64 {len(m.group())} chars>", message)
+        record.msg, record.args = message, None
+        return True
+
+
+class RedactFilter(logging.Filter):
+    """Маскирует секреты в сообщении"""
+
+    MASK = "***"
+
+    def __init__(self, secrets: Iterable[str] = ()):
+        super().__init__()
+        # Короткие значения не маскируем, чтобы не портить обычный текст
+        self.secrets: List[str] = sorted(
+            {s for s in secrets if s and len(s) >= 8}, key=len, reverse=True
+        )
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        for secret in self.secrets:
+            if secret in message:
+                message = message.replace(secret, self.MASK)
+        message = SECRET_FIELDS.sub(lambda m: m.group(1) + self.MASK, message)
+        message = BOT_TOKEN.sub(self.MASK, message)
+        record.msg, record.args = message, None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-запись на строку"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def parse_sampling(value: str) -> Dict[str, float]:
+    """Разбирает LOG_SAMPLING: "aiohttp.access=0.1,..." -> {логгер: доля}"""
+    rates = {}
+    for item in value.split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def setup_logging(
+    level: str = "INFO",
+    log_file: Optional[str] = "logs/bot.log",
+    json_format: bool = False,
+    max_length: int = 2000,
+    sampling: Optional[Dict[str, float]] = None,
+    secrets: Iterable[str] = (),
+    logger: Optional[logging.Logger] = None,
+) -> logging.handlers.QueueListener:
+    """
+    Подключает к logger (по умолчанию корневому) QueueHandler с фильтрами
+    и запускает QueueListener. Возвращает listener — его нужно остановить
+    при завершении, чтобы дописать очередь.
+    """
+    logger = logger or logging.getLogger()
+
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        )
+    handlers: List[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    if sampling:
+        queue_handler.addFilter(SamplingFilter(sampling))
+    queue_handler.addFilter(RedactFilter(secrets))
+    queue_handler.addFilter(TruncateFilter(max_length))
+
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+    logger.setLevel(level.upper())
+
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+    return listener
@@ -0,0 +1,13 @@
+"""Общие фикстуры тестов"""
+
+import pytest_asyncio
+
+
+@pytest_asyncio.fixture
+async def temp_db(tmp_path, monkeypatch):
+    """Пустая БД бота во временной папке; возвращает модуль bot.database"""
+    from bot import database
+
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "bot.db"))
+    await database.init_db()
+    return database
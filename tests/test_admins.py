@@ -0,0 +1,53 @@
+"""Тесты для admins.py"""
+
+import json
+
+
+def make_presets(tmp_path, admin_ids):
+    from bot.services.preset_manager import PresetManager
+
+    (tmp_path / "presets.json").write_text(
+        json.dumps({"categories": {}}), encoding="utf-8"
+    )
+    (tmp_path / "price.json").write_text(
+        json.dumps({"admin_ids": admin_ids}), encoding="utf-8"
+    )
+    return PresetManager(str(tmp_path / "presets.json"), str(tmp_path / "price.json"))
+
+
+class TestAdminRegistry:
+    """Тесты единого списка админов"""
+
+    def test_merges_env_and_price_admins(self, tmp_path):
+        """Тест: админы из окружения и из price.json проверяются одинаково"""
+        from bot.services.admins import AdminRegistry
+
+        registry = AdminRegistry(make_presets(tmp_path, [2, "3"]), env_ids=[1])
+
+        assert registry.ids == frozenset({1, 2, 3})
+        assert registry.is_admin(3)
+        assert not registry.is_admin(4)
+
+    def test_follows_preset_reload(self, tmp_path):
+        """Тест: список из price.json обновляется вместе с пресетами"""
+        from bot.services.admins import AdminRegistry
+
+        presets = make_presets(tmp_path, [2])
+        registry = AdminRegistry(presets, env_ids=[1])
+        assert registry.is_admin(2)
+
+        (tmp_path / "price.json").write_text(
+            json.dumps({"admin_ids": [5]}), encoding="utf-8"
+        )
+        assert presets.reload()
+
+        assert registry.ids == frozenset({1, 5})
+
+    def test_config_parses_admin_ids_once(self):
+        """Тест: ADMIN_IDS разбирается один раз"""
+        from bot.config import Config
+
+        config = Config(ADMIN_IDS_STR="10, 20,")
+
+        assert config.admin_ids == frozenset({10, 20})
+        assert config.admin_ids is config.admin_ids
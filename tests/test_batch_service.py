@@ -0,0 +1,292 @@
+"""Тесты для batch_service.py (хранение пакетных задач)"""
+
+import importlib
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+
+
+@pytest_asyncio.fixture
+async def batch_env(temp_db, tmp_path, monkeypatch):
+    """Изолированные БД и хранилище блобов"""
+    from bot.services.blob_store import BlobStore
+
+    batch_module = importlib.import_module("bot.services.batch_service")
+
+    store = BlobStore(str(tmp_path / "blobs"))
+    monkeypatch.setattr(batch_module, "blob_store", store)
+
+    service = batch_module.BatchEditingService()
+    monkeypatch.setattr(service, "_save_result_file", lambda *args: None)
+    monkeypatch.setattr(service, "_save_job_results", AsyncMock())
+    return service, store
+
+
+class TestBatchJobStore:
+    """Тесты персистентности пакетных задач"""
+
+    @pytest.mark.asyncio
+    async def test_job_survives_restart(self, batch_env, monkeypatch):
+        """Тест: задача читается из БД, изображения — из BlobStore"""
+        batch_module = importlib.import_module("bot.services.batch_service")
+
+        service, store = batch_env
+
+        # Элементы выполняются параллельно — ответ зависит от входа, не от порядка
+        async def generate(**kwargs):
+            return b"result-1" if kwargs["image_input"] == b"source-1" else None
+
+        monkeypatch.setattr(
+            batch_module.gemini_service,
+            "generate_image",
+            AsyncMock(side_effect=generate),
+        )
+
+        job = await service.create_batch_job(
+            user_id=42, images=[b"source-1", b"source-2"], prompt="make it blue"
+        )
+        await service.execute_batch(job)
+
+        # Новый экземпляр сервиса — как после перезапуска
+        restarted = batch_module.BatchEditingService()
+        loaded = await restarted.get_job(job.id)
+
+        assert loaded.status == batch_module.BatchStatus.PARTIAL
+        assert [i.status for i in loaded.items] == [
+            batch_module.BatchStatus.COMPLETED,
+            batch_module.BatchStatus.FAILED,
+        ]
+        assert await restarted.read_blob(loaded.items[0].result_hash) == b"result-1"
+        assert store.get(loaded.items[1].image_hash) == b"source-2"
+
+    @pytest.mark.asyncio
+    async def test_resume_unfinished_items(self, batch_env, monkeypatch):
+        """Тест: после перезапуска выполняются только незавершённые элементы"""
+        from bot.database import update_batch_item, update_batch_status
+
+        batch_module = importlib.import_module("bot.services.batch_service")
+
+        service, _ = batch_env
+        job = await service.create_batch_job(
+            user_id=42, images=[b"a", b"b", b"c"], prompt="p"
+        )
+
+        # Имитируем падение посреди выполнения
+        await update_batch_status(job.id, "running")
+        job.items[0].status = batch_module.BatchStatus.COMPLETED
+        job.items[0].result_hash = "done"
+        job.items[1].status = batch_module.BatchStatus.RUNNING
+        await update_batch_item(job.id, job.items[0].to_row())
+        await update_batch_item(job.id, job.items[1].to_row())
+
+        generate = AsyncMock(return_value=b"fresh")
+        monkeypatch.setattr(batch_module.gemini_service, "generate_image", generate)
+
+        jobs = await batch_module.BatchEditingService().get_unfinished_jobs()
+        assert [j.id for j in jobs] == [job.id]
+
+        resumed = await service.execute_batch(jobs[0])
+
+        assert generate.await_count == 2
+        assert resumed.status == batch_module.BatchStatus.COMPLETED
+        assert await batch_module.BatchEditingService().get_unfinished_jobs() == []
+
+    @pytest.mark.asyncio
+    async def test_cleanup_removes_orphaned_blobs(self, batch_env):
+        """Тест: очистка удаляет старые задачи и неиспользуемые блобы"""
+        from bot.database import update_batch_status
+
+        service, store = batch_env
+        old = await service.create_batch_job(
+            user_id=1, images=[b"shared", b"only-old"], prompt="p"
+        )
+        running = await service.create_batch_job(
+            user_id=2, images=[b"shared"], prompt="p"
+        )
+        await update_batch_status(old.id, "completed", old.created_at)
+        await update_batch_status(running.id, "running")
+
+        # Отодвигаем порог в будущее, чтобы старая задача попала под очистку
+        removed = await service.cleanup_old_jobs(max_age_hours=-1)
+
+        assert removed == 1
+        assert await service.get_job(old.id) is None
+        assert store.get(store.hash_bytes(b"shared")) == b"shared"
+        assert store.get(store.hash_bytes(b"only-old")) is None
+
+    @pytest.mark.asyncio
+    async def test_cleanup_expires_never_started_jobs(self, batch_env):
+        """Тест: незапущенная задача (отмена, нет баланса) тоже удаляется"""
+        service, store = batch_env
+        abandoned = await service.create_batch_job(
+            user_id=1, images=[b"source"], prompt="p"
+        )
+
+        assert await service.cleanup_old_jobs() == 0
+        assert await service.get_job(abandoned.id) is not None
+
+        assert await service.cleanup_old_jobs(max_age_hours=-1) == 1
+        assert await service.get_job(abandoned.id) is None
+        assert store.get(store.hash_bytes(b"source")) is None
+
+    @pytest.mark.asyncio
+    async def test_iter_batch_yields_in_completion_order(self, batch_env, monkeypatch):
+        """Тест: элементы отдаются по мере готовности, а не после всего пакета"""
+        import asyncio
+
+        batch_module = importlib.import_module("bot.services.batch_service")
+
+        service, _ = batch_env
+        delays = {b"slow": 0.05, b"fast": 0.0}
+
+        async def generate(**kwargs):
+            await asyncio.sleep(delays[kwargs["image_input"]])
+            return b"out-" + kwargs["image_input"]
+
+        monkeypatch.setattr(batch_module.gemini_service, "generate_image", generate)
+
+        job = await service.create_batch_job(
+            user_id=7, images=[b"slow", b"fast"], prompt="p"
+        )
+
+        order = [item.index async for item in service.iter_batch(job)]
+
+        assert order == [1, 0]
+        assert job.status == batch_module.BatchStatus.COMPLETED
+
+
+class TestBatchDeduplication:
+    """Тесты дедупликации и single-flight"""
+
+    @pytest.mark.asyncio
+    async def test_duplicates_in_job_share_one_request(self, batch_env, monkeypatch):
+        """Тест: повторы внутри пакета не оплачиваются и не запрашиваются"""
+        batch_module = importlib.import_module("bot.services.batch_service")
+
+        service, _ = batch_env
+        generate = AsyncMock(side_effect=lambda **kw: b"out-" + kw["image_input"])
+        monkeypatch.setattr(batch_module.gemini_service, "generate_image", generate)
+
+        job = await service.create_batch_job(
+            user_id=1, images=[b"a", b"a", b"b"], prompt="make  it blue"
+        )
+        assert job.total_cost == 2 * service.COST_PER_IMAGE
+        assert job.duplicates == 1
+
+        await service.execute_batch(job)
+
+        assert generate.await_count == 2
+        assert job.status == batch_module.BatchStatus.COMPLETED
+        assert job.items[0].result_hash == job.items[1].result_hash
+        assert job.refund == 0
+
+    @pytest.mark.asyncio
+    async def test_same_second_jobs_do_not_collide(self, batch_env, monkeypatch):
+        """Тест: два пакета пользователя в одну секунду — две разные задачи"""
+        batch_module = importlib.import_module("bot.services.batch_service")
+
+        service, _ = batch_env
+        monkeypatch.setattr(batch_module.time, "time", lambda: 1_700_000_000.0)
+
+        first = await service.create_batch_job(user_id=1, images=[b"a"], prompt="p")
+        second = await service.create_batch_job(user_id=1, images=[b"b"], prompt="q")
+
+        assert first.id != second.id
+        assert "_" not in first.id
+        assert (await service.get_job(first.id)).prompt == "p"
+        assert (await service.get_job(second.id)).prompt == "q"
+
+    @pytest.mark.asyncio
+    async def test_recent_result_is_reused(self, batch_env, monkeypatch):
+        """Тест: готовый результат недавнего пакета переиспользуется бесплатно"""
+        batch_module = importlib.import_module("bot.services.batch_service")
+
+        service, _ = batch_env
+        generate = AsyncMock(return_value=b"result")
+        monkeypatch.setattr(batch_module.gemini_service, "generate_image", generate)
+
+        first = await service.create_batch_job(user_id=1, images=[b"a"], prompt="p")
+        await service.execute_batch(first)
+
+        second = await service.create_batch_job(user_id=2, images=[b"a"], prompt="p")
+        assert second.total_cost == 0
+
+        await service.execute_batch(second)
+
+        assert generate.await_count == 1
+        assert second.items[0].result_hash == first.items[0].result_hash
+
+        # Другой формат — это другая работа
+        other = await service.create_batch_job(
+            user_id=2, images=[b"a"], prompt="p", aspect_ratio="16:9"
+        )
+        assert other.total_cost == service.COST_PER_IMAGE
+
+    @pytest.mark.asyncio
+    async def test_recent_result_matches_normalized_prompt(
+        self, batch_env, monkeypatch
+    ):
+        """Тест: промпт с другими пробелами — та же работа и в недавних пакетах"""
+        batch_module = importlib.import_module("bot.services.batch_service")
+
+        service, _ = batch_env
+        generate = AsyncMock(return_value=b"result")
+        monkeypatch.setattr(batch_module.gemini_service, "generate_image", generate)
+
+        first = await service.create_batch_job(
+            user_id=1, images=[b"a"], prompt="red  hat"
+        )
+        await service.execute_batch(first)
+
+        second = await service.create_batch_job(
+            user_id=2, images=[b"a"], prompt=" red hat\n"
+        )
+        assert second.total_cost == 0
+
+        await service.execute_batch(second)
+        assert generate.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_jobs_single_flight(self, batch_env, monkeypatch):
+        """Тест: одинаковая работа двух пакетов в полёте — один запрос и возврат"""
+        import asyncio
+
+        batch_module = importlib.import_module("bot.services.batch_service")
+
+        service, _ = batch_env
+        gate = asyncio.Event()
+
+        async def generate(**kwargs):
+            await gate.wait()
+            return b"result"
+
+        generate_mock = AsyncMock(side_effect=generate)
+        monkeypatch.setattr(
+            batch_module.gemini_service, "generate_image", generate_mock
+        )
+
+        first = await service.create_batch_job(user_id=1, images=[b"a"], prompt="p")
+        second = await service.create_batch_job(user_id=2, images=[b"a"], prompt="p")
+        assert first.total_cost == second.total_cost == service.COST_PER_IMAGE
+
+        tasks = [
+            asyncio.create_task(service.execute_batch(first)),
+            asyncio.create_task(service.execute_batch(second)),
+        ]
+        # Ждём, пока оба элемента возьмутся за работу (второй — за общий запрос)
+        running = batch_module.BatchStatus.RUNNING
+        for _ in range(500):
+            if all(j.items[0].status == running for j in (first, second)):
+                break
+            await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.gather(*tasks)
+
+        assert generate_mock.await_count == 1
+        assert second.items[0].result_hash == first.items[0].result_hash
+        # Кто из пакетов сделал запрос, решает планировщик; второй получает возврат
+        leader, follower = sorted((first, second), key=lambda j: j.refund)
+        assert (leader.refund, follower.refund) == (0, service.COST_PER_IMAGE)
+        assert follower.total_cost == 0
+        assert (await service.get_job(follower.id)).total_cost == 0
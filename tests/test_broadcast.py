@@ -0,0 +1,73 @@
+"""Тесты для broadcast.py (возобновляемая рассылка)"""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+import pytest_asyncio
+
+
+@pytest_asyncio.fixture
+async def users_db(temp_db):
+    """БД с пятью пользователями"""
+    for telegram_id in range(101, 106):
+        await temp_db.get_or_create_user(telegram_id)
+    return temp_db
+
+
+def _bot(blocked=()):
+    from aiogram.exceptions import TelegramForbiddenError
+
+    async def send_message(chat_id, text, **kwargs):
+        if chat_id in blocked:
+            raise TelegramForbiddenError(MagicMock(), "bot was blocked by the user")
+
+    return MagicMock(send_message=AsyncMock(side_effect=send_message))
+
+
+def _recipients(bot):
+    return sorted(call.args[0] for call in bot.send_message.await_args_list)
+
+
+class TestBroadcastService:
+    """Тесты рассылки"""
+
+    @pytest.mark.asyncio
+    async def test_blocked_users_are_skipped_next_time(self, users_db):
+        """Тест: заблокировавшие бота помечаются и пропускаются дальше"""
+        from bot.services.broadcast import BroadcastService
+
+        service = BroadcastService(page_size=2, concurrency=3)
+        bot = _bot(blocked={102})
+
+        broadcast_id = await service.start(bot, "hello", admin_chat_id=1)
+        await service.wait(broadcast_id)
+
+        row = await users_db.get_broadcast(broadcast_id)
+        assert (row["status"], row["sent"], row["blocked"]) == ("completed", 4, 1)
+        assert _recipients(bot) == [101, 102, 103, 104, 105]
+
+        bot = _bot()
+        await service.wait(await service.start(bot, "again", admin_chat_id=1))
+        assert _recipients(bot) == [101, 103, 104, 105]
+
+        # После /start пользователь снова получает рассылки
+        assert await users_db.unmark_recipient_blocked(102)
+
+    @pytest.mark.asyncio
+    async def test_resume_from_checkpoint(self, users_db):
+        """Тест: после перезапуска рассылка продолжается с контрольной точки"""
+        from bot.services.broadcast import BroadcastService
+
+        broadcast_id = await users_db.create_broadcast("hello", admin_chat_id=1)
+        # Первые два пользователя были обработаны до падения
+        await users_db.save_broadcast_progress(broadcast_id, 2, 2, 0, 0)
+
+        service = BroadcastService(page_size=2)
+        bot = _bot()
+        assert await service.resume(bot) == 1
+        await service.wait(broadcast_id)
+
+        assert _recipients(bot) == [103, 104, 105]
+        row = await users_db.get_broadcast(broadcast_id)
+        assert (row["status"], row["sent"], row["last_user_id"]) == ("completed", 5, 5)
+        assert await service.resume(bot) == 0
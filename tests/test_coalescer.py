@@ -0,0 +1,100 @@
+"""Тесты для coalescer.py (single-flight запросов)"""
+
+import asyncio
+
+import pytest
+
+
+class TestRequestCoalescer:
+    """Тесты склейки одинаковых запросов"""
+
+    def test_key_normalization(self):
+        """Тест: пробелы в промпте не влияют на ключ, пользователь — влияет"""
+        from bot.services.coalescer import RequestCoalescer
+
+        key = RequestCoalescer.make_key(1, "image", "a  cat\n", b"img")
+        assert key == RequestCoalescer.make_key(1, "image", "a cat", b"img")
+        assert key != RequestCoalescer.make_key(2, "image", "a cat", b"img")
+
+    @pytest.mark.asyncio
+    async def test_concurrent_duplicates_share_one_call(self):
+        """Тест: дубли в полёте ждут результат лидера"""
+        from bot.services.coalescer import RequestCoalescer
+
+        coalescer = RequestCoalescer(window=60)
+        calls = []
+        gate = asyncio.Event()
+
+        async def work():
+            calls.append(1)
+            await gate.wait()
+            return "done"
+
+        tasks = [asyncio.create_task(coalescer.run("k", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert coalescer.pending("k")
+        gate.set()
+        results = await asyncio.gather(*tasks)
+
+        assert len(calls) == 1
+        assert sorted(leader for _, leader in results) == [False, False, True]
+        assert {result for result, _ in results} == {"done"}
+
+        # Повтор в пределах окна тоже не выполняется
+        assert await coalescer.run("k", work) == ("done", False)
+        assert coalescer.stats()["coalesced"] == 3
+
+    @pytest.mark.asyncio
+    async def test_window_expires(self):
+        """Тест: после окна тот же запрос выполняется снова"""
+        from bot.services.coalescer import RequestCoalescer
+
+        coalescer = RequestCoalescer(window=0)
+
+        async def work():
+            return 1
+
+        assert await coalescer.run("k", work) == (1, True)
+        await asyncio.sleep(0.01)
+        assert await coalescer.run("k", work) == (1, True)
+
+    @pytest.mark.asyncio
+    async def test_failed_leader_is_not_remembered(self):
+        """Тест: упавший запрос не блокирует повтор, дубли получают None"""
+        from bot.services.coalescer import RequestCoalescer
+
+        coalescer = RequestCoalescer(window=60)
+        gate = asyncio.Event()
+
+        async def fail():
+            await gate.wait()
+            raise RuntimeError("boom")
+
+        leader = asyncio.create_task(coalescer.run("k", fail))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(coalescer.run("k", fail))
+        await asyncio.sleep(0)
+        gate.set()
+
+        with pytest.raises(RuntimeError):
+            await leader
+        assert await follower == (None, False)
+        assert not coalescer.pending("k")
+
+    @pytest.mark.asyncio
+    async def test_unfulfilled_request_is_not_remembered(self):
+        """Тест: невыполненный запрос (не хватило кредитов) можно повторить"""
+        from bot.services.coalescer import RequestCoalescer
+
+        coalescer = RequestCoalescer(window=60)
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return len(calls) > 1
+
+        assert await coalescer.run("k", work) == (False, True)
+        assert not coalescer.pending("k")
+        assert await coalescer.run("k", work) == (True, True)
+        assert await coalescer.run("k", work) == (True, False)
+        assert len(calls) == 2
@@ -0,0 +1,71 @@
+"""Тесты для concurrency.py (адаптивный лимитер)"""
+
+import asyncio
+
+import pytest
+
+
+class TestAdaptiveLimiter:
+    """Тесты AIMD и честной очереди"""
+
+    @pytest.mark.asyncio
+    async def test_additive_increase(self):
+        """Тест: лимит растёт на 1 за окно успешных ответов"""
+        from bot.services.concurrency import AdaptiveLimiter
+
+        limiter = AdaptiveLimiter("test", initial=2, max_limit=4)
+        for _ in range(2):
+            async with limiter.slot(user=1):
+                pass
+
+        assert limiter.limit == 3
+
+    @pytest.mark.asyncio
+    async def test_multiplicative_decrease(self):
+        """Тест: перегрузка режет лимит вдвое, но не ниже минимума"""
+        from bot.services.concurrency import AdaptiveLimiter, signal_overload
+
+        limiter = AdaptiveLimiter("test", initial=8)
+        async with limiter.slot(user=1):
+            signal_overload("429")
+        assert limiter.limit == 4
+
+        with pytest.raises(asyncio.TimeoutError):
+            async with limiter.slot(user=1):
+                raise asyncio.TimeoutError()
+        assert limiter.limit == 2
+
+    @pytest.mark.asyncio
+    async def test_signal_outside_slot_is_ignored(self):
+        """Тест: сигнал вне слота ни на что не влияет"""
+        from bot.services.concurrency import signal_overload
+
+        signal_overload("429")
+
+    @pytest.mark.asyncio
+    async def test_round_robin_between_users(self):
+        """Тест: большой пакет одного пользователя не блокирует другого"""
+        from bot.services.concurrency import AdaptiveLimiter
+
+        limiter = AdaptiveLimiter("test", initial=1, max_limit=1)
+        order = []
+        gate = asyncio.Event()
+
+        async def work(user, job, n):
+            async with limiter.slot(user=user, flow=job):
+                order.append((user, n))
+                await gate.wait()
+
+        # Первый запрос пользователя 1 занимает единственный слот
+        first = asyncio.create_task(work(1, "a", 0))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(work(1, "a", n)) for n in range(1, 4)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(work(2, "b", 0)))
+        await asyncio.sleep(0)
+
+        gate.set()
+        await asyncio.gather(first, *tasks)
+
+        assert order[:3] == [(1, 0), (1, 1), (2, 0)]
+        assert limiter.in_flight == 0
@@ -0,0 +1,65 @@
+"""Тесты для delivery.py (выбор способа отправки файла)"""
+
+import pytest
+
+MB = 1024 * 1024
+
+
+class TestDeliveryPlanner:
+    """Тесты выбора между file_id, URL и загрузкой"""
+
+    def test_file_id_wins(self):
+        """Тест: известный file_id используется всегда"""
+        from bot.services.delivery import DeliveryMethod, DeliveryPlanner
+
+        planner = DeliveryPlanner()
+        method = planner.choose("photo", 4 * MB, has_file_id=True, has_url=True)
+        assert method == DeliveryMethod.FILE_ID
+
+    def test_size_decides_between_url_and_upload(self):
+        """Тест: мелкий файл быстрее загрузить, крупный — отдать ссылкой"""
+        from bot.services.delivery import DeliveryMethod, DeliveryPlanner
+
+        planner = DeliveryPlanner(upload_rate=MB, upload_latency=0.5, url_latency=2)
+        assert planner.choose("photo", 200 * 1024, has_url=True) == (
+            DeliveryMethod.UPLOAD
+        )
+        assert planner.choose("photo", 3 * MB, has_url=True) == DeliveryMethod.URL
+        # Без URL выбора нет
+        assert planner.choose("photo", 3 * MB) == DeliveryMethod.UPLOAD
+
+    def test_url_limit_per_kind(self):
+        """Тест: фото больше 5 МБ по ссылке не отправить, документ — можно"""
+        from bot.services.delivery import DeliveryMethod, DeliveryPlanner
+
+        planner = DeliveryPlanner()
+        assert planner.choose("photo", 8 * MB, has_url=True) == DeliveryMethod.UPLOAD
+        assert planner.choose("document", 8 * MB, has_url=True) == (DeliveryMethod.URL)
+
+    def test_model_learns_from_measurements(self):
+        """Тест: на быстром канале загрузка выгоднее даже для крупных файлов"""
+        from bot.services.delivery import DeliveryMethod, DeliveryPlanner
+
+        planner = DeliveryPlanner(upload_rate=MB, alpha=0.5)
+        assert planner.choose("photo", 3 * MB, has_url=True) == DeliveryMethod.URL
+
+        for _ in range(10):
+            planner.record_upload(1024, 0.1)  # Задержка
+            planner.record_upload(4 * MB, 0.2)  # ~40 МБ/с
+        assert planner.estimate_upload(3 * MB) < 0.5
+        assert planner.choose("photo", 3 * MB, has_url=True) == (DeliveryMethod.UPLOAD)
+
+    @pytest.mark.asyncio
+    async def test_unreachable_host_disables_url(self):
+        """Тест: недоступный static-хост выключает отправку по ссылке"""
+        import asyncio
+
+        from bot.services.delivery import DeliveryMethod, DeliveryPlanner
+
+        # Порт 9 (discard) на localhost закрыт — проверка хоста не проходит
+        planner = DeliveryPlanner(static_base_url="http://127.0.0.1:9")
+        assert planner.choose("photo", 3 * MB, has_url=True) == DeliveryMethod.URL
+        await asyncio.wait_for(planner._probe, 10)
+
+        assert planner.choose("photo", 3 * MB, has_url=True) == (DeliveryMethod.UPLOAD)
+        assert planner.stats()["host_available"] is False
@@ -852,5 +852,143 @@ class TestCompositeImages:
             mock_gen.assert_called_once()
 
 
+class TestChatSessionRegistry:
+    """Тесты реестра сессий многоходового редактирования"""
+
+    def test_lru_eviction_by_count(self):
+        """Тест: при превышении лимита вытесняется самая старая сессия"""
+        from bot.services.chat_registry import ChatSessionRegistry
+
+        registry = ChatSessionRegistry(max_sessions=2)
+        registry["a"] = MagicMock()
+        registry["b"] = MagicMock()
+        registry["a"]  # "a" становится самой свежей
+        registry["c"] = MagicMock()
+
+        assert "a" in registry
+        assert "b" not in registry
+        assert "c" in registry
+
+    def test_memory_accounting(self):
+        """Тест: сессии вытесняются при превышении лимита памяти"""
+        from bot.services.chat_registry import ChatSessionRegistry
+
+        registry = ChatSessionRegistry(max_total_bytes=100)
+        registry["a"] = MagicMock()
+        registry["b"] = MagicMock()
+
+        registry.account("a", 60)
+        registry.account("b", 60)
+
+        assert "a" not in registry
+        assert registry.stats()["memory_bytes"] == 60
+
+    @pytest.mark.asyncio
+    async def test_idle_ttl(self):
+        """Тест: простаивающие сессии вытесняются"""
+        from bot.services.chat_registry import ChatSessionRegistry
+
+        registry = ChatSessionRegistry(idle_ttl=60)
+        registry["a"] = MagicMock()
+        registry._sessions["a"].last_access -= 120
+
+        assert await registry.sweep() == 1
+        assert await registry.get("a") is None
+
+    @pytest.mark.asyncio
+    async def test_persist_and_restore(self, tmp_path):
+        """Тест: история вытесненной сессии восстанавливается с диска"""
+        from bot.services.chat_registry import ChatSessionRegistry
+
+        restored_chat = MagicMock()
+        restore = Mock(return_value=restored_chat)
+        registry = ChatSessionRegistry(
+            max_sessions=1, persist_dir=str(tmp_path), restore=restore
+        )
+
+        history_item = MagicMock()
+        history_item.model_dump.return_value = {"role": "user", "parts": []}
+        chat = MagicMock()
+        chat.get_history.return_value = [history_item]
+
+        await registry.put("a", chat, model="gemini-3-pro-image-preview")
+        await registry.put("b", MagicMock(), model="gemini-3-pro-image-preview")
+
+        assert "a" not in registry
+        assert await registry.get("a") is restored_chat
+        restore.assert_called_once_with(
+            "gemini-3-pro-image-preview", False, [{"role": "user", "parts": []}]
+        )
+
+    @pytest.mark.asyncio
+    async def test_turn_right_after_idle_ttl(self, tmp_path):
+        """Тест: первый ход после истечения TTL находит сессию"""
+        import asyncio
+
+        from bot.services.chat_registry import ChatSessionRegistry
+
+        restore = Mock(return_value=MagicMock())
+        registry = ChatSessionRegistry(
+            idle_ttl=0.1, persist_dir=str(tmp_path), restore=restore
+        )
+        chat = MagicMock()
+        chat.get_history.return_value = []
+        await registry.put("a", chat, model="gemini-3-pro-image-preview")
+
+        await asyncio.sleep(0.2)
+
+        assert await registry.get("a") is chat
+        restore.assert_not_called()
+
+        # Вытесненная и уже записанная на диск сессия восстанавливается
+        await asyncio.sleep(0.2)
+        await registry.sweep()
+        assert (tmp_path / "a.json").exists()
+        assert await registry.get("a") is restore.return_value
+
+    @pytest.mark.asyncio
+    async def test_account_eviction_persisted_in_background(self, tmp_path):
+        """Тест: сессия, вытесненная в account(), пишется на диск без get/put"""
+        import asyncio
+
+        from bot.services.chat_registry import ChatSessionRegistry
+
+        registry = ChatSessionRegistry(max_total_bytes=100, persist_dir=str(tmp_path))
+        for chat_id in ("a", "b"):
+            chat = MagicMock()
+            chat.get_history.return_value = []
+            await registry.put(chat_id, chat, model="gemini-3-pro-image-preview")
+
+        registry.account("a", 60)
+        registry.account("b", 60)
+        assert "a" not in registry
+
+        for _ in range(50):
+            if (tmp_path / "a.json").exists():
+                break
+            await asyncio.sleep(0.01)
+        assert (tmp_path / "a.json").exists()
+
+    @pytest.mark.asyncio
+    async def test_flush_saves_active_sessions(self, tmp_path):
+        """Тест: flush() сохраняет активные сессии, они переживают перезапуск"""
+        from bot.services.chat_registry import ChatSessionRegistry
+
+        registry = ChatSessionRegistry(persist_dir=str(tmp_path))
+        chat = MagicMock()
+        chat.get_history.return_value = []
+        await registry.put("a", chat, model="gemini-3-pro-image-preview")
+        registry["legacy"] = MagicMock()  # Без модели не восстановить
+
+        assert await registry.flush() == 1
+        assert "a" in registry
+
+        restore = Mock(return_value=MagicMock())
+        restarted = ChatSessionRegistry(persist_dir=str(tmp_path), restore=restore)
+        assert await restarted.get("a") is restore.return_value
+        restore.assert_called_once_with("gemini-3-pro-image-preview", False, [])
+        assert await restarted.get("legacy") is None
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,113 @@
+"""
+Тесты пула процессов обработки изображений
+"""
+
+import io
+
+import pytest
+
+
+def _make_image(fmt: str, size=(64, 48)) -> bytes:
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 10, 10)).save(buf, format=fmt)
+    return buf.getvalue()
+
+
+class TestImageOps:
+    """Тесты чистых операций над изображениями"""
+
+    def test_sniff_mime(self):
+        """Тест: определение формата по сигнатуре"""
+        from bot.services.image_ops import sniff_mime
+
+        assert sniff_mime(_make_image("JPEG")) == "image/jpeg"
+        assert sniff_mime(_make_image("PNG")) == "image/png"
+        assert sniff_mime(_make_image("WEBP")) == "image/webp"
+        assert sniff_mime(_make_image("BMP")) is None
+
+    def test_prepare_gemini_image(self):
+        """Тест: поддерживаемые форматы не перекодируются, остальные — в PNG"""
+        from bot.services.image_ops import prepare_gemini_image, sniff_mime
+
+        assert prepare_gemini_image(_make_image("JPEG")) == ("image/jpeg", None)
+
+        mime_type, converted = prepare_gemini_image(_make_image("BMP"))
+        assert mime_type == "image/png"
+        assert sniff_mime(converted) == "image/png"
+
+
+class TestImageProcessPool:
+    """Тесты пула процессов"""
+
+    @pytest.mark.asyncio
+    async def test_run_via_shared_memory(self):
+        """Тест: крупные кадры и результат передаются через разделяемую память"""
+        from bot.services.image_ops import prepare_gemini_image
+        from bot.services.image_pool import ImageProcessPool
+
+        pool = ImageProcessPool(max_workers=2, shm_threshold=1024)
+        try:
+            await pool.warm_up()
+            frame = _make_image("BMP", (800, 600))
+            mime_type, converted = await pool.run(prepare_gemini_image, frame)
+        finally:
+            pool.shutdown()
+
+        assert mime_type == "image/png"
+        assert converted.startswith(b"\x89PNG")
+
+
+class TestGallery:
+    """Тесты компоновщика превью-галереи"""
+
+    def test_render_tile_uses_draft_for_jpeg(self):
+        """Тест: плитка из JPEG имеет точный размер тайла"""
+        from bot.services.gallery import render_tile
+
+        raw = render_tile(_make_image("JPEG", (3840, 2160)), label="1", tile_size=128)
+        assert len(raw) == 128 * 128 * 3
+
+    @pytest.mark.asyncio
+    async def test_pages_split_by_six(self, monkeypatch):
+        """Тест: больше 6 кадров — несколько страниц"""
+        import importlib
+
+        from PIL import Image
+
+        from bot.services.gallery import render_gallery_pages
+        from bot.services.image_pool import ImageProcessPool
+
+        # bot.services реэкспортирует экземпляр с тем же именем, что и модуль
+        image_pool_module = importlib.import_module("bot.services.image_pool")
+        pool = ImageProcessPool(max_workers=2)
+        monkeypatch.setattr(image_pool_module, "image_pool", pool)
+        try:
+            frames = [_make_image("PNG", (400, 300)) for _ in range(8)]
+            pages = await render_gallery_pages(frames, tile_size=128)
+        finally:
+            pool.shutdown()
+
+        assert len(pages) == 2
+        sizes = [Image.open(io.BytesIO(page)).size for page in pages]
+        assert sizes == [(384, 256), (256, 128)]
+
+    def test_large_page_fits_all_tiles(self):
+        """Тест: страница больше 6 плиток растит сетку, плитки не за холстом"""
+        from PIL import Image
+
+        from bot.services.gallery import compose_page, page_layout, render_tile
+
+        assert page_layout(6) == (3, 2)
+        for count in range(7, 20):
+            cols, rows = page_layout(count)
+            assert cols * rows >= count
+
+        tile = render_tile(_make_image("PNG", (64, 64)), label="1", tile_size=32)
+        tiles = [tile] * 8
+        tiles.append(bytes([255]) * len(tile))  # Последняя плитка белая
+        page = Image.open(io.BytesIO(compose_page(*tiles, tile_size=32)))
+
+        assert page.size == (96, 96)
+        assert page.getpixel((80, 80))[0] > 240
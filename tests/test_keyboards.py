@@ -0,0 +1,81 @@
+"""Тесты кэша клавиатур (bot.utils.keyboard_cache)"""
+
+from types import SimpleNamespace
+
+import pytest
+
+
+class TestKeyboardCache:
+    """Тесты мемоизации клавиатур"""
+
+    def test_same_arguments_same_markup(self):
+        """Тест: одинаковые аргументы (позиционные или именованные) — тот же объект"""
+        from bot.keyboards import get_duration_keyboard
+
+        first = get_duration_keyboard("video_1", 5)
+        assert get_duration_keyboard("video_1", current_duration=5) is first
+        assert get_duration_keyboard("video_1") is first  # Значение по умолчанию
+        assert get_duration_keyboard("video_1", 10) is not first
+
+    def test_cached_markup_matches_fresh_build(self):
+        """Тест: кэшированная разметка совпадает с собранной заново"""
+        from bot.keyboards import get_settings_keyboard
+
+        cached = get_settings_keyboard("pro", "v3_omni_std", "v3_pro")
+        fresh = get_settings_keyboard.uncached("pro", "v3_omni_std", "v3_pro")
+        assert cached.model_dump() == fresh.model_dump()
+
+    def test_markup_is_frozen(self):
+        """Тест: общую разметку нельзя подменить"""
+        from pydantic import ValidationError
+
+        from bot.keyboards import get_admin_keyboard
+
+        markup = get_admin_keyboard()
+        with pytest.raises(ValidationError):
+            markup.inline_keyboard = []
+        with pytest.raises(ValidationError):
+            markup.inline_keyboard[0][0].callback_data = "other"
+
+    def test_main_menu_keyed_by_pro_threshold(self):
+        """Тест: главное меню зависит только от порога PRO-функции"""
+        from bot.keyboards import get_main_menu_keyboard
+
+        assert get_main_menu_keyboard(0) is get_main_menu_keyboard(19)
+        assert get_main_menu_keyboard(20) is get_main_menu_keyboard(500)
+        assert get_main_menu_keyboard(0) is not get_main_menu_keyboard(20)
+
+    def test_preset_keyboards_reset_on_reload(self, monkeypatch):
+        """Тест: клавиатуры из данных пресетов сбрасываются при смене конфигурации"""
+        from bot.keyboards import get_category_keyboard, get_duration_keyboard
+        from bot.services.preset_manager import preset_manager
+
+        preset = SimpleNamespace(id="p1", name="Старое", cost=2, description="")
+        before = get_category_keyboard("cat", [preset], 10)
+        duration = get_duration_keyboard("p1", 5)
+        assert get_category_keyboard("cat", [preset], 10) is before
+
+        preset.name = "Новое"
+        monkeypatch.setattr(preset_manager, "version", preset_manager.version + 1)
+
+        after = get_category_keyboard("cat", [preset], 10)
+        assert after is not before
+        assert after.inline_keyboard[0][0].text.startswith("Новое")
+        # Клавиатуры, не зависящие от пресетов, остаются в кэше
+        assert get_duration_keyboard("p1", 5) is duration
+
+    def test_unhashable_arguments_bypass_cache(self):
+        """Тест: нехешируемые аргументы не ломают вызов"""
+        from bot.utils.keyboard_cache import cached_keyboard
+
+        calls = []
+
+        @cached_keyboard
+        def keyboard(options):
+            calls.append(options)
+            return len(options)
+
+        assert keyboard(["a", "b"]) == 2
+        assert keyboard(["a", "b"]) == 2
+        assert len(calls) == 2
+        assert keyboard.cache_info()["size"] == 0
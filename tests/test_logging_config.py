@@ -0,0 +1,122 @@
+"""Тесты для logging_config.py"""
+
+import logging
+
+
+def make_record(msg, *args, name="bot.test", level=logging.INFO):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class TestLogFilters:
+    """Тесты фильтров записей"""
+
+    def test_truncate_and_base64(self):
+        """Тест: длинное сообщение обрезается, base64 заменяется пометкой"""
+        from bot.utils.logging_config import TruncateFilter
+
+        record = make_record("response: %s", "A" * 100_000)
+        TruncateFilter(max_length=500).filter(record)
+
+        message = record.getMessage()
+        assert len(message) < 600
+        assert "<base64" in message
+        assert "[truncated" in message
+
+    def test_redact_secrets(self):
+        """Тест: секреты из конфигурации и поля с паролями маскируются"""
+        from bot.utils.logging_config import RedactFilter
+
+        record = make_record(
+            "params: {'Password': 'hunter22', 'OrderId': '42'} key=%s bot %s",
+            "sk-or-secret-value",
+            "123456789:AAHk1234567890abcdefghijklmnopqrstu",
+        )
+        RedactFilter(secrets=["sk-or-secret-value", "short"]).filter(record)
+
+        message = record.getMessage()
+        assert "hunter22" not in message
+        assert "sk-or-secret-value" not in message
+        assert "AAHk" not in message
+        assert "'OrderId': '42'" in message
+
+    def test_sampling_per_logger(self):
+        """Тест: из шумного логгера проходит каждое N-е сообщение, ошибки — все"""
+        from bot.utils.logging_config import SamplingFilter
+
+        sampler = SamplingFilter({"aiohttp": 0.25, "bot.noisy": 0})
+
+        passed = [
+            sampler.filter(make_record("x", name="aiohttp.access")) for _ in range(8)
+        ]
+        assert passed.count(True) == 2
+        assert not sampler.filter(make_record("x", name="bot.noisy"))
+        assert sampler.filter(make_record("x", name="bot.noisy", level=logging.ERROR))
+        assert sampler.filter(make_record("x", name="bot.other"))
+
+    def test_parse_sampling(self):
+        """Тест: разбор LOG_SAMPLING"""
+        from bot.utils.logging_config import parse_sampling
+
+        assert parse_sampling("") == {}
+        assert parse_sampling("aiohttp.access=0.1, bot.x=1") == {
+            "aiohttp.access": 0.1,
+            "bot.x": 1.0,
+        }
+
+
+class TestSetupLogging:
+    """Тесты очереди логирования"""
+
+    def test_json_lines_written_by_listener(self, tmp_path):
+        """Тест: записи уходят в файл через очередь в формате JSON"""
+        import json
+
+        from bot.utils.logging_config import setup_logging
+
+        logger = logging.getLogger("bot.test_logging_config")
+        logger.propagate = False
+        log_file = tmp_path / "bot.log"
+
+        listener = setup_logging(
+            log_file=str(log_file),
+            json_format=True,
+            max_length=100,
+            secrets=["secret-token-value"],
+            logger=logger,
+        )
+        try:
+            logger.info("token is secret-token-value, payload %s", "x" * 1000)
+        finally:
+            listener.stop()
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+
+        entry = json.loads(log_file.read_text(encoding="utf-8").splitlines()[-1])
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "bot.test_logging_config"
+        assert "secret-token-value" not in entry["msg"]
+        assert len(entry["msg"]) < 200
+
+    def test_secret_on_truncation_boundary_redacted(self, tmp_path):
+        """Тест: секрет, разрезанный границей обрезки, не оставляет начала"""
+        from bot.utils.logging_config import setup_logging
+
+        logger = logging.getLogger("bot.test_logging_boundary")
+        logger.propagate = False
+        log_file = tmp_path / "bot.log"
+        secret = "secret-token-value-123"
+
+        listener = setup_logging(
+            log_file=str(log_file), max_length=50, secrets=[secret], logger=logger
+        )
+        try:
+            # Граница в 50 символов приходится на середину секрета
+            logger.info("%s%s tail", "x" * 40, secret)
+        finally:
+            listener.stop()
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+
+        line = log_file.read_text(encoding="utf-8").splitlines()[-1]
+        assert secret[:10] not in line
+        assert "***" in line
@@ -0,0 +1,41 @@
+"""Тесты для main.py (веб-сервер вебхуков)"""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+
+class TestWebServer:
+    """Тесты готовности веб-сервера"""
+
+    @pytest.mark.asyncio
+    async def test_failed_startup_releases_waiting_webhooks(
+        self, tmp_path, monkeypatch
+    ):
+        """Тест: если on_startup упал, ждавший вебхук получает 503, а не висит"""
+        import asyncio
+
+        from aiohttp.test_utils import TestClient, TestServer
+
+        from bot.config import config
+
+        # Импорт bot.main настраивает логирование в logs/ текущей папки
+        monkeypatch.chdir(tmp_path)
+        from bot.main import setup_web_server
+
+        ready, failed = asyncio.Event(), asyncio.Event()
+        app = setup_web_server(MagicMock(), MagicMock(), ready, failed)
+
+        async with TestClient(TestServer(app)) as client:
+            assert (await client.get("/health")).status == 503
+
+            pending = asyncio.create_task(client.post(config.WEBHOOK_PATH, json={}))
+            await asyncio.sleep(0.05)
+            assert not pending.done()
+
+            failed.set()
+            ready.set()
+
+            response = await asyncio.wait_for(pending, timeout=1)
+            assert response.status == 503
+            assert (await client.get("/health")).status == 503
@@ -0,0 +1,167 @@
+"""Тесты для media_registry.py (повторная отправка по file_id)"""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+
+def _sender(kind="photo", prefix="file"):
+    """Метод отправки: каждый новый файл получает свой file_id"""
+    uploads = []
+
+    async def send(**kwargs):
+        media = kwargs[kind]
+        if isinstance(media, str) and media.startswith(f"{prefix}_"):
+            file_id = media
+        else:
+            uploads.append(media)
+            file_id = f"{prefix}_{len(uploads)}"
+        sent = MagicMock(file_id=file_id, file_unique_id=f"u{file_id}")
+        if kind == "photo":
+            return MagicMock(photo=[MagicMock(), sent])
+        return MagicMock(**{kind: sent})
+
+    mock = AsyncMock(side_effect=send)
+    mock.uploads = uploads
+    return mock
+
+
+class TestMediaRegistry:
+    """Тесты реестра file_id"""
+
+    @pytest.mark.asyncio
+    async def test_second_send_uses_file_id(self, temp_db):
+        """Тест: повторная отправка тех же байтов идёт по file_id"""
+        from bot.services.delivery import DeliveryPlanner
+        from bot.services.media_registry import MediaRegistry
+
+        registry = MediaRegistry(DeliveryPlanner())
+        send = _sender()
+
+        await registry.send(send, "photo", b"png-bytes", "a.png", caption="1")
+        await registry.send(send, "photo", b"png-bytes", "a.png", caption="2")
+
+        assert len(send.uploads) == 1
+        assert send.await_args.kwargs == {"photo": "file_1", "caption": "2"}
+        assert registry.stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_url_and_hash_share_file_id(self, temp_db):
+        """Тест: файл, отправленный байтами, находится по своему URL"""
+        from bot.services.delivery import DeliveryPlanner
+        from bot.services.media_registry import MediaRegistry
+
+        registry = MediaRegistry(DeliveryPlanner())
+        send = _sender()
+        await registry.send(send, "photo", b"png-bytes", url="https://x/1.png")
+
+        # Новый экземпляр — file_id читается из БД, скачивание не нужно
+        download = AsyncMock(return_value=b"png-bytes")
+        restarted = MediaRegistry(DeliveryPlanner())
+        await restarted.send(send, "photo", download, url="https://x/1.png")
+
+        download.assert_not_awaited()
+        assert len(send.uploads) == 1
+
+    @pytest.mark.asyncio
+    async def test_file_id_is_per_kind(self, temp_db):
+        """Тест: file_id фото не используется для документа"""
+        from bot.services.delivery import DeliveryPlanner
+        from bot.services.media_registry import MediaRegistry
+
+        registry = MediaRegistry(DeliveryPlanner())
+        await registry.send(_sender("photo"), "photo", b"data")
+
+        send_document = _sender("document")
+        await registry.send(send_document, "document", b"data")
+        assert len(send_document.uploads) == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_file_id_falls_back_to_upload(self, temp_db):
+        """Тест: отвергнутый Telegram file_id забывается, файл загружается"""
+        from aiogram.exceptions import TelegramBadRequest
+
+        from bot.services.delivery import DeliveryPlanner
+        from bot.services.media_registry import MediaRegistry
+
+        registry = MediaRegistry(DeliveryPlanner())
+        send = _sender()
+        await registry.send(send, "photo", b"data")
+
+        fresh = _sender(prefix="new")
+
+        async def flaky(**kwargs):
+            if kwargs["photo"] == "file_1":
+                raise TelegramBadRequest(MagicMock(), "wrong file identifier")
+            return await fresh(**kwargs)
+
+        await registry.send(flaky, "photo", b"data")
+
+        assert len(fresh.uploads) == 1
+        keys = await registry.keys_for(data=b"data")
+        assert await temp_db.get_media_file_id(keys, "photo") == "new_1"
+
+    @pytest.mark.asyncio
+    async def test_large_file_goes_by_url(self, temp_db):
+        """Тест: крупный файл с публичным URL Telegram забирает сам"""
+        from bot.services.delivery import DeliveryPlanner
+        from bot.services.media_registry import MediaRegistry
+
+        registry = MediaRegistry(DeliveryPlanner())
+        send = _sender()
+        data = b"x" * (3 * 1024 * 1024)
+
+        await registry.send(send, "photo", data, url="https://x/big.png")
+        assert send.uploads == ["https://x/big.png"]
+
+        # Тот же файл по хешу уже известен — повтор идёт по file_id
+        await registry.send(send, "photo", data)
+        assert len(send.uploads) == 1
+
+    @pytest.mark.asyncio
+    async def test_url_failure_falls_back_to_upload(self, temp_db):
+        """Тест: если Telegram не скачал URL, файл загружается байтами"""
+        from aiogram.exceptions import TelegramBadRequest
+        from aiogram.types import BufferedInputFile
+
+        from bot.services.delivery import DeliveryPlanner
+        from bot.services.media_registry import MediaRegistry
+
+        planner = DeliveryPlanner(static_base_url="https://x")
+        planner._schedule_probe = lambda: None
+        registry = MediaRegistry(planner)
+        uploaded = _sender()
+
+        async def send(**kwargs):
+            if isinstance(kwargs["photo"], str):
+                raise TelegramBadRequest(MagicMock(), "failed to get HTTP URL content")
+            return await uploaded(**kwargs)
+
+        data = b"x" * (3 * 1024 * 1024)
+        await registry.send(send, "photo", data, url="https://x/big.png")
+
+        assert isinstance(uploaded.uploads[0], BufferedInputFile)
+        assert not planner.host_available()
+
+    @pytest.mark.asyncio
+    async def test_foreign_url_not_measured(self, temp_db):
+        """Тест: отправка чужой ссылки не меняет статистику static-хоста"""
+        from bot.services.delivery import DeliveryPlanner
+        from bot.services.media_registry import MediaRegistry
+
+        planner = DeliveryPlanner(static_base_url="https://static.example")
+        planner._schedule_probe = lambda: None
+        registry = MediaRegistry(planner)
+        send = _sender(kind="video")
+        before = planner.stats()
+
+        await registry.send(send, "video", "https://cdn.other/video.mp4")
+
+        assert send.uploads == ["https://cdn.other/video.mp4"]
+        assert planner.url_latency == 2.0
+        assert planner.stats() == before
+
+        # Ссылка на наш хост по-прежнему меряется
+        await registry.send(send, "video", "https://static.example/v.mp4")
+        assert planner.url_latency != 2.0
+        assert planner.stats()["chosen"]["url"] == 1
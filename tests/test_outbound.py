@@ -0,0 +1,98 @@
+"""Тесты для outbound.py (лимиты исходящих запросов)"""
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+
+class TestOutboundScheduler:
+    """Тесты токенов и приоритетов"""
+
+    @pytest.mark.asyncio
+    async def test_chat_rate_limit(self):
+        """Тест: после исчерпания запаса чат получает токены с его скоростью"""
+        from bot.services.outbound import OutboundScheduler
+
+        scheduler = OutboundScheduler(global_rate=1000, chat_rate=20, chat_burst=1)
+
+        started = time.monotonic()
+        for _ in range(3):
+            await scheduler.acquire(1)
+        elapsed = time.monotonic() - started
+
+        # Первый сразу, ещё два — по 1/20 секунды
+        assert 0.08 <= elapsed < 0.5
+        # Другой чат не ждёт
+        started = time.monotonic()
+        await scheduler.acquire(2)
+        assert time.monotonic() - started < 0.02
+
+    def test_group_rate(self):
+        """Тест: группы и каналы получают поминутный лимит"""
+        from bot.services.outbound import OutboundScheduler
+
+        scheduler = OutboundScheduler(chat_rate=1, group_per_minute=20)
+        assert scheduler._chat_bucket(-100).rate == pytest.approx(20 / 60)
+        assert scheduler._chat_bucket("@channel").rate == pytest.approx(20 / 60)
+        assert scheduler._chat_bucket(100).rate == 1
+
+    @pytest.mark.asyncio
+    async def test_results_overtake_broadcast(self):
+        """Тест: при нехватке общих токенов результаты идут раньше рассылки"""
+        from bot.services.outbound import OutboundScheduler, Priority
+
+        scheduler = OutboundScheduler(global_rate=50, chat_burst=10)
+        scheduler._global.tokens = 0
+        order = []
+
+        async def send(chat_id, priority):
+            await scheduler.acquire(chat_id, priority)
+            order.append(priority)
+
+        tasks = [
+            asyncio.create_task(send(chat_id, Priority.BULK)) for chat_id in range(3)
+        ]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(send(10, Priority.RESULT)))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["by_priority"] == {"result": 1, "normal": 0, "bulk": 3}
+
+        await asyncio.gather(*tasks)
+        assert order[0] == Priority.RESULT
+
+    @pytest.mark.asyncio
+    async def test_middleware_honours_retry_after(self):
+        """Тест: RetryAfter блокирует чат и запрос повторяется"""
+        from aiogram.exceptions import TelegramRetryAfter
+        from aiogram.methods import SendMessage
+
+        from bot.services.outbound import OutboundMiddleware, OutboundScheduler
+
+        scheduler = OutboundScheduler(global_rate=1000, chat_rate=1000)
+        middleware = OutboundMiddleware(scheduler)
+        method = SendMessage(chat_id=5, text="hi")
+        make_request = AsyncMock(
+            side_effect=[TelegramRetryAfter(method, "flood", 0), "ok"]
+        )
+
+        assert await middleware(make_request, MagicMock(), method) == "ok"
+        assert make_request.await_count == 2
+        assert scheduler.stats()["retries"] == 1
+
+    @pytest.mark.asyncio
+    async def test_middleware_skips_methods_without_chat(self):
+        """Тест: запросы без chat_id не ждут лимитов"""
+        from aiogram.methods import AnswerCallbackQuery
+
+        from bot.services.outbound import OutboundMiddleware, OutboundScheduler
+
+        scheduler = OutboundScheduler()
+        middleware = OutboundMiddleware(scheduler)
+        make_request = AsyncMock(return_value=True)
+
+        await middleware(
+            make_request, MagicMock(), AnswerCallbackQuery(callback_query_id="1")
+        )
+        assert scheduler.stats()["sent"] == 0
@@ -0,0 +1,187 @@
+"""Тесты для payment_reconciler.py (сверка зависших платежей)"""
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+
+@pytest_asyncio.fixture
+async def payments_db(temp_db):
+    """БД с пользователем 101"""
+    await temp_db.get_or_create_user(101)
+    return temp_db
+
+
+@pytest_asyncio.fixture
+async def tbank_stub():
+    """Локальный Т-Банк: GetState отвечает статусом из словаря и считает запросы"""
+    from bot.services.tbank_service import TBankService
+
+    statuses = {}
+    hits = []
+
+    async def get_state(request):
+        payment_id = (await request.json())["PaymentId"]
+        hits.append(payment_id)
+        return web.json_response(
+            {"Success": True, "Status": statuses.get(payment_id, "NEW")}
+        )
+
+    app = web.Application()
+    app.router.add_post("/GetState", get_state)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    tbank = TBankService("TEST", "secret", f"http://127.0.0.1:{port}")
+    tbank.statuses = statuses
+    tbank.hits = hits
+    yield tbank
+
+    await tbank.close()
+    await runner.cleanup()
+
+
+async def _pending(database, n):
+    user = await database.get_or_create_user(101)
+    for i in range(n):
+        await database.create_transaction(f"order_{i}", user.id, f"pay_{i}", 50, 299)
+
+
+class TestPaymentReconciler:
+    """Тесты сверки платежей"""
+
+    @pytest.mark.asyncio
+    async def test_confirmed_payment_credited_once(self, payments_db, tbank_stub):
+        """Тест: подтверждённый платёж начисляется один раз"""
+        from bot.services.payment_reconciler import PaymentReconciler
+
+        await _pending(payments_db, 1)
+        tbank_stub.statuses["pay_0"] = "CONFIRMED"
+        before = await payments_db.get_user_credits(101)
+
+        notified = []
+
+        async def notify(telegram_id, transaction):
+            notified.append((telegram_id, transaction.order_id))
+
+        reconciler = PaymentReconciler(tbank_stub, min_age=0)
+        assert await reconciler.reconcile_once(notify) == 1
+        assert await reconciler.reconcile_once(notify) == 0
+        # Повторное подтверждение (например, вебхуком) ничего не начисляет
+        assert await payments_db.complete_transaction("order_0") is None
+
+        assert await payments_db.get_user_credits(101) == before + 50
+        assert notified == [(101, "order_0")]
+        transaction = await payments_db.get_transaction_by_order("order_0")
+        assert transaction.status == "completed"
+
+    @pytest.mark.asyncio
+    async def test_rejected_payment_closed(self, payments_db, tbank_stub):
+        """Тест: отклонённый банком платёж закрывается без начисления"""
+        from bot.services.payment_reconciler import PaymentReconciler
+
+        await _pending(payments_db, 1)
+        tbank_stub.statuses["pay_0"] = "REJECTED"
+        before = await payments_db.get_user_credits(101)
+
+        reconciler = PaymentReconciler(tbank_stub, min_age=0)
+        assert await reconciler.reconcile_once() == 0
+
+        transaction = await payments_db.get_transaction_by_order("order_0")
+        assert transaction.status == "failed"
+        assert await payments_db.get_user_credits(101) == before
+
+    @pytest.mark.asyncio
+    async def test_unpaid_payment_backs_off(self, payments_db, tbank_stub):
+        """Тест: неоплаченный платёж не опрашивается на каждом проходе"""
+        from bot.services.payment_reconciler import PaymentReconciler
+
+        await _pending(payments_db, 1)
+        reconciler = PaymentReconciler(tbank_stub, interval=60, min_age=0)
+
+        await reconciler.reconcile_once()
+        await reconciler.reconcile_once()
+        assert tbank_stub.hits == ["pay_0"]
+
+        # Оплата пришла позже — после паузы платёж подтверждается
+        tbank_stub.statuses["pay_0"] = "CONFIRMED"
+        reconciler._schedule["order_0"] = (1, 0.0)
+        assert await reconciler.reconcile_once() == 1
+
+    @pytest.mark.asyncio
+    async def test_batch_size_bounds_requests(self, payments_db, tbank_stub):
+        """Тест: за проход опрашивается не больше batch_size платежей"""
+        from bot.services.payment_reconciler import PaymentReconciler
+
+        await _pending(payments_db, 7)
+        reconciler = PaymentReconciler(
+            tbank_stub, min_age=0, batch_size=3, concurrency=2
+        )
+
+        await reconciler.reconcile_once()
+        assert len(tbank_stub.hits) == 3
+        await reconciler.reconcile_once()
+        assert len(tbank_stub.hits) == 6
+        assert len(set(tbank_stub.hits)) == 6
+
+    @pytest.mark.asyncio
+    async def test_young_payments_left_to_webhook(self, payments_db, tbank_stub):
+        """Тест: свежие платежи не опрашиваются — ждём вебхук"""
+        from bot.services.payment_reconciler import PaymentReconciler
+
+        await _pending(payments_db, 2)
+        reconciler = PaymentReconciler(tbank_stub, min_age=120)
+
+        await reconciler.reconcile_once()
+        assert tbank_stub.hits == []
+
+    @pytest.mark.asyncio
+    async def test_success_deep_link_races_reconciler(self, payments_db, monkeypatch):
+        """Тест: возврат по ссылке после оплаты не начисляет второй раз"""
+        from unittest.mock import AsyncMock, MagicMock
+
+        from bot.handlers import common
+
+        await _pending(payments_db, 1)
+        before = await payments_db.get_user_credits(101)
+
+        async def get_state(payment_id):
+            # Пока ждём ответ банка, платёж закрывает сверка
+            await payments_db.complete_transaction("order_0")
+            return {"Status": "CONFIRMED"}
+
+        monkeypatch.setattr(common.tbank_service, "get_state", get_state)
+        message = MagicMock(text="/start success_order_0", answer=AsyncMock())
+        message.from_user.id = 101
+
+        await common.cmd_start(message)
+
+        assert await payments_db.get_user_credits(101) == before + 50
+        assert "уже обработана" in message.answer.await_args.args[0]
+
+    @pytest.mark.asyncio
+    async def test_webhook_notifies_through_dispatcher_bot(
+        self, payments_db, monkeypatch
+    ):
+        """Тест: вебхук Т-Банка уведомляет через переданный бот диспетчера"""
+        from unittest.mock import AsyncMock, MagicMock
+
+        from bot.handlers import payments
+
+        await _pending(payments_db, 1)
+        monkeypatch.setattr(
+            payments.tbank_service, "verify_notification", lambda data: True
+        )
+        request = MagicMock()
+        request.json = AsyncMock(
+            return_value={"OrderId": "order_0", "Status": "CONFIRMED"}
+        )
+        bot = MagicMock(send_message=AsyncMock())
+
+        response = await payments.handle_tbank_webhook(request, bot)
+
+        assert response.status == 200
+        assert bot.send_message.await_args.args[0] == 101
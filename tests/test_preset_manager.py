@@ -0,0 +1,174 @@
+"""Тесты для preset_manager.py"""
+
+import json
+
+import pytest
+
+
+def write_config(tmp_path, presets=None, packages=None):
+    presets_path = tmp_path / "presets.json"
+    price_path = tmp_path / "price.json"
+    presets_path.write_text(
+        json.dumps(
+            {
+                "categories": {
+                    "cat": {
+                        "name": "Категория",
+                        "presets": presets
+                        or [
+                            {"id": "p1", "name": "Первый", "prompt": "a", "cost": 1},
+                            {"id": "p2", "name": "Второй", "prompt": "b", "cost": 2},
+                        ],
+                    }
+                },
+                "default_values": {"styles": ["минимализм"]},
+            }
+        ),
+        encoding="utf-8",
+    )
+    price_path.write_text(
+        json.dumps({"packages": packages or [{"id": "mini", "credits": 10}]}),
+        encoding="utf-8",
+    )
+    return str(presets_path), str(price_path)
+
+
+class TestPresetIndex:
+    """Тесты индексов конфигурации"""
+
+    def test_lookups(self, tmp_path):
+        """Тест: пакеты, пресеты категорий и метаданные берутся из индексов"""
+        from bot.services.preset_manager import PresetManager
+
+        manager = PresetManager(*write_config(tmp_path))
+
+        assert manager.get_package("mini")["credits"] == 10
+        assert manager.get_package("missing") is None
+        assert [p.id for p in manager.get_category_presets("cat")] == ["p1", "p2"]
+        assert manager.get_category_presets("missing") == ()
+        assert manager.get_categories()["cat"]["name"] == "Категория"
+        # Повторные вызовы не пересобирают данные
+        assert manager.get_categories() is manager.get_categories()
+        assert manager.get_default_values("styles") == ("минимализм",)
+
+    def test_snapshot_is_read_only(self, tmp_path):
+        """Тест: индексы и пресеты нельзя изменить снаружи"""
+        from dataclasses import FrozenInstanceError
+
+        from bot.services.preset_manager import PresetManager
+
+        manager = PresetManager(*write_config(tmp_path))
+
+        with pytest.raises(TypeError):
+            manager.get_categories()["cat"]["name"] = "Другое"
+        with pytest.raises(FrozenInstanceError):
+            manager.get_preset("p1").cost = 0
+
+
+class TestPresetReload:
+    """Тесты перезагрузки"""
+
+    def test_reload_publishes_new_snapshot(self, tmp_path):
+        """Тест: читатель со старым снимком не видит частично загруженный новый"""
+        from bot.services.preset_manager import PresetManager
+
+        presets_path, price_path = write_config(tmp_path)
+        manager = PresetManager(presets_path, price_path)
+        old_presets = manager.get_category_presets("cat")
+        version = manager.version
+
+        write_config(
+            tmp_path,
+            presets=[{"id": "p3", "name": "Третий", "prompt": "c", "cost": 3}],
+        )
+        assert manager.reload() is True
+
+        assert [p.id for p in old_presets] == ["p1", "p2"]
+        assert [p.id for p in manager.get_category_presets("cat")] == ["p3"]
+        assert manager.get_preset("p1") is None
+        assert manager.version == version + 1
+
+    def test_failed_reload_keeps_previous_config(self, tmp_path):
+        """Тест: ошибка в новом файле не затрагивает опубликованную конфигурацию"""
+        from bot.services.preset_manager import PresetManager
+
+        presets_path, price_path = write_config(tmp_path)
+        manager = PresetManager(presets_path, price_path)
+        version = manager.version
+
+        # Пресеты уже прочитаны, прайс-лист битый
+        (tmp_path / "price.json").write_text("{broken", encoding="utf-8")
+        assert manager.reload() is False
+
+        assert manager.get_package("mini") is not None
+        assert [p.id for p in manager.get_category_presets("cat")] == ["p1", "p2"]
+        assert manager.version == version
+
+
+class TestPresetWatcher:
+    """Тесты слежения за файлами конфигурации"""
+
+    @pytest.mark.asyncio
+    async def test_changed_file_reloaded_once_stable(self, tmp_path):
+        """Тест: изменённый файл перечитывается, когда перестал меняться"""
+        from bot.services.preset_manager import PresetManager
+
+        manager = PresetManager(*write_config(tmp_path))
+        assert await manager.check_for_changes() is False
+
+        write_config(tmp_path, packages=[{"id": "maxi", "credits": 100}])
+        # Первая проверка только замечает изменение
+        assert await manager.check_for_changes() is False
+        assert manager.get_package("maxi") is None
+
+        assert await manager.check_for_changes() is True
+        assert manager.get_package("maxi")["credits"] == 100
+        assert await manager.check_for_changes() is False
+
+    @pytest.mark.asyncio
+    async def test_invalid_config_rejected(self, tmp_path):
+        """Тест: конфигурация с ошибкой не публикуется и не перечитывается"""
+        from bot.services.preset_manager import PresetManager
+
+        manager = PresetManager(*write_config(tmp_path))
+        reloads = []
+        original = manager.reload_async
+
+        async def counting_reload():
+            reloads.append(1)
+            return await original()
+
+        manager.reload_async = counting_reload
+
+        write_config(
+            tmp_path,
+            presets=[
+                {"id": "p1", "name": "Первый", "prompt": "a", "cost": 1},
+                {"id": "p1", "name": "Копия", "prompt": "b", "cost": -1},
+            ],
+        )
+        for _ in range(4):
+            assert await manager.check_for_changes() is False
+
+        assert len(reloads) == 1
+        assert [p.id for p in manager.get_category_presets("cat")] == ["p1", "p2"]
+
+    def test_batch_modes_from_snapshot(self, monkeypatch, tmp_path):
+        """Тест: режимы пакетного редактирования берутся из снимка, а не с диска"""
+        import importlib
+
+        from bot.services.batch_service import BatchEditingService
+        from bot.services.preset_manager import PresetManager
+
+        presets_path, price_path = write_config(tmp_path)
+        data = json.loads((tmp_path / "presets.json").read_text(encoding="utf-8"))
+        data["batch_edit_modes"] = {"bg": {"name": "Фон"}}
+        (tmp_path / "presets.json").write_text(json.dumps(data), encoding="utf-8")
+
+        module = importlib.import_module("bot.services.preset_manager")
+        monkeypatch.setattr(
+            module, "preset_manager", PresetManager(presets_path, price_path)
+        )
+        (tmp_path / "presets.json").unlink()
+
+        assert BatchEditingService().get_batch_modes() == {"bg": {"name": "Фон"}}
@@ -0,0 +1,81 @@
+"""Тесты для preview.py (превью результатов для отправки фото)"""
+
+import io
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+
+def _png(size, mode="RGB") -> bytes:
+    from PIL import Image
+
+    color = (30, 120, 200, 128) if mode == "RGBA" else (30, 120, 200)
+    buf = io.BytesIO()
+    Image.new(mode, size, color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class TestRenderPreview:
+    """Тесты рендера превью"""
+
+    def test_large_png_becomes_jpeg_within_limits(self):
+        """Тест: 4K PNG уменьшается до 2560 px и кодируется в JPEG"""
+        from PIL import Image
+
+        from bot.services.image_ops import sniff_mime
+        from bot.services.preview import render_preview
+
+        preview = render_preview(_png((4096, 2304)))
+
+        assert sniff_mime(preview) == "image/jpeg"
+        with Image.open(io.BytesIO(preview)) as img:
+            assert img.size == (2560, 1440)
+
+    def test_transparency_flattened_on_white(self):
+        """Тест: прозрачность заменяется белым фоном"""
+        from PIL import Image
+
+        from bot.services.preview import render_preview
+
+        preview = render_preview(_png((100, 100), mode="RGBA"), max_side=100)
+        with Image.open(io.BytesIO(preview)) as img:
+            r, g, b = img.getpixel((50, 50))
+        # Полупрозрачный синий на белом светлее исходного (30, 120, 200)
+        assert r > 100 and g > 150
+
+    @pytest.mark.asyncio
+    async def test_small_jpeg_sent_as_is(self):
+        """Тест: небольшой JPEG не перекодируется"""
+        from PIL import Image
+
+        from bot.services.preview import PreviewRenderer
+
+        buf = io.BytesIO()
+        Image.new("RGB", (64, 64)).save(buf, format="JPEG")
+        assert await PreviewRenderer().render(buf.getvalue()) == buf.getvalue()
+
+
+class TestSendPhoto:
+    """Тесты отправки результата через превью"""
+
+    @pytest.mark.asyncio
+    async def test_repeat_sends_by_file_id_without_rendering(
+        self, temp_db, monkeypatch
+    ):
+        """Тест: повтор того же результата не рендерит превью заново"""
+        from bot.services.preview import PreviewRenderer
+
+        renderer = PreviewRenderer()
+        render = AsyncMock(return_value=b"jpeg-preview")
+        monkeypatch.setattr(renderer, "render", render)
+
+        photo = MagicMock(file_id="photo_1", file_unique_id="u1")
+        send = AsyncMock(return_value=MagicMock(photo=[photo]))
+
+        await renderer.send_photo(send, b"png-original", caption="1")
+        await renderer.send_photo(send, b"png-original", caption="2")
+
+        render.assert_awaited_once_with(b"png-original")
+        uploaded = send.await_args_list[0].kwargs["photo"]
+        assert uploaded.data == b"jpeg-preview"
+        assert send.await_args_list[1].kwargs["photo"] == "photo_1"
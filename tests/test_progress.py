@@ -0,0 +1,102 @@
+"""Тесты для progress.py (отрисовка прогресса)"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+
+def _texts(bot):
+    return [call.kwargs["text"] for call in bot.edit_message_text.await_args_list]
+
+
+class TestProgressRenderer:
+    """Тесты склейки и частоты правок"""
+
+    @pytest.mark.asyncio
+    async def test_updates_are_coalesced_per_message(self):
+        """Тест: из пачки обновлений одного сообщения уходит только последнее"""
+        from bot.services.progress import ProgressRenderer
+
+        bot = MagicMock(edit_message_text=AsyncMock())
+        renderer = ProgressRenderer(min_interval=10, max_rate=1000)
+
+        for percent in range(5):
+            renderer.update(1, 100, f"{percent}%")
+        renderer.update(2, 200, "other")
+
+        renderer.start(bot)
+        await asyncio.sleep(0.05)
+        await renderer.stop()
+
+        assert sorted(_texts(bot)) == ["4%", "other"]
+        assert renderer.stats()["coalesced"] == 4
+
+    @pytest.mark.asyncio
+    async def test_min_interval_per_message(self):
+        """Тест: промежуточные состояния ждут интервала, финальное — нет"""
+        from bot.services.progress import ProgressRenderer
+
+        bot = MagicMock(edit_message_text=AsyncMock())
+        renderer = ProgressRenderer(min_interval=10, max_rate=1000)
+        renderer.start(bot)
+
+        renderer.update(1, 100, "10%")
+        await asyncio.sleep(0.02)
+        renderer.update(1, 100, "20%")
+        await asyncio.sleep(0.02)
+        assert _texts(bot) == ["10%"]
+
+        renderer.update(1, 100, "done", final=True)
+        await asyncio.sleep(0.02)
+        assert _texts(bot) == ["10%", "done"]
+
+        await renderer.stop()
+
+    @pytest.mark.asyncio
+    async def test_slow_telegram_does_not_block_update(self):
+        """Тест: update() не ждёт медленный edit_message_text"""
+        from bot.services.progress import ProgressRenderer
+
+        gate = asyncio.Event()
+
+        async def slow_edit(**kwargs):
+            await gate.wait()
+
+        bot = MagicMock(edit_message_text=AsyncMock(side_effect=slow_edit))
+        renderer = ProgressRenderer(min_interval=0, max_rate=1000)
+        renderer.start(bot)
+
+        renderer.update(1, 100, "a")
+        await asyncio.sleep(0.01)
+        # Отрисовщик занят первой правкой, а воркер продолжает без ожидания
+        renderer.update(1, 100, "b")
+        renderer.update(1, 100, "c")
+        assert renderer.stats()["pending"] == 1
+
+        gate.set()
+        await asyncio.sleep(0.02)
+        await renderer.stop()
+        assert _texts(bot) == ["a", "c"]
+
+    @pytest.mark.asyncio
+    async def test_retry_after_requeues_update(self):
+        """Тест: RetryAfter откладывает правку, а не теряет её"""
+        from aiogram.exceptions import TelegramRetryAfter
+
+        from bot.services.progress import ProgressRenderer
+
+        bot = MagicMock(
+            edit_message_text=AsyncMock(
+                side_effect=[TelegramRetryAfter(MagicMock(), "flood", 0), None]
+            )
+        )
+        renderer = ProgressRenderer(min_interval=10, max_rate=1000)
+        renderer.start(bot)
+
+        renderer.update(1, 100, "50%")
+        await asyncio.sleep(0.05)
+        await renderer.stop()
+
+        assert _texts(bot) == ["50%", "50%"]
+        assert renderer.stats()["sent"] == 1
@@ -0,0 +1,76 @@
+"""Тесты для prompt_template.py"""
+
+import pytest
+
+
+class TestPromptTemplate:
+    """Тесты разбора и подстановки"""
+
+    def test_render_matches_str_format(self):
+        """Тест: результат совпадает с str.format, повторы и {{ }} учтены"""
+        from bot.services.prompt_template import PromptTemplate
+
+        source = "Render in {art_style} style, keep {{braces}}, again {art_style}"
+        template = PromptTemplate(source)
+
+        assert template.placeholders == ("art_style",)
+        assert template.render({"art_style": "oil"}) == source.format(art_style="oil")
+        assert PromptTemplate("no placeholders").render({}) == "no placeholders"
+
+    def test_missing_values_raise(self):
+        """Тест: незаполненный плейсхолдер — ошибка, а не сырой шаблон"""
+        from bot.services.prompt_template import PromptTemplate, PromptTemplateError
+
+        template = PromptTemplate("Logo '{text}', {style} typography")
+
+        assert template.missing({"text": "Banano"}) == ["style"]
+        with pytest.raises(PromptTemplateError, match="style"):
+            template.render({"text": "Banano"})
+
+    def test_unsupported_placeholders_rejected(self):
+        """Тест: форматирование и обращения к атрибутам не поддерживаются"""
+        from bot.services.prompt_template import PromptTemplate, PromptTemplateError
+
+        for source in ("{value:>10}", "{user.name}", "{0}", "{broken"):
+            with pytest.raises(PromptTemplateError):
+                PromptTemplate(source)
+
+    def test_literal_prompt_unescaped(self):
+        """Тест: в промпте без плейсхолдеров {{ и }} тоже снимаются"""
+        from bot.services.prompt_template import PromptTemplate
+
+        source = "Keep {{braces}} as is"
+        template = PromptTemplate(source)
+
+        assert template.placeholders == ()
+        assert template.render({}) == source.format() == "Keep {braces} as is"
+
+
+class TestPresetTemplates:
+    """Тесты шаблонов в пресетах"""
+
+    def test_presets_compiled_on_load(self):
+        """Тест: все пресеты из data/presets.json разобраны при загрузке"""
+        from bot.services.preset_manager import preset_manager
+
+        for preset in preset_manager.get_all_presets().values():
+            assert set(preset.template.placeholders) <= set(preset.placeholders)
+            values = {name: "x" for name in preset.placeholders}
+            assert preset.format_prompt(**values) == preset.prompt.format(**values)
+
+    def test_undeclared_placeholder_rejects_config(self):
+        """Тест: плейсхолдер, не объявленный в пресете, не проходит загрузку"""
+        from bot.services.preset_manager import build_index
+
+        data = {
+            "categories": {
+                "cat": {
+                    "name": "Категория",
+                    "presets": [
+                        {"id": "p1", "name": "P", "prompt": "{subject}", "cost": 1}
+                    ],
+                }
+            }
+        }
+        with pytest.raises(ValueError, match="subject"):
+            build_index(data, {})
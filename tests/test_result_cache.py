@@ -0,0 +1,78 @@
+"""Тесты для result_cache.py"""
+import pytest
+
+
+class TestResultCacheKey:
+    """Тесты построения ключа кэша"""
+
+    def test_key_normalizes_prompt_whitespace(self):
+        """Тест: лишние пробелы в промпте не меняют ключ"""
+        from bot.services.result_cache import ResultCache
+
+        key1 = ResultCache.make_key("a  cute\ncat", "gemini-2.5-flash-image", "1:1")
+        key2 = ResultCache.make_key(" a cute cat ", "Gemini-2.5-Flash-Image", "1:1")
+
+        assert key1 == key2
+
+    def test_key_depends_on_images(self):
+        """Тест: входные изображения участвуют в ключе"""
+        from bot.services.result_cache import ResultCache
+
+        base = ResultCache.make_key("prompt", "model", "1:1", "1K")
+        with_image = ResultCache.make_key("prompt", "model", "1:1", "1K", [b"img"])
+        other_image = ResultCache.make_key("prompt", "model", "1:1", "1K", [b"img2"])
+
+        assert base != with_image
+        assert with_image != other_image
+        assert base == ResultCache.make_key("prompt", "model", "1:1", "1K", [None])
+
+
+class TestResultCacheStorage:
+    """Тесты хранения и вытеснения"""
+
+    @pytest.mark.asyncio
+    async def test_put_and_get(self, tmp_path):
+        """Тест: результат возвращается из кэша и считается экономия"""
+        from bot.services.result_cache import ResultCache
+
+        cache = ResultCache(root=str(tmp_path), max_bytes=1024)
+
+        assert await cache.get("k1") is None
+        await cache.put("k1", b"result", cost=5)
+
+        assert await cache.get("k1") == b"result"
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["saved_cost"] == 5
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self, tmp_path):
+        """Тест: при превышении лимита вытесняется давно неиспользуемая запись"""
+        from bot.services.result_cache import ResultCache
+
+        cache = ResultCache(root=str(tmp_path), max_bytes=10)
+
+        await cache.put("a", b"aaaa")
+        await cache.put("b", b"bbbb")
+        await cache.get("a")  # "a" становится самым свежим
+        await cache.put("c", b"cccc")
+
+        assert await cache.get("b") is None
+        assert await cache.get("a") == b"aaaa"
+        assert await cache.get("c") == b"cccc"
+        assert cache.stats()["size_bytes"] <= 10
+
+    @pytest.mark.asyncio
+    async def test_index_survives_restart(self, tmp_path):
+        """Тест: индекс и счётчики восстанавливаются с диска"""
+        from bot.services.result_cache import ResultCache
+
+        cache = ResultCache(root=str(tmp_path), max_bytes=1024)
+        await cache.put("k", b"data", cost=3)
+        await cache.get("k")
+        await cache.flush()
+
+        restored = ResultCache(root=str(tmp_path), max_bytes=1024)
+        assert await restored.get("k") == b"data"
+        assert restored.stats()["saved_cost"] == 6
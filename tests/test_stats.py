@@ -0,0 +1,83 @@
+"""Тесты счётчиков статистики (триггеры в database.py)"""
+
+import aiosqlite
+import pytest
+
+
+class TestStatsCounters:
+    """Тесты инкрементальных счётчиков для админ-панели"""
+
+    @pytest.mark.asyncio
+    async def test_counters_follow_inserts(self, temp_db):
+        """Тест: вставки и смена статуса платежа обновляют итоги и срезы"""
+        user = await temp_db.get_or_create_user(1)
+        await temp_db.get_or_create_user(2)
+        await temp_db.add_generation_history(user.id, "preset", "p", 3)
+        await temp_db.create_transaction("o1", user.id, "pay", 10, 199.0)
+        await temp_db.create_transaction("o2", user.id, "pay", 10, 99.0)
+        await temp_db.update_transaction_status("o1", "completed")
+        await temp_db.update_transaction_status("o1", "completed")
+
+        stats = await temp_db.get_admin_stats()
+        assert stats["total_users"] == 2
+        assert stats["total_generations"] == 1
+        assert (stats["total_transactions"], stats["total_revenue"]) == (1, 199.0)
+
+        # Возврат платежа вычитается
+        await temp_db.update_transaction_status("o1", "refunded")
+        assert (await temp_db.get_admin_stats())["total_revenue"] == 0
+
+        [today] = await temp_db.get_daily_stats(7)
+        assert (today["users"], today["generations"]) == (2, 1)
+
+    @pytest.mark.asyncio
+    async def test_backfill_existing_rows(self, temp_db):
+        """Тест: при первом запуске счётчики пересчитываются по старым данным"""
+        await temp_db.get_or_create_user(1)
+        await temp_db.get_or_create_user(2)
+
+        # Имитируем базу, созданную до появления счётчиков
+        async with aiosqlite.connect(temp_db.DATABASE_PATH) as db:
+            await db.execute("DELETE FROM stats_counters")
+            await db.execute("DELETE FROM stats_daily")
+            await db.commit()
+
+        await temp_db.init_db()
+        assert (await temp_db.get_admin_stats())["total_users"] == 2
+
+        await temp_db.init_db()
+        await temp_db.get_or_create_user(3)
+        assert (await temp_db.get_admin_stats())["total_users"] == 3
+
+
+class TestUserStats:
+    """Тесты агрегатов пользователя"""
+
+    @pytest.mark.asyncio
+    async def test_user_stats_rollup(self, temp_db):
+        """Тест: add_generation_history обновляет агрегаты пользователя"""
+        stats = await temp_db.get_user_stats(1)
+        assert (stats["generations"], stats["total_spent"]) == (0, 0)
+
+        user = await temp_db.get_or_create_user(1)
+        await temp_db.add_generation_history(user.id, "a", "p", 2)
+        await temp_db.add_generation_history(user.id, "b", "p", 3)
+
+        stats = await temp_db.get_user_stats(1)
+        assert (stats["generations"], stats["total_spent"]) == (2, 5)
+        assert stats["last_generation_at"] is not None
+        assert stats["credits"] == user.credits
+
+    @pytest.mark.asyncio
+    async def test_user_stats_backfill(self, temp_db):
+        """Тест: агрегаты собираются из истории при первом запуске"""
+        user = await temp_db.get_or_create_user(1)
+        await temp_db.add_generation_history(user.id, "a", "p", 4)
+
+        async with aiosqlite.connect(temp_db.DATABASE_PATH) as db:
+            await db.execute("DELETE FROM user_stats")
+            await db.commit()
+
+        await temp_db.init_db()
+        stats = await temp_db.get_user_stats(1)
+        assert (stats["generations"], stats["total_spent"]) == (1, 4)